@@ -0,0 +1,3 @@
+# test_scenarios.py runs the assignment's scenarios (its test_config_*
+# functions are experiments, not unit tests), so pytest skips it
+collect_ignore = ["test_scenarios.py"]
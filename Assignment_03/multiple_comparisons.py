@@ -0,0 +1,140 @@
+"""
+Multiple Comparisons
+All-pairs paired t-tests and comparison with the best over many configurations
+"""
+
+import numpy as np
+from typing import Dict
+
+METHODS = ("bonferroni", "holm", "none")
+
+
+def pairwise_differences(data: np.ndarray) -> np.ndarray:
+    """
+    Paired differences (..., k, k, n) of every two configurations from
+    data (..., k configurations, n replications); [i, j] is i - j
+    """
+    data = np.asarray(data, dtype=float)
+    return data[..., :, None, :] - data[..., None, :, :]
+
+
+def adjust_p_values(p_values: np.ndarray, method: str = "holm") -> np.ndarray:
+    """
+    Family-wise adjusted p-values over the last axis (one family per row):
+    Bonferroni multiplies by the number of tests m, Holm's step-down by
+    m, m - 1, ... in ascending order, kept monotone
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    m = p_values.shape[-1]
+    if method == "none":
+        return p_values
+    if method == "bonferroni":
+        return np.minimum(p_values * m, 1.0)
+    if method != "holm":
+        raise ValueError(f"Unknown method: {method}")
+
+    order = np.argsort(p_values, axis=-1)
+    ranked = np.take_along_axis(p_values, order, axis=-1) * (m - np.arange(m))
+    ranked = np.minimum(np.maximum.accumulate(ranked, axis=-1), 1.0)
+    adjusted = np.empty_like(ranked)
+    np.put_along_axis(adjusted, order, ranked, axis=-1)
+    return adjusted
+
+
+def all_pairs_comparison(
+    data, alpha: float = 0.05, method: str = "holm"
+) -> Dict[str, np.ndarray]:
+    """
+    Paired t-tests of all k(k - 1)/2 pairs of configurations of every
+    metric at once, from data (metrics, k configurations, n replications)
+    or (k, n). Replication r of every configuration must share its seed
+    (common random numbers), so the differences are paired.
+
+    The k(k - 1)/2 tests of each metric are one family: p-values are
+    adjusted by `method` and the intervals of the differences are
+    simultaneous Bonferroni intervals (exact t quantiles, n - 1 df).
+    Returns (..., k, k) matrices; significant[i, j] means configurations
+    i and j differ, with the sign of mean_difference[i, j] (i - j).
+    """
+    from scipy import stats
+
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    data = np.asarray(data, dtype=float)
+    k, n = data.shape[-2:]
+    if n < 2:
+        raise ValueError("Paired comparisons need 2+ replications")
+
+    differences = pairwise_differences(data)
+    mean = differences.mean(axis=-1)
+    std_error = differences.std(axis=-1, ddof=1) / np.sqrt(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Identical replications (e.g. no blocking in either) do not differ
+        t_stats = np.where(std_error > 0, mean / std_error, 0.0)
+    p_values = 2 * stats.t.sf(np.abs(t_stats), df=n - 1)
+
+    # One family of the k(k - 1)/2 distinct pairs per metric
+    upper = np.triu_indices(k, 1)
+    num_tests = len(upper[0])
+    adjusted = np.ones_like(p_values)
+    if num_tests:
+        adjusted[..., upper[0], upper[1]] = adjust_p_values(
+            p_values[..., upper[0], upper[1]], method
+        )
+        adjusted[..., upper[1], upper[0]] = adjusted[..., upper[0], upper[1]]
+
+    level = alpha / max(num_tests, 1) if method != "none" else alpha
+    margin = stats.t.ppf(1 - level / 2, n - 1) * std_error
+    return {
+        "mean_difference": mean,
+        "ci_lower": mean - margin,
+        "ci_upper": mean + margin,
+        "t_statistic": t_stats,
+        "p_value": p_values,
+        "adjusted_p_value": adjusted,
+        "significant": adjusted < alpha,
+        "method": method,
+        "alpha": alpha,
+        "num_replications": n,
+    }
+
+
+def compare_with_best(
+    data, alpha: float = 0.05, minimize: bool = True
+) -> Dict[str, np.ndarray]:
+    """
+    Comparison with the best of k configurations of every metric, from
+    data (metrics, k, n) or (k, n) of paired replications.
+
+    Configuration i stays in the subset that contains the best with
+    probability 1 - alpha if no other configuration beats it by more than
+    the paired half-width w_ij = t(1 - alpha / (k - 1), n - 1) s_ij / sqrt(n)
+    (subset selection with common random numbers, Nelson et al. 2001).
+    difference and half_width are against the configuration with the
+    best sample mean.
+    """
+    from scipy import stats
+
+    data = np.asarray(data, dtype=float)
+    k, n = data.shape[-2:]
+    if n < 2:
+        raise ValueError("Paired comparisons need 2+ replications")
+    sign = 1.0 if minimize else -1.0
+
+    differences = pairwise_differences(sign * data)
+    mean = differences.mean(axis=-1)  # > 0: i worse than j
+    t_critical = stats.t.ppf(1 - alpha / max(k - 1, 1), n - 1)
+    width = t_critical * differences.std(axis=-1, ddof=1) / np.sqrt(n)
+    could_be_best = np.all(mean <= width, axis=-1)
+
+    means = data.mean(axis=-1)
+    best = np.argmin(sign * means, axis=-1)
+    take = best[..., None, None]
+    return {
+        "means": means,
+        "best": best,
+        "difference": np.take_along_axis(mean, take, axis=-1)[..., 0] * sign,
+        "half_width": np.take_along_axis(width, take, axis=-1)[..., 0],
+        "could_be_best": could_be_best,
+        "alpha": alpha,
+    }
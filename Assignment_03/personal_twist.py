@@ -1,10 +1,14 @@
 import simpy
-import random
 import statistics
 import numpy as np
 from dataclasses import dataclass
 from typing import List, Dict
 import json
+from variate_streams import VariateStream, spawn_generators
+from accumulators import RunningStats, TimeWeightedStat
+from replication_runner import half_width, run_replications
+from bootstrap import bootstrap_ci
+from result_cache import ResultCache
 
 
 @dataclass
@@ -24,6 +28,13 @@ class SimulationConfig:
     warmup_period: float = 200.0
     random_seed: int = 42
 
+    # "objects" keeps every Patient, "streaming" only running statistics
+    record_mode: str = "objects"
+
+    # Count events and time each stage of the run (see instrumentation.py);
+    # adds "instr_*" keys to get_statistics()
+    instrument: bool = False
+
     # Personal twist: priority system
     emergency_probability: float = 0.2  # 20% of patients are emergency
 
@@ -42,6 +53,11 @@ class Patient:
     recovery_start: float = 0.0
     recovery_end: float = 0.0
 
+    # Service times drawn at arrival (common random numbers across configs)
+    prep_time: float = 0.0
+    surgery_time: float = 0.0
+    recovery_time: float = 0.0
+
     def throughput_time(self) -> float:
         return self.recovery_end - self.arrival_time
 
@@ -67,38 +83,80 @@ class PrioritySimulation:
         # Statistics tracking
         self.patients: List[Patient] = []
         self.patient_counter = 0
-        self.or_blocking_times: List[float] = []
-        self.or_blocking_start: float = None
 
         # Separate tracking for emergency vs elective
         self.emergency_patients: List[Patient] = []
         self.elective_patients: List[Patient] = []
 
-        # Queue monitoring
-        self.prep_queue_samples: List[int] = []
-        self.sample_interval = 10.0
+        # Streaming mode: constant-memory accumulators instead of lists
+        if config.record_mode not in ("objects", "streaming"):
+            raise ValueError(f"Unknown record mode: {config.record_mode}")
+        self.streaming = config.record_mode == "streaming"
+        self.throughput_stats = RunningStats()
+        self.emergency_stats = RunningStats()
+        self.elective_stats = RunningStats()
+
+        self.instrumentation = None
+        if config.instrument:
+            from instrumentation import Instrumentation
+
+            self.instrumentation = Instrumentation(self)
+            self.instrumentation.attach()
+
+        # Time-weighted levels, integrated from the end of warmup on and
+        # updated on every state change (no sampling process needed)
+        warmup = config.warmup_period
+        self.prep_queue_level = TimeWeightedStat(warmup)
+        self.prep_busy_level = TimeWeightedStat(warmup)
+        self.or_busy_level = TimeWeightedStat(warmup)
+        self.or_blocked_level = TimeWeightedStat(warmup)
+        self.recovery_busy_level = TimeWeightedStat(warmup)
+        self.blocked_ors = 0  # ORs holding a patient who waits for recovery
+
+    def create_streams(self):
+        """Create one buffered variate stream per stochastic input"""
+        rngs = spawn_generators(self.config.random_seed)
+        self.interarrival_stream = VariateStream(
+            rngs["arrival"], "exponential", self.config.interarrival_mean
+        )
+        self.priority_stream = VariateStream(rngs["priority"], "uniform", 0.0, 1.0)
+        self.prep_stream = VariateStream(
+            rngs["prep"], "exponential", self.config.prep_time_mean
+        )
+        self.surgery_stream = VariateStream(
+            rngs["surgery"], "exponential", self.config.surgery_time_mean
+        )
+        self.recovery_stream = VariateStream(
+            rngs["recovery"], "exponential", self.config.recovery_time_mean
+        )
+
+    def sample_service_times(self, patient: Patient):
+        """Draw the patient's three service times on arrival"""
+        patient.prep_time = self.prep_stream()
+        patient.surgery_time = self.surgery_stream()
+        patient.recovery_time = self.recovery_stream()
 
     def patient_generator(self):
         """Generate patients with priority classification"""
         while True:
-            yield self.env.timeout(
-                random.expovariate(1.0 / self.config.interarrival_mean)
-            )
+            yield self.env.timeout(self.interarrival_stream())
 
             self.patient_counter += 1
-            is_emergency = random.random() < self.config.emergency_probability
+            is_emergency = self.priority_stream() < self.config.emergency_probability
 
             patient = Patient(
                 id=self.patient_counter,
                 arrival_time=self.env.now,
                 is_emergency=is_emergency,
             )
-            self.patients.append(patient)
+            self.sample_service_times(patient)
 
-            if is_emergency:
-                self.emergency_patients.append(patient)
-            else:
-                self.elective_patients.append(patient)
+            if not self.streaming:
+                self.patients.append(patient)
+                if is_emergency:
+                    self.emergency_patients.append(patient)
+                else:
+                    self.elective_patients.append(patient)
 
             self.env.process(self.patient_process(patient))
 
@@ -109,66 +167,100 @@ class PrioritySimulation:
 
         # STAGE 1: PREPARATION (with priority)
         prep_request = self.prep_rooms.request(priority=priority)
+        self.record_state()
         yield prep_request
+        self.record_state()
 
         patient.prep_start = self.env.now
-        prep_duration = random.expovariate(1.0 / self.config.prep_time_mean)
-        yield self.env.timeout(prep_duration)
+        yield self.env.timeout(patient.prep_time)
         patient.prep_end = self.env.now
 
         # STAGE 2: OPERATING ROOM (with priority)
         or_request = self.operating_rooms.request(priority=priority)
+        self.record_state()
         yield or_request
 
         self.prep_rooms.release(prep_request)
+        self.record_state()
 
         patient.surgery_start = self.env.now
-        surgery_duration = random.expovariate(1.0 / self.config.surgery_time_mean)
-        yield self.env.timeout(surgery_duration)
+        yield self.env.timeout(patient.surgery_time)
         patient.surgery_end = self.env.now
 
         # STAGE 3: RECOVERY (with blocking detection)
         recovery_request = self.recovery_rooms.request()
-
-        if (
-            len(self.recovery_rooms.queue) > 0
-            or self.recovery_rooms.count >= self.config.num_recovery_rooms
-        ):
-            if self.or_blocking_start is None:
-                self.or_blocking_start = self.env.now
+        blocked = not recovery_request.triggered
+        if blocked:
+            self.blocked_ors += 1
+        self.record_state()
 
         yield recovery_request
 
-        if self.or_blocking_start is not None:
-            blocking_duration = self.env.now - self.or_blocking_start
-            self.or_blocking_times.append(blocking_duration)
-            self.or_blocking_start = None
-
+        if blocked:
+            self.blocked_ors -= 1
         self.operating_rooms.release(or_request)
+        self.record_state()
 
         patient.recovery_start = self.env.now
-        recovery_duration = random.expovariate(1.0 / self.config.recovery_time_mean)
-        yield self.env.timeout(recovery_duration)
+        yield self.env.timeout(patient.recovery_time)
         patient.recovery_end = self.env.now
 
         self.recovery_rooms.release(recovery_request)
+        self.record_state()
 
-    def queue_monitor(self):
-        """Monitor queue lengths"""
-        while True:
-            if self.env.now >= self.config.warmup_period:
-                self.prep_queue_samples.append(len(self.prep_rooms.queue))
-            yield self.env.timeout(self.sample_interval)
+        if self.streaming and patient.recovery_end > self.config.warmup_period:
+            throughput = patient.throughput_time()
+            self.throughput_stats.add(throughput)
+            if patient.is_emergency:
+                self.emergency_stats.add(throughput)
+            else:
+                self.elective_stats.add(throughput)
+
+    def record_state(self):
+        """Update the time-weighted levels after a state change"""
+        now = self.env.now
+        self.prep_queue_level.update(now, len(self.prep_rooms.queue))
+        self.prep_busy_level.update(now, self.prep_rooms.count)
+        self.or_busy_level.update(now, self.operating_rooms.count)
+        self.or_blocked_level.update(now, self.blocked_ors)
+        self.recovery_busy_level.update(now, self.recovery_rooms.count)
+
+    def get_level_statistics(self):
+        """OR blocking, prep queue and utilization time averages"""
+        config = self.config
+        levels = (
+            self.prep_queue_level,
+            self.prep_busy_level,
+            self.or_busy_level,
+            self.or_blocked_level,
+            self.recovery_busy_level,
+        )
+        for level in levels:
+            level.finish(config.sim_duration)
+
+        return {
+            "or_blocking_probability": (
+                self.or_blocked_level.mean / config.num_operating_rooms
+            ),
+            "avg_prep_queue_length": self.prep_queue_level.mean,
+            "prep_utilization": self.prep_busy_level.mean / config.num_prep_rooms,
+            "or_utilization": self.or_busy_level.mean / config.num_operating_rooms,
+            "recovery_utilization": (
+                self.recovery_busy_level.mean / config.num_recovery_rooms
+            ),
+        }
 
     def run(self):
         """Execute simulation"""
-        random.seed(self.config.random_seed)
+        self.create_streams()
         self.env.process(self.patient_generator())
-        self.env.process(self.queue_monitor())
         self.env.run(until=self.config.sim_duration)
 
     def get_statistics(self):
         """Calculate statistics for all patients and by priority"""
+        if self.streaming:
+            return self.get_streaming_statistics()
+
         valid_patients = [
             p
             for p in self.patients
@@ -183,15 +275,6 @@ class PrioritySimulation:
 
         # Overall statistics
         throughput_times = [p.throughput_time() for p in valid_patients]
-        total_blocking_time = sum(self.or_blocking_times)
-        simulation_time = self.config.sim_duration - self.config.warmup_period
-        blocking_probability = (
-            total_blocking_time / simulation_time if simulation_time > 0 else 0
-        )
-        avg_prep_queue = (
-            statistics.mean(self.prep_queue_samples) if self.prep_queue_samples else 0
-        )
-
         # Emergency statistics
         emergency_throughput = (
             [p.throughput_time() for p in valid_emergency] if valid_emergency else [0]
@@ -210,8 +293,7 @@ class PrioritySimulation:
             "std_throughput_time": (
                 statistics.stdev(throughput_times) if len(throughput_times) > 1 else 0
             ),
-            "or_blocking_probability": blocking_probability,
-            "avg_prep_queue_length": avg_prep_queue,
+            **self.get_level_statistics(),
             # Priority-specific metrics
             "emergency_avg_throughput": statistics.mean(emergency_throughput),
             "emergency_std_throughput": (
@@ -227,8 +309,31 @@ class PrioritySimulation:
             ),
         }
 
+    def get_streaming_statistics(self):
+        """Same statistics as get_statistics(), from the running accumulators"""
+        throughput = self.throughput_stats
+        emergency = self.emergency_stats
+        elective = self.elective_stats
+
+        if throughput.count == 0:
+            return None
+
+        return {
+            "num_patients": throughput.count,
+            "num_emergency": emergency.count,
+            "num_elective": elective.count,
+            "avg_throughput_time": throughput.mean,
+            "std_throughput_time": throughput.stdev,
+            **self.get_level_statistics(),
+            # Priority-specific metrics (0 for an empty class, as above)
+            "emergency_avg_throughput": emergency.mean,
+            "emergency_std_throughput": emergency.stdev,
+            "elective_avg_throughput": elective.mean,
+            "elective_std_throughput": elective.stdev,
+        }
+
 
-def run_priority_comparison():
+def run_priority_comparison(jobs=1, cache=None):
     """Compare standard FIFO vs Priority-based system"""
     print("\n" + "=" * 70)
     print("🎯 PERSONAL TWIST: Priority-Based Scheduling")
@@ -249,12 +354,12 @@ def run_priority_comparison():
     print(f"  - 20% Emergency patients (higher priority)")
     print(f"  - 80% Elective patients (normal priority)\n")
 
-    for i in range(num_replications):
-        config.random_seed = 42 + i
-        sim = PrioritySimulation(config)
-        sim.run()
-        stats = sim.get_statistics()
+    seeds = [42 + i for i in range(num_replications)]
+    all_stats = run_replications(
+        PrioritySimulation, config, seeds, jobs=jobs, cache=cache
+    )
 
+    for i, stats in enumerate(all_stats):
         if stats:
             results.append(stats)
             print(
@@ -269,33 +374,70 @@ def run_priority_comparison():
     blocking_probs = [r["or_blocking_probability"] for r in results]
 
     def ci(data):
-        n = len(data)
-        mean = statistics.mean(data)
-        std = statistics.stdev(data)
-        margin = 2.262 * (std / np.sqrt(n))  # t-value for n=10
-        return mean, margin
+        return statistics.mean(data), half_width(data)  # exact t quantile
 
     emerg_mean, emerg_margin = ci(emergency_times)
     elect_mean, elect_margin = ci(elective_times)
     block_mean, block_margin = ci(blocking_probs)
+    utilizations = {
+        resource: ci([r[f"{resource}_utilization"] for r in results])
+        for resource in ("prep", "or", "recovery")
+    }
+
+    # BCa bootstrap intervals of all three metrics from one resample array
+    boot = bootstrap_ci(
+        np.column_stack([emergency_times, elective_times, blocking_probs]), seed=42
+    )
+    boot_intervals = [
+        [float(boot["ci_lower"][j]), float(boot["ci_upper"][j])] for j in range(3)
+    ]
 
     print("\n" + "=" * 70)
     print("📊 PRIORITY SYSTEM RESULTS")
     print("=" * 70)
     print(f"\n🚨 Emergency Patients:")
     print(f"   Average Throughput: {emerg_mean:.2f} ± {emerg_margin:.2f} min")
+    print(
+        f"   BCa bootstrap 95% CI: [{boot_intervals[0][0]:.2f}, {boot_intervals[0][1]:.2f}]"
+    )
     print(f"\n📋 Elective Patients:")
     print(f"   Average Throughput: {elect_mean:.2f} ± {elect_margin:.2f} min")
+    print(
+        f"   BCa bootstrap 95% CI: [{boot_intervals[1][0]:.2f}, {boot_intervals[1][1]:.2f}]"
+    )
     print(f"\n🔒 OR Blocking:")
     print(
         f"   Blocking Probability: {block_mean:.4f} ± {block_margin:.4f} ({block_mean*100:.2f}%)"
     )
+    print(
+        f"   BCa bootstrap 95% CI: [{boot_intervals[2][0]:.4f}, {boot_intervals[2][1]:.4f}]"
+    )
+    print(f"\n🏥 Utilization:")
+    for resource, label in (("prep", "Prep"), ("or", "OR"), ("recovery", "Recovery")):
+        mean, margin = utilizations[resource]
+        print(f"   {label}: {mean:.4f} ± {margin:.4f} ({mean*100:.2f}%)")
 
     # Save results
     summary = {
-        "emergency_throughput": {"mean": emerg_mean, "margin": emerg_margin},
-        "elective_throughput": {"mean": elect_mean, "margin": elect_margin},
-        "or_blocking": {"mean": block_mean, "margin": block_margin},
+        "emergency_throughput": {
+            "mean": emerg_mean,
+            "margin": emerg_margin,
+            "bootstrap_ci": boot_intervals[0],
+        },
+        "elective_throughput": {
+            "mean": elect_mean,
+            "margin": elect_margin,
+            "bootstrap_ci": boot_intervals[1],
+        },
+        "or_blocking": {
+            "mean": block_mean,
+            "margin": block_margin,
+            "bootstrap_ci": boot_intervals[2],
+        },
+        "utilization": {
+            resource: {"mean": mean, "margin": margin}
+            for resource, (mean, margin) in utilizations.items()
+        },
     }
 
     with open("results/priority_twist_results.json", "w") as f:
@@ -306,4 +448,4 @@ def run_priority_comparison():
 
 
 if __name__ == "__main__":
-    run_priority_comparison()
+    run_priority_comparison(cache=ResultCache())
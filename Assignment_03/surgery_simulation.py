@@ -1,8 +1,9 @@
 import simpy
-import random
 import statistics
 from dataclasses import dataclass, field
 from typing import List
+from variate_streams import VariateStream, spawn_generators
+from accumulators import RunningStats, TimeWeightedStat
 
 
 @dataclass
@@ -25,6 +26,13 @@ class SimulationConfig:
     warmup_period: float = 200.0  # Discard initial transient data
     random_seed: int = 42
 
+    # "objects" keeps every Patient, "streaming" only running statistics
+    record_mode: str = "objects"
+
+    # Count events and time each stage of the run (see instrumentation.py);
+    # adds "instr_*" keys to get_statistics()
+    instrument: bool = False
+
 
 @dataclass
 class Patient:
@@ -39,6 +47,11 @@ class Patient:
     recovery_start: float = 0.0
     recovery_end: float = 0.0
 
+    # Service times drawn at arrival (common random numbers across configs)
+    prep_time: float = 0.0
+    surgery_time: float = 0.0
+    recovery_time: float = 0.0
+
     def throughput_time(self) -> float:
         """Total time from arrival to departure"""
         return self.recovery_end - self.arrival_time
@@ -63,24 +76,69 @@ class SurgerySimulation:
         # Statistics tracking
         self.patients: List[Patient] = []
         self.patient_counter = 0
-        self.or_blocking_times: List[float] = []  # Times when OR was blocked
-        self.or_blocking_start: float = None
 
-        # Queue monitoring
-        self.prep_queue_samples: List[int] = []
-        self.prep_queue_times: List[float] = []
-        self.sample_interval = 10.0  # Sample every 10 time units
+        # Streaming mode: constant-memory accumulators instead of lists
+        if config.record_mode not in ("objects", "streaming"):
+            raise ValueError(f"Unknown record mode: {config.record_mode}")
+        self.streaming = config.record_mode == "streaming"
+        self.throughput_stats = RunningStats()
+
+        self.instrumentation = None
+        if config.instrument:
+            from instrumentation import Instrumentation
+
+            self.instrumentation = Instrumentation(self)
+            self.instrumentation.attach()
+
+        # Time-weighted levels, integrated from the end of warmup on and
+        # updated on every state change (no sampling process needed)
+        warmup = config.warmup_period
+        self.prep_queue_level = TimeWeightedStat(warmup)
+        self.prep_busy_level = TimeWeightedStat(warmup)
+        self.or_busy_level = TimeWeightedStat(warmup)
+        self.or_blocked_level = TimeWeightedStat(warmup)
+        self.recovery_busy_level = TimeWeightedStat(warmup)
+        self.blocked_ors = 0  # ORs holding a patient who waits for recovery
+        self.num_blocking_events = 0
+
+        # Prep queue seen by arriving patients after warmup (PASTA); with
+        # Poisson arrivals it estimates the same mean as prep_queue_level
+        self.arrival_queue_stats = RunningStats()
+
+    def create_streams(self):
+        """Create one buffered variate stream per stochastic input"""
+        rngs = spawn_generators(self.config.random_seed)
+        self.interarrival_stream = VariateStream(
+            rngs["arrival"], "exponential", self.config.interarrival_mean
+        )
+        self.prep_stream = VariateStream(
+            rngs["prep"], "exponential", self.config.prep_time_mean
+        )
+        self.surgery_stream = VariateStream(
+            rngs["surgery"], "exponential", self.config.surgery_time_mean
+        )
+        self.recovery_stream = VariateStream(
+            rngs["recovery"], "exponential", self.config.recovery_time_mean
+        )
+
+    def sample_service_times(self, patient: Patient):
+        """Draw the patient's three service times on arrival"""
+        patient.prep_time = self.prep_stream()
+        patient.surgery_time = self.surgery_stream()
+        patient.recovery_time = self.recovery_stream()
 
     def patient_generator(self):
         """Generate patients with exponential inter-arrival times"""
         while True:
-            yield self.env.timeout(
-                random.expovariate(1.0 / self.config.interarrival_mean)
-            )
+            yield self.env.timeout(self.interarrival_stream())
 
             self.patient_counter += 1
             patient = Patient(id=self.patient_counter, arrival_time=self.env.now)
-            self.patients.append(patient)
+            self.sample_service_times(patient)
+            if self.env.now >= self.config.warmup_period:
+                self.arrival_queue_stats.add(len(self.prep_rooms.queue))
+            if not self.streaming:
+                self.patients.append(patient)
 
             # Start patient process
             self.env.process(self.patient_process(patient))
@@ -95,79 +153,79 @@ class SurgerySimulation:
 
         # STAGE 1: PREPARATION
         prep_request = self.prep_rooms.request()
+        self.record_state()
         yield prep_request  # Wait for prep room
+        self.record_state()
 
         patient.prep_start = self.env.now
-        prep_duration = random.expovariate(1.0 / self.config.prep_time_mean)
-        yield self.env.timeout(prep_duration)
+        yield self.env.timeout(patient.prep_time)
         patient.prep_end = self.env.now
 
         # STAGE 2: OPERATING ROOM (with blocking handling)
         or_request = self.operating_rooms.request()
+        self.record_state()
         yield or_request  # Wait for OR availability
 
         # ⚠️ CRITICAL FIX: Release prep room ONLY when surgery starts
         # (Patient waited in prep room until OR became available)
         self.prep_rooms.release(prep_request)
+        self.record_state()
 
         patient.surgery_start = self.env.now
-        surgery_duration = random.expovariate(1.0 / self.config.surgery_time_mean)
-        yield self.env.timeout(surgery_duration)
+        yield self.env.timeout(patient.surgery_time)
         patient.surgery_end = self.env.now
 
         # STAGE 3: RECOVERY (with blocking detection)
-        # Check if recovery room available - if not, OR is BLOCKED
+        # If no recovery room is free right away, the OR is BLOCKED
         recovery_request = self.recovery_rooms.request()
-
-        if (
-            len(self.recovery_rooms.queue) > 0
-            or self.recovery_rooms.count >= self.config.num_recovery_rooms
-        ):
-            # OR is blocked! Record blocking start time
-            if self.or_blocking_start is None:
-                self.or_blocking_start = self.env.now
+        blocked = not recovery_request.triggered
+        if blocked:
+            self.blocked_ors += 1
+            if self.env.now >= self.config.warmup_period:
+                self.num_blocking_events += 1
+        self.record_state()
 
         yield recovery_request  # Wait for recovery room (OR stays occupied!)
 
-        # Recovery room acquired - end blocking if it was occurring
-        if self.or_blocking_start is not None:
-            blocking_duration = self.env.now - self.or_blocking_start
-            self.or_blocking_times.append(blocking_duration)
-            self.or_blocking_start = None
+        # Recovery room acquired - blocking ends
+        if blocked:
+            self.blocked_ors -= 1
 
         # ⚠️ CRITICAL: Release OR only AFTER recovery room is secured
         self.operating_rooms.release(or_request)
+        self.record_state()
 
         patient.recovery_start = self.env.now
-        recovery_duration = random.expovariate(1.0 / self.config.recovery_time_mean)
-        yield self.env.timeout(recovery_duration)
+        yield self.env.timeout(patient.recovery_time)
         patient.recovery_end = self.env.now
 
         # Release recovery room
         self.recovery_rooms.release(recovery_request)
+        self.record_state()
 
-    def queue_monitor(self):
-        """Monitor queue lengths at regular intervals"""
-        while True:
-            # Record current queue length before prep rooms
-            queue_length = len(self.prep_rooms.queue)
-
-            # Only record after warmup period
-            if self.env.now >= self.config.warmup_period:
-                self.prep_queue_samples.append(queue_length)
-                self.prep_queue_times.append(self.env.now)
+        if self.streaming and patient.recovery_end > self.config.warmup_period:
+            self.throughput_stats.add(patient.throughput_time())
 
-            yield self.env.timeout(self.sample_interval)
+    def record_state(self):
+        """Update the time-weighted levels after a state change"""
+        now = self.env.now
+        self.prep_queue_level.update(now, len(self.prep_rooms.queue))
+        self.prep_busy_level.update(now, self.prep_rooms.count)
+        self.or_busy_level.update(now, self.operating_rooms.count)
+        self.or_blocked_level.update(now, self.blocked_ors)
+        self.recovery_busy_level.update(now, self.recovery_rooms.count)
 
     def run(self):
         """Execute simulation"""
-        random.seed(self.config.random_seed)
+        self.create_streams()
         self.env.process(self.patient_generator())
-        self.env.process(self.queue_monitor())  # Start queue monitoring
         self.env.run(until=self.config.sim_duration)
 
     def get_statistics(self):
         """Calculate statistics excluding warmup period"""
+        if self.streaming:
+            return self.get_streaming_statistics()
+
         valid_patients = [
             p
             for p in self.patients
@@ -179,19 +237,6 @@ class SurgerySimulation:
 
         throughput_times = [p.throughput_time() for p in valid_patients]
 
-        # OR blocking statistics
-        total_blocking_time = sum(self.or_blocking_times)
-        simulation_time = self.config.sim_duration - self.config.warmup_period
-        blocking_probability = (
-            total_blocking_time / simulation_time if simulation_time > 0 else 0
-        )
-
-        # Queue statistics
-        avg_prep_queue = (
-            statistics.mean(self.prep_queue_samples) if self.prep_queue_samples else 0
-        )
-        max_prep_queue = max(self.prep_queue_samples) if self.prep_queue_samples else 0
-
         return {
             "num_patients": len(valid_patients),
             "avg_throughput_time": statistics.mean(throughput_times),
@@ -200,11 +245,56 @@ class SurgerySimulation:
             ),
             "min_throughput_time": min(throughput_times),
             "max_throughput_time": max(throughput_times),
-            "total_or_blocking_time": total_blocking_time,
-            "or_blocking_probability": blocking_probability,
-            "num_blocking_events": len(self.or_blocking_times),
-            "avg_prep_queue_length": avg_prep_queue,
-            "max_prep_queue_length": max_prep_queue,
+            **self.get_resource_statistics(),
+        }
+
+    def get_streaming_statistics(self):
+        """Same statistics as get_statistics(), from the running accumulators"""
+        throughput = self.throughput_stats
+
+        if throughput.count == 0:
+            return None
+
+        return {
+            "num_patients": throughput.count,
+            "avg_throughput_time": throughput.mean,
+            "std_throughput_time": throughput.stdev,
+            "min_throughput_time": throughput.min,
+            "max_throughput_time": throughput.max,
+            **self.get_resource_statistics(),
+        }
+
+    def get_resource_statistics(self):
+        """
+        OR blocking, prep queue and utilization from the time-weighted
+        levels, plus the mean prep queue seen by arriving patients
+        """
+        config = self.config
+        levels = (
+            self.prep_queue_level,
+            self.prep_busy_level,
+            self.or_busy_level,
+            self.or_blocked_level,
+            self.recovery_busy_level,
+        )
+        for level in levels:
+            level.finish(config.sim_duration)
+
+        return {
+            # Blocked OR-time over available OR-time (one OR: fraction of time)
+            "total_or_blocking_time": self.or_blocked_level.area,
+            "or_blocking_probability": (
+                self.or_blocked_level.mean / config.num_operating_rooms
+            ),
+            "num_blocking_events": self.num_blocking_events,
+            "avg_prep_queue_length": self.prep_queue_level.mean,
+            "max_prep_queue_length": self.prep_queue_level.max,
+            "arrival_avg_prep_queue_length": self.arrival_queue_stats.mean,
+            "prep_utilization": self.prep_busy_level.mean / config.num_prep_rooms,
+            "or_utilization": self.or_busy_level.mean / config.num_operating_rooms,
+            "recovery_utilization": (
+                self.recovery_busy_level.mean / config.num_recovery_rooms
+            ),
         }
 
 
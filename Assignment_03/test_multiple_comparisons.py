@@ -0,0 +1,87 @@
+"""
+Multiple Comparisons Tests
+Holm and Bonferroni adjustments, all-pairs tests and comparison with the best
+"""
+
+import numpy as np
+import pytest
+
+from multiple_comparisons import (
+    adjust_p_values,
+    all_pairs_comparison,
+    compare_with_best,
+    pairwise_differences,
+)
+
+
+def test_holm_step_down():
+    adjusted = adjust_p_values([0.01, 0.04, 0.03], "holm")
+    assert adjusted == pytest.approx([0.03, 0.06, 0.06])
+
+
+def test_bonferroni_and_none():
+    p_values = [0.01, 0.04, 0.5]
+    assert adjust_p_values(p_values, "bonferroni") == pytest.approx([0.03, 0.12, 1.0])
+    assert adjust_p_values(p_values, "none") == pytest.approx(p_values)
+
+
+def test_holm_adjusts_each_row_separately():
+    adjusted = adjust_p_values([[0.01, 0.04, 0.03], [0.5, 0.001, 0.02]], "holm")
+    assert adjusted[0] == pytest.approx([0.03, 0.06, 0.06])
+    assert adjusted[1] == pytest.approx([0.5, 0.003, 0.04])
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError, match="Unknown method"):
+        adjust_p_values([0.01], "sidak")
+
+
+def paired_data(offsets, n=20, seed=1):
+    """Replications sharing a common noise term per seed, plus own noise"""
+    rng = np.random.default_rng(seed)
+    common = rng.normal(10.0, 3.0, n)
+    return np.array([common + offset + rng.normal(0, 0.1, n) for offset in offsets])
+
+
+def test_pairwise_differences():
+    data = np.array([[1.0, 2.0], [4.0, 6.0]])
+    differences = pairwise_differences(data)
+    assert differences[0, 1].tolist() == [-3.0, -4.0]
+    assert differences[1, 0].tolist() == [3.0, 4.0]
+    assert not differences[0, 0].any()
+
+
+def test_all_pairs_finds_the_real_differences():
+    result = all_pairs_comparison(paired_data([0.0, 0.0, 1.0]))
+
+    assert result["significant"].tolist() == [
+        [False, False, True],
+        [False, False, True],
+        [True, True, False],
+    ]
+    assert result["mean_difference"][2, 0] == pytest.approx(1.0, abs=0.1)
+    assert result["ci_lower"][2, 0] > 0
+    assert (result["adjusted_p_value"] >= result["p_value"]).all()
+
+
+def test_all_pairs_over_metrics():
+    data = np.stack([paired_data([0.0, 1.0]), paired_data([0.0, 0.0], seed=2)])
+    result = all_pairs_comparison(data)
+    assert result["significant"][:, 0, 1].tolist() == [True, False]
+
+
+def test_compare_with_best():
+    data = paired_data([0.5, 0.0, 0.02, 2.0])
+
+    smallest = compare_with_best(data)
+    assert smallest["best"] == 1
+    assert smallest["could_be_best"].tolist() == [False, True, True, False]
+
+    largest = compare_with_best(data, minimize=False)
+    assert largest["best"] == 3
+    assert largest["could_be_best"].tolist() == [False, False, False, True]
+
+
+def test_needs_two_replications():
+    with pytest.raises(ValueError, match="2\\+ replications"):
+        all_pairs_comparison(np.ones((3, 1)))
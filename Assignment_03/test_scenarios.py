@@ -3,15 +3,58 @@ import random
 import statistics
 import numpy as np
 from surgery_simulation import SurgerySimulation, SimulationConfig
+from result_cache import ResultCache
+from bootstrap import bootstrap_ci
+from multiple_comparisons import all_pairs_comparison, compare_with_best
+from replication_runner import (
+    half_width,
+    run_replications,
+    run_replications_to_precision,
+)
 from typing import List, Dict
 import json
+import time
+from results_store import save_results, to_columns
+
+# Raw replication values of each metric in an analysis (all: smaller is better)
+METRICS = {
+    "throughput_time": ("raw_throughput", " min"),
+    "or_blocking_probability": ("raw_blocking", ""),
+    "prep_queue_length": ("raw_prep_queue", " patients"),
+}
 
 
 class ScenarioTester:
     """Run multiple replications and compute confidence intervals"""
 
-    def __init__(self, num_replications: int = 20):
+    def __init__(
+        self,
+        num_replications: int = 20,
+        jobs: int = 1,
+        relative_precision: float = None,
+        absolute_precision: float = None,
+        max_replications: int = 100,
+        precision_metric: str = "avg_throughput_time",
+        cache: ResultCache = None,
+        bootstrap_method: str = "bca",
+    ):
         self.num_replications = num_replications
+        self.jobs = jobs  # worker processes (None/0/-1 = all cores)
+
+        # Sequential mode: with a precision target, num_replications is the
+        # initial batch and replications are added until the 95% CI
+        # half-width of precision_metric meets it (or max_replications)
+        self.relative_precision = relative_precision
+        self.absolute_precision = absolute_precision
+        self.max_replications = max_replications
+        self.precision_metric = precision_metric
+        self.precision = None  # achieved precision of the last sequential run
+        self.cache = cache  # replications already on disk are not rerun
+        self.rows = []  # one per replication: rooms, seed, statistics, wall time
+
+        # Bootstrap intervals ("bca" or "percentile", None = off) next to the
+        # t intervals, as replicate distributions are often skewed
+        self.bootstrap_method = bootstrap_method
 
     def run_replications(
         self, config: SimulationConfig, scenario_name: str = ""
@@ -23,23 +66,58 @@ class ScenarioTester:
         print(f"Running {scenario_name}")
         print(f"{'='*60}")
 
-        for i in range(self.num_replications):
+        start = time.perf_counter()
+        if self.relative_precision is None and self.absolute_precision is None:
             # Use different seed for each replication
-            config.random_seed = 42 + i
-
-            sim = SurgerySimulation(config)
-            sim.run()
-            stats = sim.get_statistics()
-
+            seeds = [42 + i for i in range(self.num_replications)]
+            all_stats = run_replications(
+                SurgerySimulation, config, seeds, jobs=self.jobs, cache=self.cache
+            )
+        else:
+            all_stats, self.precision = run_replications_to_precision(
+                SurgerySimulation,
+                config,
+                self.precision_metric,
+                jobs=self.jobs,
+                cache=self.cache,
+                relative_precision=self.relative_precision,
+                absolute_precision=self.absolute_precision,
+                initial_replications=self.num_replications,
+                max_replications=self.max_replications,
+            )
+            seeds = self.precision["seeds"]
+        wall_time = (time.perf_counter() - start) / max(len(all_stats), 1)
+
+        for i, (seed, stats) in enumerate(zip(seeds, all_stats)):
             if stats:
-                results.append(stats)
+                # The seed pairs replications across configurations (CRN)
+                results.append({"seed": seed, **stats})
+                self.rows.append(
+                    {
+                        "num_prep_rooms": config.num_prep_rooms,
+                        "num_operating_rooms": config.num_operating_rooms,
+                        "num_recovery_rooms": config.num_recovery_rooms,
+                        "seed": seed,
+                        **stats,
+                        "wall_time": wall_time,
+                    }
+                )
                 print(
-                    f"Rep {i+1:2d}/{self.num_replications}: "
+                    f"Rep {i+1:2d}/{len(all_stats)}: "
                     f"Throughput={stats['avg_throughput_time']:6.2f} min, "
                     f"OR Blocking={stats['or_blocking_probability']:6.4f} ({stats['or_blocking_probability']*100:5.2f}%), "
                     f"Prep Queue={stats['avg_prep_queue_length']:5.2f}"
                 )
 
+        if self.precision is not None:
+            status = "reached" if self.precision["converged"] else "NOT reached"
+            print(
+                f"Precision {status}: {self.precision['metric']} "
+                f"± {self.precision['half_width']:.4f} "
+                f"({self.precision['relative_half_width']*100:.1f}%) "
+                f"after {self.precision['num_replications']} replications"
+            )
+
         return results
 
     def compute_confidence_interval(self, data: List[float], confidence: float = 0.95):
@@ -54,22 +132,8 @@ class ScenarioTester:
         mean = statistics.mean(data)
         std = statistics.stdev(data)
 
-        # t-value for 95% confidence (two-tailed)
-        # For n=20, df=19, t_0.025 ≈ 2.093
-        t_values = {
-            5: 2.776,
-            6: 2.571,
-            7: 2.447,
-            8: 2.365,
-            9: 2.306,
-            10: 2.262,
-            15: 2.145,
-            20: 2.093,
-            30: 2.042,
-        }
-        t_critical = t_values.get(n, 2.093)  # Default to n=20
-
-        margin_of_error = t_critical * (std / np.sqrt(n))
+        # Exact two-tailed t quantile with n - 1 degrees of freedom
+        margin_of_error = half_width(data, confidence)
 
         return {
             "mean": mean,
@@ -93,11 +157,28 @@ class ScenarioTester:
             "or_blocking_probability": self.compute_confidence_interval(blocking_probs),
             "prep_queue_length": self.compute_confidence_interval(prep_queue_lengths),
             "num_replications": len(results),
+            "precision": self.precision,
             "raw_throughput": throughput_times,
             "raw_blocking": blocking_probs,
             "raw_prep_queue": prep_queue_lengths,
+            "raw_seeds": [r["seed"] for r in results],
         }
 
+        if self.bootstrap_method and len(results) >= 2:
+            # All metrics from one set of resample indices
+            names = ("throughput_time", "or_blocking_probability", "prep_queue_length")
+            boot = bootstrap_ci(
+                np.column_stack([throughput_times, blocking_probs, prep_queue_lengths]),
+                method=self.bootstrap_method,
+                seed=42,
+            )
+            for j, name in enumerate(names):
+                analysis[name]["bootstrap"] = {
+                    "method": self.bootstrap_method,
+                    "ci_lower": float(boot["ci_lower"][j]),
+                    "ci_upper": float(boot["ci_upper"][j]),
+                }
+
         return analysis
 
     def print_analysis(self, analysis: Dict, scenario_name: str = "Scenario"):
@@ -112,6 +193,12 @@ class ScenarioTester:
         tt = analysis["throughput_time"]
         print(f"   Mean: {tt['mean']:.2f} min")
         print(f"   95% CI: [{tt['ci_lower']:.2f}, {tt['ci_upper']:.2f}]")
+        if "bootstrap" in tt:
+            boot = tt["bootstrap"]
+            print(
+                f"   95% CI ({boot['method']} bootstrap): "
+                f"[{boot['ci_lower']:.2f}, {boot['ci_upper']:.2f}]"
+            )
         print(f"   Margin of Error: ±{tt['margin_of_error']:.2f} min")
         print(f"   Std Dev: {tt['std']:.2f} min")
 
@@ -119,6 +206,12 @@ class ScenarioTester:
         bp = analysis["or_blocking_probability"]
         print(f"   Mean: {bp['mean']:.4f} ({bp['mean']*100:.2f}%)")
         print(f"   95% CI: [{bp['ci_lower']:.4f}, {bp['ci_upper']:.4f}]")
+        if "bootstrap" in bp:
+            boot = bp["bootstrap"]
+            print(
+                f"   95% CI ({boot['method']} bootstrap): "
+                f"[{boot['ci_lower']:.4f}, {boot['ci_upper']:.4f}]"
+            )
         print(
             f"   Margin of Error: ±{bp['margin_of_error']:.4f} (±{bp['margin_of_error']*100:.2f}%)"
         )
@@ -128,13 +221,21 @@ class ScenarioTester:
         pq = analysis["prep_queue_length"]
         print(f"   Mean: {pq['mean']:.2f} patients")
         print(f"   95% CI: [{pq['ci_lower']:.2f}, {pq['ci_upper']:.2f}]")
+        if "bootstrap" in pq:
+            boot = pq["bootstrap"]
+            print(
+                f"   95% CI ({boot['method']} bootstrap): "
+                f"[{boot['ci_lower']:.2f}, {boot['ci_upper']:.2f}]"
+            )
         print(f"   Margin of Error: ±{pq['margin_of_error']:.2f}")
         print(f"   Std Dev: {pq['std']:.2f}")
 
         print(f"{'='*70}\n")
 
 
-def test_config_3p5r():
+def test_config_3p5r(
+    jobs=1, relative_precision=None, absolute_precision=None, cache=None
+):
     """Configuration 1: 3 prep, 1 OR, 5 recovery"""
     config = SimulationConfig(
         num_prep_rooms=3,
@@ -144,15 +245,24 @@ def test_config_3p5r():
         warmup_period=200.0,  # Warmup before monitoring
     )
 
-    tester = ScenarioTester(num_replications=20)
+    tester = ScenarioTester(
+        num_replications=20,
+        jobs=jobs,
+        relative_precision=relative_precision,
+        absolute_precision=absolute_precision,
+        cache=cache,
+    )
     results = tester.run_replications(config, "Config 1: 3 Prep, 1 OR, 5 Recovery")
     analysis = tester.analyze_results(results)
+    analysis["raw_rows"] = tester.rows
     tester.print_analysis(analysis, "Config 1 (3P-1O-5R)")
 
     return analysis
 
 
-def test_config_4p5r():
+def test_config_4p5r(
+    jobs=1, relative_precision=None, absolute_precision=None, cache=None
+):
     """Configuration 2: 4 prep, 1 OR, 5 recovery"""
     config = SimulationConfig(
         num_prep_rooms=4,
@@ -162,15 +272,24 @@ def test_config_4p5r():
         warmup_period=200.0,
     )
 
-    tester = ScenarioTester(num_replications=20)
+    tester = ScenarioTester(
+        num_replications=20,
+        jobs=jobs,
+        relative_precision=relative_precision,
+        absolute_precision=absolute_precision,
+        cache=cache,
+    )
     results = tester.run_replications(config, "Config 2: 4 Prep, 1 OR, 5 Recovery")
     analysis = tester.analyze_results(results)
+    analysis["raw_rows"] = tester.rows
     tester.print_analysis(analysis, "Config 2 (4P-1O-5R)")
 
     return analysis
 
 
-def test_config_3p4r():
+def test_config_3p4r(
+    jobs=1, relative_precision=None, absolute_precision=None, cache=None
+):
     """Configuration 3: 3 prep, 1 OR, 4 recovery"""
     config = SimulationConfig(
         num_prep_rooms=3,
@@ -180,104 +299,111 @@ def test_config_3p4r():
         warmup_period=200.0,
     )
 
-    tester = ScenarioTester(num_replications=20)
+    tester = ScenarioTester(
+        num_replications=20,
+        jobs=jobs,
+        relative_precision=relative_precision,
+        absolute_precision=absolute_precision,
+        cache=cache,
+    )
     results = tester.run_replications(config, "Config 3: 3 Prep, 1 OR, 4 Recovery")
     analysis = tester.analyze_results(results)
+    analysis["raw_rows"] = tester.rows
     tester.print_analysis(analysis, "Config 3 (3P-1O-4R)")
 
     return analysis
 
 
-def paired_comparison(
-    analysis1: Dict,
-    analysis2: Dict,
-    name1: str,
-    name2: str,
-    metric: str = "or_blocking_probability",
-):
+def compare_configurations(
+    analyses: Dict[str, Dict],
+    metrics=tuple(METRICS),
+    method: str = "holm",
+    alpha: float = 0.05,
+) -> Dict:
     """
-    Perform paired t-test for comparing two configurations
-    Assignment asks: "Do any values differ significantly?"
+    All-pairs paired t-tests of every metric over any number of named
+    configurations in one call, with Holm (or "bonferroni"/"none")
+    control of the family-wise error per metric, plus comparison with
+    the best (smallest mean). Replications are paired by seed: only seeds
+    with a replication in every configuration are used.
     """
+    names = list(analyses)
+    common = set.intersection(*(set(analyses[name]["raw_seeds"]) for name in names))
+    seeds = sorted(common)
+    n = len(seeds)
+
+    data = np.empty((len(metrics), len(names), n))
+    for i, name in enumerate(names):
+        for m, metric in enumerate(metrics):
+            by_seed = dict(
+                zip(analyses[name]["raw_seeds"], analyses[name][METRICS[metric][0]])
+            )
+            data[m, i] = [by_seed[seed] for seed in seeds]
+    # data is (metrics, configurations, replications)
+    pairs = all_pairs_comparison(data, alpha, method)
+    best = compare_with_best(data, alpha)
+
     print(f"\n{'='*70}")
-    print(f"🔬 PAIRED COMPARISON: {name1} vs {name2}")
-    print(f"   Metric: {metric}")
+    print(
+        f"🔬 ALL-PAIRS COMPARISON: {len(names)} configurations, {n} paired replications"
+    )
+    print(f"   Family-wise α={alpha} per metric ({method})")
     print(f"{'='*70}")
 
-    # Get raw data (same seeds used, so paired)
-    if metric == "or_blocking_probability":
-        data1 = analysis1["raw_blocking"]
-        data2 = analysis2["raw_blocking"]
-        unit = ""
-    elif metric == "prep_queue_length":
-        data1 = analysis1["raw_prep_queue"]
-        data2 = analysis2["raw_prep_queue"]
-        unit = " patients"
-    else:  # throughput_time
-        data1 = analysis1["raw_throughput"]
-        data2 = analysis2["raw_throughput"]
-        unit = " min"
-
-    # Compute differences
-    differences = [d1 - d2 for d1, d2 in zip(data1, data2)]
-
-    mean_diff = statistics.mean(differences)
-    std_diff = statistics.stdev(differences)
-    n = len(differences)
-
-    # t-statistic for paired test
-    t_stat = mean_diff / (std_diff / np.sqrt(n))
-
-    # t-critical for n=20, df=19, two-tailed 95% CI
-    t_critical = 2.093
-
-    # Confidence interval for difference
-    margin = t_critical * (std_diff / np.sqrt(n))
-    ci_lower = mean_diff - margin
-    ci_upper = mean_diff + margin
-
-    is_significant = abs(t_stat) > t_critical
-
-    print(f"\nMean difference: {mean_diff:.4f}{unit}")
-    print(f"95% CI for difference: [{ci_lower:.4f}, {ci_upper:.4f}]{unit}")
-    print(f"Std Dev of differences: {std_diff:.4f}")
-    print(f"t-statistic: {t_stat:.4f}")
-    print(f"t-critical (α=0.05, two-tailed): ±{t_critical}")
-
-    if is_significant:
-        print(
-            f"✅ SIGNIFICANT: Configurations differ significantly (|t| > {t_critical})"
+    width = max(len(name) for name in names)
+    comparison = {}
+    for m, metric in enumerate(metrics):
+        unit = METRICS[metric][1]
+        print(f"\n{metric}: < row smaller than column, > larger, · not significant")
+        print(" " * (width + 1) + " ".join(f"{j + 1:>2}" for j in range(len(names))))
+        symbols = np.where(
+            pairs["significant"][m],
+            np.where(pairs["mean_difference"][m] < 0, "<", ">"),
+            "·",
         )
-        print(f"   → {name1} vs {name2} show a statistically significant difference")
-    else:
+        np.fill_diagonal(symbols, "—")
+        for i, name in enumerate(names):
+            cells = [f"{symbol:>2}" for symbol in symbols[i]]
+            print(f"{name:<{width}} {' '.join(cells)}  ({i + 1})")
+
+        subset = [name for i, name in enumerate(names) if best["could_be_best"][m, i]]
         print(
-            f"❌ NOT SIGNIFICANT: No significant difference detected (|t| ≤ {t_critical})"
+            f"   Best: {names[best['best'][m]]} "
+            f"({best['means'][m, best['best'][m]]:.4f}{unit}); "
+            f"could be best: {', '.join(subset)}"
         )
-        print(f"   → Cannot conclude that {name1} and {name2} differ")
 
-    print(f"{'='*70}\n")
+        comparison[metric] = {
+            "configurations": names,
+            "mean_difference": pairs["mean_difference"][m].tolist(),
+            "ci_lower": pairs["ci_lower"][m].tolist(),
+            "ci_upper": pairs["ci_upper"][m].tolist(),
+            "adjusted_p_value": pairs["adjusted_p_value"][m].tolist(),
+            "significant": pairs["significant"][m].tolist(),
+            "best": names[best["best"][m]],
+            "could_be_best": subset,
+        }
 
-    return {
-        "mean_difference": mean_diff,
-        "ci_lower": ci_lower,
-        "ci_upper": ci_upper,
-        "t_statistic": t_stat,
-        "t_critical": t_critical,
-        "is_significant": is_significant,
-    }
+    print(f"{'='*70}\n")
+    return {"method": method, "alpha": alpha, "num_replications": n, **comparison}
 
 
-def run_all_scenarios():
-    """Main function to run all required scenarios"""
+def run_all_scenarios(
+    jobs=1, relative_precision=None, absolute_precision=None, cache=None
+):
+    """
+    Main function to run all required scenarios (a precision target turns
+    on sequential replications, see ScenarioTester)
+    """
     print("\n" + "=" * 70)
     print("🚀 ASSIGNMENT 3 - SURGERY SIMULATION")
     print("   20 replications × 1000 time units × 3 configurations")
     print("=" * 70)
 
     # Run all three configurations
-    config_3p5r = test_config_3p5r()
-    config_4p5r = test_config_4p5r()
-    config_3p4r = test_config_3p4r()
+    config_3p5r = test_config_3p5r(jobs, relative_precision, absolute_precision, cache)
+    config_4p5r = test_config_4p5r(jobs, relative_precision, absolute_precision, cache)
+    config_3p4r = test_config_3p4r(jobs, relative_precision, absolute_precision, cache)
 
     # Comparative summary
     print("\n" + "=" * 70)
@@ -306,38 +432,35 @@ def run_all_scenarios():
             f"{pq['mean']:5.2f} ± {pq['margin_of_error']:4.2f}"
         )
 
-    # Paired comparisons (as required by assignment)
+    # Paired comparisons (as required by assignment): every pair of
+    # configurations for every metric, Holm-adjusted
     print("\n" + "=" * 70)
     print("📊 STATISTICAL COMPARISONS (Paired t-tests)")
     print("=" * 70)
 
-    # Compare 3p5r vs 4p5r (effect of more prep rooms)
-    paired_comparison(
-        config_3p5r, config_4p5r, "3P-5R", "4P-5R", "or_blocking_probability"
-    )
-    paired_comparison(config_3p5r, config_4p5r, "3P-5R", "4P-5R", "prep_queue_length")
-
-    # Compare 3p5r vs 3p4r (effect of fewer recovery rooms)
-    paired_comparison(
-        config_3p5r, config_3p4r, "3P-5R", "3P-4R", "or_blocking_probability"
-    )
-    paired_comparison(config_3p5r, config_3p4r, "3P-5R", "3P-4R", "prep_queue_length")
+    comparisons = compare_configurations(dict(scenarios))
 
     # Save results
     results_data = {
         "config_3p5r": {k: v for k, v in config_3p5r.items() if "raw_" not in k},
         "config_4p5r": {k: v for k, v in config_4p5r.items() if "raw_" not in k},
         "config_3p4r": {k: v for k, v in config_3p4r.items() if "raw_" not in k},
+        "comparisons": comparisons,
     }
 
     with open("results/assignment3_results.json", "w") as f:
         json.dump(results_data, f, indent=2)
 
+    # One row per replication of every configuration
+    rows = [row for _, analysis in scenarios for row in analysis["raw_rows"]]
+    save_results("results/assignment3_replications.npz", to_columns(rows))
+
     print("\n✅ Results saved to: results/assignment3_results.json")
+    print("   Replications saved to: results/assignment3_replications.npz")
     print("\n" + "=" * 70)
     print("✨ SIMULATION COMPLETE")
     print("=" * 70)
 
 
 if __name__ == "__main__":
-    run_all_scenarios()
+    run_all_scenarios(cache=ResultCache())
@@ -0,0 +1,80 @@
+"""
+Assignment 4: Streaming Statistics Accumulators
+Constant-memory summaries updated one observation at a time
+"""
+
+import math
+
+
+class RunningStats:
+    """Count, sum, mean, variance (Welford), min and max of a stream"""
+
+    __slots__ = ("count", "total", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        """Add one observation"""
+        self.count += 1
+        self.total += x
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0 for fewer than two observations)"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class TimeWeightedStat:
+    """
+    Time integral of a piecewise-constant level such as a queue length or
+    the number of busy servers.
+
+    ``update()`` is called whenever the level may have changed; the area
+    under the curve only accumulates from ``start`` (end of warmup) on, so
+    no sampling process is needed and the time average is exact.
+    """
+
+    __slots__ = ("start", "last_time", "level", "area", "max")
+
+    def __init__(self, start: float = 0.0, level: float = 0.0):
+        self.start = start
+        self.last_time = start
+        self.level = level
+        self.area = 0.0
+        self.max = level
+
+    def update(self, now: float, level: float):
+        """Record that the level is `level` from time `now` on"""
+        if now > self.last_time:
+            self.area += self.level * (now - self.last_time)
+            self.last_time = now
+            if self.level > self.max:
+                self.max = self.level
+        self.level = level
+
+    def finish(self, now: float):
+        """Close the integral at the end of the run"""
+        self.update(now, self.level)
+
+    @property
+    def mean(self) -> float:
+        """Time average over [start, last update]"""
+        duration = self.last_time - self.start
+        return self.area / duration if duration > 0 else 0.0
@@ -0,0 +1,107 @@
+"""
+Assignment 4: Batch Means
+One long run after a single warmup, split into nearly independent batches
+"""
+
+import numpy as np
+from dataclasses import replace
+from typing import Dict
+from surgery_simulation_a4 import SurgerySimulation
+from step1_serial_correlation import compute_autocorrelation
+from replication_runner import half_width
+
+
+def batch_series(sim: SurgerySimulation, batch_length: float, metric: str):
+    """
+    Per-batch averages of `metric` from an "array" mode run.
+
+    avg_queue_length batches the queue seen by arriving patients by arrival
+    time, avg_throughput_time batches throughput times by departure time.
+    Batches without observations count as 0.0, as in step 1.
+    """
+    store = sim.store
+    warmup = sim.config.warmup_period
+    num_batches = int((sim.config.sim_duration - warmup) // batch_length)
+
+    if metric == "avg_queue_length":
+        times = store["arrival_time"]
+        values = store["prep_queue_length_on_arrival"]
+    elif metric == "avg_throughput_time":
+        times = store["recovery_end"]
+        values = times - store["arrival_time"]
+        # Patients still in the system have recovery_end = NaN
+        done = ~np.isnan(times)
+        values = values[done]
+        times = times[done]
+    else:
+        raise ValueError(f"Unknown batch means metric: {metric}")
+
+    batch = np.floor((times - warmup) / batch_length)
+    in_range = (batch >= 0) & (batch < num_batches)
+    batch = batch[in_range].astype(int)
+
+    totals = np.bincount(batch, weights=values[in_range], minlength=num_batches)
+    counts = np.bincount(batch, minlength=num_batches)
+    return np.where(counts > 0, totals / np.maximum(counts, 1), 0.0)
+
+
+def run_batch_means(
+    config,
+    measurement_length: float,
+    metric: str = "avg_queue_length",
+    min_batches: int = 10,
+    initial_batch_length: float = 50.0,
+    max_correlation: float = 0.2,
+    max_lag: int = 3,
+) -> Dict:
+    """
+    Estimate `metric` from one run of warmup + measurement_length.
+
+    The batch length starts at initial_batch_length and doubles until the
+    batch means' autocorrelations at lags 1..max_lag (step 1's
+    compute_autocorrelation) are all below max_correlation, or until
+    doubling would leave fewer than min_batches batches. The result has
+    the same keys as run_single_experiment(), with one "replicate" per
+    batch and a t-based CI over the batch means, plus "converged": whether
+    the correlation criterion was met. If it was not, the batch means are
+    still correlated and the CI is too narrow; a warning is printed.
+    """
+    sim = SurgerySimulation(
+        replace(
+            config,
+            sim_duration=config.warmup_period + measurement_length,
+            record_mode="array",
+        )
+    )
+    sim.run()
+
+    batch_length = initial_batch_length
+    while True:
+        means = batch_series(sim, batch_length, metric)
+        correlations = compute_autocorrelation(
+            [means], max_lag=min(max_lag, len(means) - 2)
+        )
+        independent = all(abs(c) < max_correlation for c in correlations)
+        if independent or len(means) // 2 < min_batches:
+            break
+        batch_length *= 2
+
+    if not independent:
+        print(
+            f"⚠️  Warning: {len(means)} batches of {batch_length:g} still have "
+            f"lag correlations {[round(float(c), 2) for c in correlations]} "
+            f"(limit {max_correlation}); the CI assumes independent batches, "
+            f"so use a longer measurement_length"
+        )
+
+    replicates = means.tolist()
+    return {
+        "mean": np.mean(replicates),
+        "std": np.std(replicates, ddof=1),
+        "half_width": half_width(replicates),
+        "num_replications": len(replicates),
+        "replicates": replicates,
+        "batch_length": batch_length,
+        "lag_correlations": [float(c) for c in correlations],
+        "converged": bool(independent),
+    }
@@ -0,0 +1,326 @@
+"""
+Assignment 4: Vectorized Batch Simulation
+Simulates many replications of the surgery line at once with NumPy
+"""
+
+import numpy as np
+from typing import Dict, Sequence
+from surgery_simulation_a4 import SimulationConfig, DistributionType
+from variate_streams import INPUTS, block_sampler, spawn_generators
+
+# Sentinel for empty server slots and unscheduled events
+FREE = -1
+NEVER = np.inf
+
+
+def sample_matrix(
+    rngs, dist_type: DistributionType, param1: float, param2: float, size: int
+) -> np.ndarray:
+    """Sample one row of `size` values per generator"""
+    return np.stack(
+        [block_sampler(rng, dist_type.value, param1, param2)(size) for rng in rngs]
+    )
+
+
+def first_index(mask: np.ndarray) -> np.ndarray:
+    """Column of the first True value in each row (rows must have one)"""
+    return np.argmax(mask, axis=1)
+
+
+class BatchState:
+    """Pre-sampled inputs and server state for a batch of replications"""
+
+    def __init__(self, config: SimulationConfig, seeds: Sequence[int]):
+        self.config = config
+        self.seeds = list(seeds)
+        self.num_reps = len(seeds)
+
+        self.sample(config.expected_arrivals())
+
+    def sample(self, num_patients: int):
+        """Pre-sample every patient's arrival, priority and service times"""
+        config = self.config
+
+        while True:
+            # Same per-input generators as the event engines: patient i of
+            # seed s gets identical inputs. They are re-created for every
+            # attempt, so a doubled block redraws the same prefix (CRN).
+            generators = [spawn_generators(seed) for seed in self.seeds]
+            rngs = {name: [g[name] for g in generators] for name in INPUTS}
+            interarrivals = sample_matrix(
+                rngs["arrival"],
+                config.interarrival_dist,
+                config.interarrival_param1,
+                config.interarrival_param2,
+                num_patients,
+            )
+            arrivals = np.cumsum(interarrivals, axis=1)
+            if np.all(arrivals[:, -1] >= config.sim_duration):
+                break
+            num_patients *= 2
+
+        self.num_patients = num_patients
+        self.arrival = arrivals
+        self.is_emergency = (
+            np.stack([rng.uniform(0.0, 1.0, num_patients) for rng in rngs["priority"]])
+            < config.emergency_probability
+        )
+        self.prep_time = sample_matrix(
+            rngs["prep"],
+            config.prep_dist,
+            config.prep_param1,
+            config.prep_param2,
+            num_patients,
+        )
+        self.surgery_time = sample_matrix(
+            rngs["surgery"],
+            DistributionType.EXPONENTIAL,
+            config.surgery_mean,
+            0.0,
+            num_patients,
+        )
+        self.recovery_time = sample_matrix(
+            rngs["recovery"],
+            config.recovery_dist,
+            config.recovery_param1,
+            config.recovery_param2,
+            num_patients,
+        )
+
+        # Prep service order: emergencies first, each class in arrival order
+        self.order = np.argsort(~self.is_emergency, axis=1, kind="stable")
+        self.num_emergency = self.is_emergency.sum(axis=1)
+
+
+def simulate_batch(config: SimulationConfig, seeds: Sequence[int]) -> Dict:
+    """
+    Simulate one replication per seed in a single vectorized pass.
+
+    Every replication advances by its own next event on each step, so the
+    Python loop runs once per event of the busiest replication rather than
+    once per event of every replication. Returns the keys of
+    SurgerySimulation.get_statistics() as arrays indexed like `seeds`.
+    """
+    state = BatchState(config, seeds)
+    R = state.num_reps
+    N = state.num_patients
+    rows = np.arange(R)
+    warmup = config.warmup_period
+    until = config.sim_duration
+
+    # Electives queue behind every emergency that requested earlier or later
+    priority_offset = np.where(state.is_emergency, 0.0, 2.0 * until + 1.0)
+
+    # Server slots: patient index (FREE if empty) and event/request times
+    prep_patient = np.full((R, config.num_prep_rooms), FREE)
+    prep_end = np.full((R, config.num_prep_rooms), NEVER)
+    prep_done = np.full((R, config.num_prep_rooms), NEVER)  # OR request key
+    or_patient = np.full((R, config.num_operating_rooms), FREE)
+    or_end = np.full((R, config.num_operating_rooms), NEVER)
+    or_done = np.full((R, config.num_operating_rooms), NEVER)  # recovery request
+    recovery_patient = np.full((R, config.num_recovery_rooms), FREE)
+    recovery_end = np.full((R, config.num_recovery_rooms), NEVER)
+
+    # Entrance queue: arrived patients minus those who started preparation
+    num_arrived = np.zeros(R, dtype=int)
+    num_started = np.zeros(R, dtype=int)
+    next_emergency = np.zeros(R, dtype=int)
+    next_elective = state.num_emergency.copy()
+
+    # Statistics accumulators
+    queue_sum = np.zeros(R)
+    queue_count = np.zeros(R, dtype=int)
+    queue_max = np.zeros(R, dtype=int)
+    throughput_sum = np.zeros(R)
+    throughput_sumsq = np.zeros(R)
+    throughput_count = np.zeros(R, dtype=int)
+
+    # Time-weighted levels, integrated from warmup on
+    last = np.full(R, float(warmup))
+    queue_area = np.zeros(R)
+    prep_area = np.zeros(R)
+    or_area = np.zeros(R)
+    blocked_area = np.zeros(R)
+    recovery_area = np.zeros(R)
+
+    while True:
+        next_arrival = np.where(
+            num_arrived < N, state.arrival[rows, np.minimum(num_arrived, N - 1)], NEVER
+        )
+        candidates = np.stack(
+            [
+                next_arrival,
+                prep_end.min(axis=1),
+                or_end.min(axis=1),
+                recovery_end.min(axis=1),
+            ]
+        )
+        event_type = candidates.argmin(axis=0)
+        now = candidates[event_type, rows]
+
+        # The state left by the previous step holds until this step's event
+        # (or until sim_duration for finished replications)
+        t = np.minimum(now, until)
+        dt = np.maximum(t - last, 0.0)
+        last = np.maximum(last, t)
+        queue_area += (num_arrived - num_started) * dt
+        prep_area += (prep_patient != FREE).sum(axis=1) * dt
+        or_area += (or_patient != FREE).sum(axis=1) * dt
+        blocked_area += (or_done < NEVER).sum(axis=1) * dt
+        recovery_area += (recovery_patient != FREE).sum(axis=1) * dt
+
+        active = now < until
+        if not active.any():
+            break
+
+        # ARRIVAL: record entrance queue length, patient joins the queue
+        r = np.nonzero(active & (event_type == 0))[0]
+        if r.size:
+            queue_length = num_arrived[r] - num_started[r]
+            measured = now[r] >= warmup
+            queue_sum[r] += np.where(measured, queue_length, 0)
+            queue_count[r] += measured
+            queue_max[r] = np.where(
+                measured, np.maximum(queue_max[r], queue_length), queue_max[r]
+            )
+            num_arrived[r] += 1
+
+        # PREP END: patient keeps the prep room and requests an OR
+        r = np.nonzero(active & (event_type == 1))[0]
+        if r.size:
+            s = prep_end[r].argmin(axis=1)
+            prep_end[r, s] = NEVER
+            prep_done[r, s] = now[r] + priority_offset[r, prep_patient[r, s]]
+
+        # SURGERY END: patient blocks the OR and requests a recovery room
+        r = np.nonzero(active & (event_type == 2))[0]
+        if r.size:
+            s = or_end[r].argmin(axis=1)
+            or_end[r, s] = NEVER
+            or_done[r, s] = now[r]
+
+        # RECOVERY END: patient departs
+        r = np.nonzero(active & (event_type == 3))[0]
+        if r.size:
+            s = recovery_end[r].argmin(axis=1)
+            throughput = now[r] - state.arrival[r, recovery_patient[r, s]]
+            measured = now[r] > warmup
+            throughput_sum[r] += np.where(measured, throughput, 0.0)
+            throughput_sumsq[r] += np.where(measured, throughput**2, 0.0)
+            throughput_count[r] += measured
+            recovery_end[r, s] = NEVER
+            recovery_patient[r, s] = FREE
+
+        # Start whatever the events made possible, downstream first. Each
+        # event frees at most one server per stage, so one pass suffices.
+        r = np.nonzero(
+            active
+            & (recovery_patient == FREE).any(axis=1)
+            & (or_done < NEVER).any(axis=1)
+        )[0]
+        if r.size:
+            o = or_done[r].argmin(axis=1)
+            s = first_index(recovery_patient[r] == FREE)
+            patient = or_patient[r, o]
+            recovery_patient[r, s] = patient
+            recovery_end[r, s] = now[r] + state.recovery_time[r, patient]
+            # OR is released only after the recovery room is secured
+            or_patient[r, o] = FREE
+            or_done[r, o] = NEVER
+
+        r = np.nonzero(
+            active & (or_patient == FREE).any(axis=1) & (prep_done < NEVER).any(axis=1)
+        )[0]
+        if r.size:
+            p = prep_done[r].argmin(axis=1)
+            s = first_index(or_patient[r] == FREE)
+            patient = prep_patient[r, p]
+            or_patient[r, s] = patient
+            or_end[r, s] = now[r] + state.surgery_time[r, patient]
+            # Prep room is released when surgery starts
+            prep_patient[r, p] = FREE
+            prep_done[r, p] = NEVER
+
+        r = np.nonzero(
+            active & (prep_patient == FREE).any(axis=1) & (num_arrived > num_started)
+        )[0]
+        if r.size:
+            e = next_emergency[r]
+            emergency_waiting = (e < state.num_emergency[r]) & (
+                state.order[r, np.minimum(e, N - 1)] < num_arrived[r]
+            )
+            k = np.where(emergency_waiting, e, next_elective[r])
+            next_emergency[r] += emergency_waiting
+            next_elective[r] += ~emergency_waiting
+            num_started[r] += 1
+
+            patient = state.order[r, k]
+            s = first_index(prep_patient[r] == FREE)
+            prep_patient[r, s] = patient
+            prep_end[r, s] = now[r] + state.prep_time[r, patient]
+
+    has_patients = throughput_count > 0
+    count = np.maximum(throughput_count, 1)
+    avg_throughput = throughput_sum / count
+    variance = (throughput_sumsq - count * avg_throughput**2) / np.maximum(count - 1, 1)
+    duration = until - warmup if until > warmup else np.inf
+
+    def time_average(area, capacity=1):
+        return np.where(has_patients, area / (duration * capacity), 0.0)
+
+    return {
+        "num_patients": throughput_count,
+        "avg_queue_length": np.where(
+            has_patients & (queue_count > 0),
+            queue_sum / np.maximum(queue_count, 1),
+            0.0,
+        ),
+        "max_queue_length": np.where(has_patients, queue_max, 0),
+        "avg_throughput_time": np.where(has_patients, avg_throughput, 0.0),
+        "std_throughput_time": np.where(
+            throughput_count > 1, np.sqrt(np.maximum(variance, 0.0)), 0.0
+        ),
+        "time_avg_queue_length": time_average(queue_area),
+        "prep_utilization": time_average(prep_area, config.num_prep_rooms),
+        "or_utilization": time_average(or_area, config.num_operating_rooms),
+        "or_blocking_probability": time_average(
+            blocked_area, config.num_operating_rooms
+        ),
+        "recovery_utilization": time_average(recovery_area, config.num_recovery_rooms),
+    }
+
+
+def quick_test():
+    """Compare batch means against the event engine"""
+    import time
+    from surgery_simulation_a4 import SurgerySimulation
+
+    print("=== Testing Batch Simulation ===\n")
+
+    config = SimulationConfig(emergency_probability=0.2)
+    seeds = list(range(42, 242))
+
+    start = time.perf_counter()
+    batch = simulate_batch(config, seeds)
+    batch_time = time.perf_counter() - start
+
+    config.engine = "fast"
+    start = time.perf_counter()
+    event_queue = []
+    for seed in seeds:
+        config.random_seed = seed
+        sim = SurgerySimulation(config)
+        sim.run()
+        event_queue.append(sim.get_statistics()["avg_queue_length"])
+    event_time = time.perf_counter() - start
+
+    print(f"Replications: {len(seeds)}")
+    print(
+        f"Batch engine:  queue = {batch['avg_queue_length'].mean():.3f}, "
+        f"throughput = {batch['avg_throughput_time'].mean():.2f} ({batch_time:.2f} s)"
+    )
+    print(f"Event engine:  queue = {np.mean(event_queue):.3f} ({event_time:.2f} s)")
+
+
+if __name__ == "__main__":
+    quick_test()
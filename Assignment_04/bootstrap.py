@@ -0,0 +1,137 @@
+"""
+Assignment 4: Bootstrap Confidence Intervals
+Percentile and BCa intervals for many statistics from one resample array
+"""
+
+import numpy as np
+from typing import Dict
+
+DEFAULT_RESAMPLES = 10000
+
+
+def resample_indices(n: int, num_resamples: int = DEFAULT_RESAMPLES, seed=None):
+    """(num_resamples, n) row indices drawn with replacement in one call"""
+    return np.random.default_rng(seed).integers(0, n, size=(num_resamples, n))
+
+
+def stratified_indices(groups, num_resamples: int = DEFAULT_RESAMPLES, seed=None):
+    """
+    (num_resamples, n) row indices where each row is replaced by a random
+    row of its own group (e.g. a replication of the same design point)
+    """
+    groups = np.asarray(groups)
+    order = np.argsort(groups, kind="stable")
+    _, index, counts = np.unique(groups, return_inverse=True, return_counts=True)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    draws = np.random.default_rng(seed).random((num_resamples, len(groups)))
+    return order[starts[index] + (draws * counts[index]).astype(int)]
+
+
+def jackknife_means(data: np.ndarray) -> np.ndarray:
+    """Leave-one-out means of each column: row i is the mean without row i"""
+    n = len(data)
+    return (data.sum(axis=0) - data) / (n - 1)
+
+
+def column_quantiles(values: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Quantile q[j] of column j of `values` (linear interpolation)"""
+    values = np.sort(values, axis=0)
+    position = np.clip(q, 0, 1) * (len(values) - 1)
+    below = np.floor(position).astype(int)
+    above = np.minimum(below + 1, len(values) - 1)
+    columns = np.arange(values.shape[1])
+    fraction = position - below
+    return (1 - fraction) * values[below, columns] + fraction * values[above, columns]
+
+
+def confidence_interval(
+    estimate: np.ndarray,
+    replicates: np.ndarray,
+    jackknife: np.ndarray = None,
+    confidence: float = 0.95,
+    method: str = "bca",
+):
+    """
+    Bootstrap interval of each of m statistics from its estimate (m,),
+    its bootstrap replicates (B, m) and, for BCa, its jackknife
+    (leave-one-out) values (n, m). Returns (lower, upper) arrays.
+
+    BCa (Efron, 1987) shifts the percentile levels by the bias of the
+    replicates around the estimate (z0) and by the skewness of the
+    jackknife values (acceleration a), which matters for the skewed
+    replicate distributions of queue lengths and blocking probabilities.
+    """
+    from scipy.special import ndtr, ndtri
+
+    estimate = np.atleast_1d(np.asarray(estimate, dtype=float))
+    replicates = np.asarray(replicates, dtype=float).reshape(len(replicates), -1)
+    alpha = (1 - confidence) / 2
+    levels = np.array([alpha, 1 - alpha])[:, None]
+
+    if method == "percentile":
+        q = np.broadcast_to(levels, (2, len(estimate)))
+    elif method == "bca":
+        if jackknife is None:
+            raise ValueError("BCa intervals need the jackknife values")
+        jackknife = np.asarray(jackknife, dtype=float).reshape(len(jackknife), -1)
+        B = len(replicates)
+        below = np.mean(replicates < estimate, axis=0) + 0.5 * np.mean(
+            replicates == estimate, axis=0
+        )
+        z0 = ndtri(np.clip(below, 0.5 / B, 1 - 0.5 / B))
+
+        count = np.maximum(np.sum(~np.isnan(jackknife), axis=0), 1)
+        deviations = np.nansum(jackknife, axis=0) / count - jackknife
+        numerator = np.nansum(deviations**3, axis=0)
+        denominator = 6 * np.nansum(deviations**2, axis=0) ** 1.5
+        with np.errstate(divide="ignore", invalid="ignore"):
+            acceleration = np.where(denominator > 0, numerator / denominator, 0.0)
+
+        z = ndtri(levels)
+        q = ndtr(z0 + (z0 + z) / (1 - acceleration * (z0 + z)))
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    lower = column_quantiles(replicates, q[0])
+    upper = column_quantiles(replicates, q[1])
+    # Statistics that never vary (e.g. no blocking at all) get a point
+    constant = np.all(replicates == replicates[:1], axis=0)
+    lower = np.where(constant, estimate, lower)
+    upper = np.where(constant, estimate, upper)
+    return lower, upper
+
+
+def bootstrap_ci(
+    data,
+    confidence: float = 0.95,
+    method: str = "bca",
+    num_resamples: int = DEFAULT_RESAMPLES,
+    seed=None,
+) -> Dict[str, np.ndarray]:
+    """
+    Bootstrap intervals of the mean of every column of `data` (n
+    replications x m metrics/configurations) from one shared set of
+    resample indices; a 1-D `data` is one column
+    """
+    data = np.asarray(data, dtype=float)
+    columns = data.reshape(len(data), -1)
+    if len(columns) < 2:
+        raise ValueError("Bootstrap intervals need 2+ replications")
+
+    estimate = columns.mean(axis=0)
+    indices = resample_indices(len(columns), num_resamples, seed)
+    replicates = columns[indices].mean(axis=1)  # (B, m)
+    jackknife = jackknife_means(columns) if method == "bca" else None
+    lower, upper = confidence_interval(
+        estimate, replicates, jackknife, confidence, method
+    )
+
+    shape = data.shape[1:]
+    return {
+        "mean": estimate.reshape(shape),
+        "ci_lower": lower.reshape(shape),
+        "ci_upper": upper.reshape(shape),
+        "std_error": replicates.std(axis=0, ddof=1).reshape(shape),
+        "method": method,
+        "num_resamples": num_resamples,
+    }
@@ -0,0 +1,332 @@
+"""
+Assignment 4: Engine Benchmark
+Speed and memory of every surgery-model implementation over a parameter grid
+
+Usage:
+    python engine_benchmark.py                           # full grid
+    python engine_benchmark.py --backends a4-fast a4-simpy --horizons 10000
+    python engine_benchmark.py --output new.json --compare old.json
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ASSIGNMENT_02 = os.path.join(HERE, "..", "Assignment_02", "EventBase_Assignment_02.py")
+ASSIGNMENT_03 = os.path.join(HERE, "..", "Assignment_03")
+
+# The vectorized backend only pays off across replications; it runs this
+# many seeds at once and counts the patients of all of them
+BATCH_SEEDS = 10
+
+BACKENDS = (
+    "a4-simpy",  # Assignment 4 SurgerySimulation, SimPy processes
+    "a4-fast",  # Assignment 4 FastTandemEngine
+    "a4-batch",  # Assignment 4 vectorized simulate_batch (BATCH_SEEDS seeds)
+    "a3-simpy",  # Assignment 3 SurgerySimulation
+    "a3-priority",  # Assignment 3 PrioritySimulation
+    "simulus",  # Assignment 2 simulus event scheduling script
+)
+
+
+# Horizon of the untimed warm-up run before each measurement
+WARMUP_HORIZON = 1000.0
+
+
+def a4_runner(point, engine):
+    """Setup (imports, config) of an Assignment 4 run; returns the run itself"""
+    from dataclasses import replace
+    import simpy  # imported lazily by SurgerySimulation; not part of the timing
+    from surgery_simulation_a4 import FastTandemEngine, SimulationConfig
+    from surgery_simulation_a4 import SurgerySimulation
+    from batch_simulation import simulate_batch
+
+    config = SimulationConfig(
+        num_prep_rooms=point["prep_rooms"],
+        num_recovery_rooms=point["recovery_rooms"],
+        interarrival_param1=point["interarrival"],
+        sim_duration=point["horizon"],
+        warmup_period=0.0,
+    )
+
+    def run():
+        if engine == "batch":
+            seeds = range(config.random_seed, config.random_seed + BATCH_SEEDS)
+            return None, int(simulate_batch(config, seeds)["num_patients"].sum())
+
+        sim = SurgerySimulation(replace(config, engine=engine))
+        if engine == "fast":
+            sim.create_streams()
+            fast_engine = FastTandemEngine(sim)
+            fast_engine.run()
+            events = fast_engine.num_events
+        else:
+            sim.run()
+            events = next(sim.env._eid)
+        return events, sim.get_statistics()["num_patients"]
+
+    return run
+
+
+def a3_runner(point, priority):
+    """Setup of an Assignment 3 run; returns the run itself"""
+    sys.path.insert(0, ASSIGNMENT_03)
+    import simpy  # not part of the timing
+
+    if priority:
+        from personal_twist import PrioritySimulation as Simulation
+        from personal_twist import SimulationConfig
+    else:
+        from surgery_simulation import SurgerySimulation as Simulation
+        from surgery_simulation import SimulationConfig
+
+    config = SimulationConfig(
+        num_prep_rooms=point["prep_rooms"],
+        num_recovery_rooms=point["recovery_rooms"],
+        interarrival_mean=point["interarrival"],
+        sim_duration=point["horizon"],
+        warmup_period=0.0,
+    )
+
+    def run():
+        sim = Simulation(config)
+        sim.run()
+        stats = sim.get_statistics()
+        return next(sim.env._eid), stats["num_patients"] if stats else 0
+
+    return run
+
+
+def simulus_runner(point):
+    """
+    The Assignment 2 script runs at module level with constants at the top;
+    they are substituted in its source for the grid point, and the source
+    compiled, before the run. simulus is imported here so that the script's
+    own import of it is a lookup in sys.modules.
+    """
+    import simulus
+
+    with open(ASSIGNMENT_02) as f:
+        source = f.read()
+    for name, value in (
+        ("MEAN_INTERARRIVAL", point["interarrival"]),
+        ("P_PREP", point["prep_rooms"]),
+        ("R_RECOVERY", point["recovery_rooms"]),
+        ("SIM_END", point["horizon"]),
+    ):
+        source, found = re.subn(
+            rf"^{name} = .*$", f"{name} = {value!r}", source, flags=re.M
+        )
+        if found != 1:
+            raise ValueError(f"Unknown simulus constant: {name}")
+    code = compile(source, ASSIGNMENT_02, "exec")
+
+    def run():
+        namespace = {"__name__": "simulus_benchmark"}
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(code, namespace)
+        events = namespace["sim"]._runtime["executed_events"]
+        return events, len(namespace["completed_throughputs"])
+
+    return run
+
+
+def make_runner(point):
+    backend = point["backend"]
+    if backend.startswith("a4-"):
+        return a4_runner(point, backend[3:])
+    elif backend in ("a3-simpy", "a3-priority"):
+        return a3_runner(point, backend == "a3-priority")
+    elif backend == "simulus":
+        return simulus_runner(point)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def run_point(point) -> dict:
+    """
+    Run one grid point in this process and measure it. Imports and setup
+    happen before the timer, after an untimed warm-up run (at a short
+    horizon) of the same engine, so that every backend is timed on its
+    simulation alone.
+    """
+    make_runner({**point, "horizon": min(point["horizon"], WARMUP_HORIZON)})()
+    run = make_runner(point)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    events, patients = run()
+    seconds = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        **point,
+        "seconds": seconds,
+        "events": events,
+        "patients": patients,
+        "events_per_sec": events / seconds if events is not None else None,
+        "patients_per_sec": patients / seconds,
+        "us_per_patient": 1e6 * seconds / max(patients, 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": rss_after / 1024,
+        "run_rss_mb": (rss_after - rss_before) / 1024,
+    }
+
+
+def measure(point, repeats: int) -> dict:
+    """Best of `repeats` runs, each in a fresh interpreter (for peak RSS)"""
+    best = None
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", json.dumps(point)],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=HERE,
+        ).stdout
+        result = json.loads(output)
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def point_key(result) -> tuple:
+    return tuple(
+        result[name]
+        for name in (
+            "backend",
+            "interarrival",
+            "prep_rooms",
+            "recovery_rooms",
+            "horizon",
+        )
+    )
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=HERE,
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results, baseline_path: str, threshold: float) -> bool:
+    """Print µs/patient against a baseline file; True if nothing slowed down"""
+    with open(baseline_path) as f:
+        baseline = {point_key(r): r for r in json.load(f)["results"]}
+
+    print(f"\nComparison with {baseline_path} (µs per patient, new / old)")
+    print("-" * 78)
+    ok = True
+    for result in results:
+        old = baseline.get(point_key(result))
+        if old is None:
+            continue
+        ratio = result["us_per_patient"] / old["us_per_patient"]
+        slower = ratio > 1 + threshold
+        ok &= not slower
+        print(
+            f"{result['backend']:<12} ia={result['interarrival']:<5g} "
+            f"{result['prep_rooms']}P/{result['recovery_rooms']}R "
+            f"T={result['horizon']:<8g} {old['us_per_patient']:9.1f} -> "
+            f"{result['us_per_patient']:9.1f}  x{ratio:5.2f}{'  ✗ slower' if slower else ''}"
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Surgery engine benchmark")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument(
+        "--interarrivals", nargs="+", type=float, default=[20.0, 25.0, 30.0]
+    )
+    parser.add_argument(
+        "--capacities", nargs="+", default=["3x3", "4x4"], help="PREPxRECOVERY"
+    )
+    parser.add_argument(
+        "--horizons", nargs="+", type=float, default=[10000.0, 100000.0]
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="results/engine_benchmark.json")
+    parser.add_argument("--compare", help="earlier output file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)"
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_point(json.loads(args.worker))))
+        return 0
+
+    for backend in args.backends:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+
+    print(
+        f"{'Backend':<12} {'IA':>5} {'Cap':>5} {'Horizon':>9} {'events/s':>11} "
+        f"{'patients/s':>11} {'µs/patient':>11} {'RSS MB':>8}"
+    )
+    print("-" * 78)
+
+    results = []
+    for backend, interarrival, capacity, horizon in itertools.product(
+        args.backends, args.interarrivals, args.capacities, args.horizons
+    ):
+        prep_rooms, recovery_rooms = (int(n) for n in capacity.split("x"))
+        point = {
+            "backend": backend,
+            "interarrival": interarrival,
+            "prep_rooms": prep_rooms,
+            "recovery_rooms": recovery_rooms,
+            "horizon": horizon,
+        }
+        result = measure(point, args.repeats)
+        results.append(result)
+        events_per_sec = (
+            f"{result['events_per_sec']:11.0f}"
+            if result["events_per_sec"] is not None
+            else f"{'-':>11}"
+        )
+        print(
+            f"{backend:<12} {interarrival:5g} {capacity:>5} {horizon:9g} "
+            f"{events_per_sec} {result['patients_per_sec']:11.0f} "
+            f"{result['us_per_patient']:11.1f} {result['peak_rss_mb']:8.1f}"
+        )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "repeats": args.repeats,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\n✅ Results saved to: {args.output}")
+
+    if args.compare and not compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Assignment 4: Experiment Journal
+Append-only JSON Lines record of finished replications, for resuming
+"""
+
+import json
+import os
+from typing import Callable, Dict, List, Optional, Sequence
+
+JOURNAL_PATH = "results/experiment_journal.jsonl"
+
+
+class ExperimentJournal:
+    """
+    One JSON line per finished replication: {"key", "seed", "code", ...,
+    "stats"}.
+
+    `key` identifies the configuration (SimulationConfig.digest() without
+    the seed) and `code` the model code version (result_cache.code_version),
+    so a restarted series skips every (key, seed) pair already in the file
+    for the same model code, and reruns it after the model changes. With
+    resume=False the file is started afresh. Lines are flushed and fsynced as each chunk of
+    replications finishes; a line cut short by a crash is dropped on load.
+    """
+
+    def __init__(self, path: str = JOURNAL_PATH, resume: bool = True):
+        self.path = path
+        self.entries = {}  # (key, seed) -> record
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        # Drop a partial last line so new lines start on a line boundary
+        complete = data[: data.rfind(b"\n") + 1]
+        if len(complete) < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(len(complete))
+
+        for line in complete.decode().splitlines():
+            if line.strip():
+                record = json.loads(line)
+                self.entries[(record["key"], record["seed"])] = record
+
+    def append(self, records: Sequence[Dict]):
+        """Write records and force them to disk"""
+        with open(self.path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record, default=lambda value: value.item()) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for record in records:
+            self.entries[(record["key"], record["seed"])] = record
+
+    def __contains__(self, key_seed) -> bool:
+        return key_seed in self.entries
+
+    def run(
+        self,
+        key: str,
+        seeds: Sequence[int],
+        run_seeds: Callable[[List[int]], List[Dict]],
+        chunk_size: Optional[int] = None,
+        code: Optional[str] = None,
+        **fields,
+    ) -> List[Dict]:
+        """
+        Statistics for `seeds` in seed order, running only the seeds not yet
+        journaled for `key` by model code `code`, `chunk_size` at a time
+        (default: all at once). Extra `fields` (run number, factors, ...)
+        are stored with each line.
+        """
+        missing = [
+            seed
+            for seed in seeds
+            if self.entries.get((key, seed), {}).get("code") != code
+        ]
+        chunk_size = chunk_size or max(len(missing), 1)
+
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start : start + chunk_size]
+            self.append(
+                [
+                    {"key": key, "seed": seed, "code": code, **fields, "stats": stats}
+                    for seed, stats in zip(chunk, run_seeds(chunk))
+                ]
+            )
+
+        return [self.entries[(key, seed)]["stats"] for seed in seeds]
+
+    def records(self, key: Optional[str] = None) -> List[Dict]:
+        """Journaled records (of one configuration), ordered by seed"""
+        return sorted(
+            (
+                record
+                for record in self.entries.values()
+                if key is None or record["key"] == key
+            ),
+            key=lambda record: (record["key"], record["seed"]),
+        )
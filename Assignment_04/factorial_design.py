@@ -0,0 +1,284 @@
+"""
+Assignment 4: Factorial Designs
+Two-level 2^(k-p), Plackett-Burman and mixed-level designs with alias structure
+"""
+
+import itertools
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+# Factor letters; I is skipped as it stands for the identity column
+LETTERS = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+
+# First rows of the cyclic Plackett-Burman designs (Plackett & Burman, 1946);
+# the other rows are its cyclic shifts plus a final row of minuses
+PLACKETT_BURMAN_ROWS = {
+    12: "++-+++---+-",
+    20: "++--++++-+-+----++-",
+    24: "+++++-+-++--++--+-+----",
+}
+
+
+def popcount(masks) -> np.ndarray:
+    """Number of set bits of each (non-negative) integer in `masks`"""
+    masks = np.asarray(masks, dtype=np.uint64)
+    return np.unpackbits(masks[..., None].view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def effect_name(mask: int, factors: Sequence[str]) -> str:
+    """Effect label of a factor bit mask, e.g. 0b1011 -> "ABD" """
+    return "".join(factor for j, factor in enumerate(factors) if mask >> j & 1)
+
+
+class FractionalFactorial:
+    """
+    Regular two-level 2^(k-p) design defined by its generators.
+
+    Generators are strings like "D=ABC" or "F=-CD"; their right-hand side
+    may use factors generated earlier in the list. The k factors are the
+    first k LETTERS; the ones without a generator are the base factors of
+    the 2^(k-p) full factorial, the first of them varying slowest.
+    """
+
+    def __init__(self, generators: Sequence[str] = (), num_factors: int = None):
+        used = {
+            letter
+            for generator in generators
+            for letter in generator
+            if letter.isalpha()
+        }
+        for letter in used:
+            if letter not in LETTERS:
+                raise ValueError(f"Unknown factor: {letter}")
+        if num_factors is None:
+            num_factors = max((LETTERS.index(letter) + 1 for letter in used), default=0)
+        if num_factors > len(LETTERS):
+            raise ValueError(f"At most {len(LETTERS)} factors are supported")
+        self.factors = tuple(LETTERS[:num_factors])
+        self.generators = tuple(generators)
+
+        # Each generated factor as (sign, set of base factors) of its column
+        split = [g.replace(" ", "").partition("=")[::2] for g in generators]
+        targets = [target for target, _ in split]
+        defined = {}
+        for generator, (target, word) in zip(generators, split):
+            sign, base = (-1 if word.startswith("-") else 1), set()
+            letters = word.lstrip("-")
+            if target not in self.factors or target in defined or not letters:
+                raise ValueError(f"Unknown generator: {generator}")
+            for letter in letters:
+                if letter in defined:
+                    sign *= defined[letter][0]
+                    base ^= defined[letter][1]
+                elif letter in targets or letter not in self.factors:
+                    # Not yet generated, or outside the design
+                    raise ValueError(f"Unknown generator: {generator}")
+                else:
+                    base ^= {letter}
+            defined[target] = (sign, frozenset(base))
+        self.base = tuple(f for f in self.factors if f not in defined)
+        self.defined = defined
+
+        # Defining relation: all products of the generator words as factor
+        # bit masks (bit j = factor j) with their signs, built by doubling
+        index = {factor: j for j, factor in enumerate(self.factors)}
+        words, signs = np.zeros(1, dtype=np.int64), np.ones(1, dtype=int)
+        for target, (sign, base) in defined.items():
+            word = sum(1 << index[f] for f in base) | 1 << index[target]
+            words = np.concatenate([words, words ^ word])
+            signs = np.concatenate([signs, signs * sign])
+        self.words, self.signs = words[1:], signs[1:]
+
+    @classmethod
+    def with_resolution(cls, num_factors: int, resolution: int):
+        """
+        Design with the fewest runs found for `resolution` (3 = main effects
+        clear of each other, 4 = also of two-factor interactions, 5 = two-
+        factor interactions clear of each other).
+
+        Generators are added greedily from the lowest-order interactions of
+        the base factors that keep every defining word at least `resolution`
+        letters long; this reaches the minimum run size for resolution III
+        and IV, not necessarily minimum aberration.
+        """
+        if resolution < 3:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        for num_base in range(max(num_factors, 1).bit_length(), num_factors + 1):
+            generators = []
+            words = np.zeros(1, dtype=np.int64)
+            candidates = (
+                combination
+                for order in range(max(2, resolution - 1), num_base + 1)
+                for combination in itertools.combinations(range(num_base), order)
+            )
+            for combination in candidates:
+                if num_base + len(generators) == num_factors:
+                    break
+                target = num_base + len(generators)
+                word = sum(1 << j for j in combination) | 1 << target
+                if popcount(words ^ word).min() >= resolution:
+                    words = np.concatenate([words, words ^ word])
+                    generators.append(
+                        LETTERS[target] + "=" + "".join(LETTERS[j] for j in combination)
+                    )
+            if num_base + len(generators) == num_factors:
+                return cls(generators, num_factors)
+        raise ValueError(f"Unknown resolution: {resolution}")
+
+    @property
+    def num_runs(self) -> int:
+        return 2 ** len(self.base)
+
+    @property
+    def resolution(self):
+        """Length of the shortest defining word (None for a full factorial)"""
+        if len(self.words) == 0:
+            return None
+        return int(popcount(self.words).min())
+
+    def matrix(self) -> np.ndarray:
+        """Design matrix (runs x factors) of -1/+1, built from run-index bits"""
+        runs = np.arange(self.num_runs, dtype=np.int64)
+        bit = {
+            factor: 1 << (len(self.base) - 1 - j) for j, factor in enumerate(self.base)
+        }
+        columns = []
+        for factor in self.factors:
+            sign, base = self.defined.get(factor, (1, {factor}))
+            mask = sum(bit[f] for f in base)
+            # Product of the base columns: -1 for each of them at its low level
+            columns.append(sign * (1 - 2 * (popcount(~runs & mask) % 2)))
+        return np.column_stack(columns).astype(int)
+
+    def defining_relation(self) -> List[str]:
+        """Words of the defining relation I = ..., shortest first"""
+        order = np.lexsort((self.words, popcount(self.words)))
+        return [
+            ("-" if self.signs[i] < 0 else "")
+            + effect_name(self.words[i], self.factors)
+            for i in order
+        ]
+
+    def aliases(self, effect: str, max_order: int = None) -> List[str]:
+        """
+        Effects aliased with `effect` (e.g. "AB"), lowest order first; "I"
+        if `effect` is itself in the defining relation (aliased with the mean)
+        """
+        mask = sum(1 << self.factors.index(letter) for letter in effect)
+        aliased = self.words ^ mask
+        orders = popcount(aliased)
+        keep = orders <= (max_order or len(self.factors))
+        order = np.lexsort((aliased[keep], orders[keep]))
+        return [
+            ("-" if sign < 0 else "") + (effect_name(alias, self.factors) or "I")
+            for alias, sign in zip(aliased[keep][order], self.signs[keep][order])
+        ]
+
+    def alias_structure(self, order: int = 2, max_order: int = None) -> Dict:
+        """
+        Aliases of every main effect and interaction up to `order` factors,
+        each chain cut to effects of at most `max_order` factors (all if None)
+        """
+        return {
+            "".join(effect): self.aliases("".join(effect), max_order)
+            for size in range(1, order + 1)
+            for effect in itertools.combinations(self.factors, size)
+        }
+
+
+def plackett_burman(num_factors: int, num_runs: int = None) -> np.ndarray:
+    """
+    Two-level Plackett-Burman screening design (runs x factors of -1/+1).
+
+    Uses the smallest supported run size above num_factors (12, 20, 24 from
+    cyclic generators, powers of two from Sylvester's Hadamard matrices)
+    unless num_runs is given; the first num_factors columns are returned.
+    """
+    sizes = sorted({*PLACKETT_BURMAN_ROWS, *(2**n for n in range(2, 11))})
+    if num_runs is None:
+        num_runs = next((n for n in sizes if n > num_factors), None)
+    if num_runs not in sizes or num_runs <= num_factors:
+        raise ValueError(f"Unknown Plackett-Burman size: {num_runs}")
+
+    if num_runs in PLACKETT_BURMAN_ROWS:
+        first = np.array(
+            [1 if c == "+" else -1 for c in PLACKETT_BURMAN_ROWS[num_runs]]
+        )
+        shifts = (np.arange(num_runs - 1)[:, None] - np.arange(num_runs - 1)) % (
+            num_runs - 1
+        )
+        matrix = np.vstack([first[shifts], -np.ones(num_runs - 1, dtype=int)])
+    else:
+        hadamard = np.ones((1, 1), dtype=int)
+        while len(hadamard) < num_runs:
+            hadamard = np.block([[hadamard, hadamard], [hadamard, -hadamard]])
+        matrix = hadamard[:, 1:]
+    return matrix[:, :num_factors]
+
+
+def mixed_level_design(levels: Sequence[int]) -> np.ndarray:
+    """
+    Full factorial with levels[j] levels of factor j, coded evenly in
+    [-1, 1] (two levels: -1, +1; three: -1, 0, +1); the last factor varies
+    fastest
+    """
+    levels = np.asarray(levels)
+    if levels.size == 0 or levels.min() < 2:
+        raise ValueError(f"Unknown levels: {levels.tolist()}")
+    indices = np.indices(levels).reshape(len(levels), -1).T
+    return -1 + 2 * indices / (levels - 1)
+
+
+def foldover(matrix: np.ndarray, columns=None, half=None) -> np.ndarray:
+    """
+    Foldover runs of a two-level design: every run with the signs of
+    `columns` (indices; all if None) reversed. A full foldover of a
+    resolution III fraction frees main effects from two-factor
+    interactions; folding on one factor frees that factor and its
+    two-factor interactions.
+
+    half=(column, level) gives a semi-foldover: only the folded runs with
+    that column at that level (half the runs).
+    """
+    signs = np.ones(matrix.shape[1], dtype=int)
+    signs[slice(None) if columns is None else list(columns)] = -1
+    folded = matrix * signs
+    if half is not None:
+        column, level = half
+        folded = folded[folded[:, column] == level]
+    return folded
+
+
+def interaction_columns(
+    matrix: np.ndarray, factors: Sequence[str], order: int
+) -> Tuple[List[str], np.ndarray]:
+    """Labels and product columns of all effects of 1..order factors"""
+    labels, columns = [], []
+    for size in range(1, order + 1):
+        for effect in itertools.combinations(range(len(factors)), size):
+            labels.append("".join(factors[j] for j in effect))
+            columns.append(np.prod(matrix[:, effect], axis=1))
+    return labels, np.column_stack(columns)
+
+
+def alias_matrix(
+    matrix: np.ndarray, factors: Sequence[str], order: int = 2
+) -> Dict[str, Dict[str, float]]:
+    """
+    Alias matrix (X1'X1)^-1 X1'X2 of the main-effects model X1 against the
+    interactions X2 of 2..order factors, as {main effect: {interaction:
+    coefficient}}; works for non-regular designs (Plackett-Burman: partial
+    aliasing, e.g. +-1/3) as well as regular fractions (+-1).
+    """
+    labels, columns = interaction_columns(matrix, factors, order)
+    mains = len(factors)
+    model = np.column_stack([np.ones(len(matrix)), columns[:, :mains]])
+    coefficients = np.linalg.lstsq(model, columns[:, mains:], rcond=None)[0]
+    return {
+        label: {
+            interaction: float(value)
+            for interaction, value in zip(labels[mains:], row)
+            if abs(value) > 1e-9
+        }
+        for label, row in zip(["I", *labels[:mains]], coefficients)
+    }
@@ -0,0 +1,105 @@
+"""
+Assignment 4: Import-Time Benchmark
+Checks that simulation entry points import fast and without the analysis stack
+
+Budgets are multiples of the bare interpreter start-up time measured on
+the same machine, so they hold on slower or busier hosts too.
+
+Usage:
+    python import_benchmark.py            # exit status 1 if over budget
+    python import_benchmark.py --scale 2  # looser budgets
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("matplotlib", "pandas", "scipy", "simpy")
+
+# module -> (import-time budget in interpreter start-ups, heavy modules it
+# may import). NumPy alone takes about 5 start-ups; the budgets leave about
+# 2x headroom over the measured medians.
+BUDGETS = {
+    "surgery_simulation_a4": (16, ()),
+    "batch_simulation": (16, ()),
+    "factorial_design": (16, ()),
+    "metamodel": (16, ()),
+    "bootstrap": (16, ()),
+    "replication_runner": (8, ()),
+    "warmup_detection": (16, ()),
+    "batch_means": (16, ()),
+    "step1_serial_correlation": (16, ()),
+    "step2_design_of_experiments": (20, ()),
+    "step3_regression_analysis": (20, ()),
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy}}))
+"""
+
+
+def startup_ms(repeats: int = 7) -> float:
+    """Median wall time (ms) of starting and exiting a bare interpreter"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def measure(module: str, repeats: int = 7) -> dict:
+    """Median import time of `module` over `repeats` fresh interpreters"""
+    times = []
+    heavy = set()
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output)
+        times.append(result["ms"])
+        heavy.update(result["heavy"])
+    return {"ms": statistics.median(times), "heavy": sorted(heavy)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--scale", type=float, default=1.0, help="budget multiplier")
+    parser.add_argument("--repeats", type=int, default=7)
+    args = parser.parse_args()
+
+    startup = startup_ms(args.repeats)
+    print(f"Interpreter start-up: {startup:.1f} ms (median of {args.repeats})\n")
+    print(f"{'Module':<30} {'Import (ms)':>12} {'Budget':>8}  Heavy imports")
+    print("-" * 70)
+
+    over_budget = False
+    for module, (startups, allowed) in BUDGETS.items():
+        result = measure(module, args.repeats)
+        budget = startups * startup * args.scale
+        unexpected = [name for name in result["heavy"] if name not in allowed]
+        ok = result["ms"] <= budget and not unexpected
+        over_budget |= not ok
+        print(
+            f"{module:<30} {result['ms']:12.1f} {budget:8.0f}  "
+            f"{', '.join(unexpected) or '-'}{'' if ok else '  ✗'}"
+        )
+
+    print("-" * 70)
+    print("Over budget!" if over_budget else "All imports within budget.")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
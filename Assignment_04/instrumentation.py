@@ -0,0 +1,176 @@
+"""
+Assignment 4: Simulation Instrumentation
+Opt-in per-stage event counts, wall time and peak sizes for one replication
+"""
+
+from collections import defaultdict
+from time import perf_counter
+from typing import Dict
+
+RESOURCES = ("prep_rooms", "operating_rooms", "recovery_rooms")
+
+
+class Instrumentation:
+    """
+    Counters and timers attached to a simulation by overriding its methods
+    on the instance, so an uninstrumented simulation runs unchanged code.
+
+    Stages (wall time is exclusive, so the stages add up to the run time):
+      arrivals     - steps of patient_generator()
+      patient_flow - steps of patient_process(): resource requests/releases
+      sampling     - calls of the *_stream variate streams
+      statistics   - calls of record_state()
+      engine       - the rest of run(): SimPy's event loop and callbacks
+
+    Events are counted by wrapping the environment's step(); peak resource
+    queue lengths (and the future-event-list size, where SimPy exposes it)
+    are sampled after every process step. get_statistics() gains "instr_*"
+    keys. The fast engine has no hooks: it reports its own event, arrival
+    and draw counts and peak sizes, so it fills the same fields except the
+    per-stage wall times (and the statistics stage, which is inline there).
+    """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.events = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.nested = 0.0  # time in sampling/statistics, charged to those
+        self.run_seconds = 0.0
+        self.total_events = 0
+        self.peak_event_list = 0
+        self.peak_queues = dict.fromkeys(RESOURCES, 0)
+        self.hooked = False  # stage times measured (SimPy engine only)
+
+    def attach(self):
+        sim = self.sim
+        run = sim.run
+        create_streams = sim.create_streams
+        get_statistics = sim.get_statistics
+        patient_generator = sim.patient_generator
+        patient_process = sim.patient_process
+
+        def timed_run():
+            if sim.env is not None:
+                sim.env.step = self.counted_step(sim.env.step)
+            start = perf_counter()
+            run()
+            self.run_seconds = perf_counter() - start
+            if sim.env is None:
+                self.read_fast_engine(sim.fast_engine)
+
+        def instrumented_streams():
+            create_streams()
+            for name, stream in list(vars(sim).items()):
+                if name.endswith("_stream"):
+                    setattr(sim, name, self.timed_call(stream, "sampling"))
+
+        def instrumented_statistics():
+            stats = get_statistics()
+            return {**stats, **self.statistics()} if stats is not None else None
+
+        sim.run = timed_run
+        sim.get_statistics = instrumented_statistics
+        if getattr(sim.config, "engine", "simpy") != "simpy":
+            # The fast engine binds streams to locals and has no hooks
+            return
+
+        self.hooked = True
+        sim.create_streams = instrumented_streams
+        sim.record_state = self.timed_call(sim.record_state, "statistics")
+        sim.patient_generator = lambda: self.timed_process(
+            patient_generator(), "arrivals"
+        )
+        sim.patient_process = lambda patient: self.timed_process(
+            patient_process(patient), "patient_flow"
+        )
+
+    def counted_step(self, step):
+        """Environment.step counting processed events (run() calls self.step)"""
+
+        def counted():
+            step()
+            self.total_events += 1
+
+        return counted
+
+    def read_fast_engine(self, engine):
+        """Event counts and peak sizes the fast engine tracks in its loop"""
+        self.total_events = engine.num_events
+        self.events["arrivals"] = engine.num_arrivals
+        self.events["patient_flow"] = engine.num_events - engine.num_arrivals
+        self.events["sampling"] = engine.num_draws
+        self.peak_event_list = engine.peak_events
+        self.peak_queues.update(engine.peak_queues)
+
+    def timed_call(self, function, stage: str):
+        """`function` counted and timed as `stage` (a leaf: no nested stages)"""
+
+        def timed(*args):
+            start = perf_counter()
+            result = function(*args)
+            elapsed = perf_counter() - start
+            self.events[stage] += 1
+            self.seconds[stage] += elapsed
+            self.nested += elapsed
+            return result
+
+        return timed
+
+    def timed_process(self, generator, stage: str):
+        """Re-yield a SimPy process generator, timing each resumption"""
+        step, value = generator.send, None
+        while True:
+            nested = self.nested
+            start = perf_counter()
+            try:
+                event = step(value)
+            except StopIteration as stop:
+                self.charge(stage, start, nested)
+                return stop.value
+            self.charge(stage, start, nested)
+            self.observe()
+            try:
+                step, value = generator.send, (yield event)
+            except BaseException as error:
+                step, value = generator.throw, error
+
+    def charge(self, stage: str, start: float, nested: float):
+        self.events[stage] += 1
+        self.seconds[stage] += perf_counter() - start - (self.nested - nested)
+
+    def observe(self):
+        """Track peak event-list and queue sizes"""
+        sim = self.sim
+        # SimPy has no public event-list size; without its private heap
+        # the peak is left out of the statistics
+        queue = getattr(sim.env, "_queue", None)
+        if queue is None:
+            self.peak_event_list = None
+        elif self.peak_event_list is not None and len(queue) > self.peak_event_list:
+            self.peak_event_list = len(queue)
+        for name in RESOURCES:
+            length = len(getattr(sim, name).queue)
+            if length > self.peak_queues[name]:
+                self.peak_queues[name] = length
+
+    def statistics(self) -> Dict:
+        stats = {
+            "instr_run_seconds": self.run_seconds,
+            "instr_total_events": self.total_events,
+        }
+        if self.hooked:
+            for stage in ("arrivals", "patient_flow", "sampling", "statistics"):
+                stats[f"instr_{stage}_events"] = self.events[stage]
+                stats[f"instr_{stage}_seconds"] = self.seconds[stage]
+            stats["instr_engine_seconds"] = self.run_seconds - sum(
+                self.seconds.values()
+            )
+        else:
+            for stage in ("arrivals", "patient_flow", "sampling"):
+                stats[f"instr_{stage}_events"] = self.events[stage]
+
+        if self.peak_event_list is not None:
+            stats["instr_peak_event_list"] = self.peak_event_list
+        for name in RESOURCES:
+            stats[f"instr_peak_{name}_queue"] = self.peak_queues[name]
+        return stats
@@ -0,0 +1,186 @@
+"""
+Assignment 4: Metamodel Fitting
+Least squares on one QR factorization, for many responses at once
+"""
+
+import numpy as np
+from typing import List, Sequence, Tuple
+
+
+def model_terms(
+    factors: Sequence[str], interactions: bool = False, quadratic: bool = False
+) -> List[str]:
+    """
+    Term labels of a model in `factors`: main effects ("A"), optionally
+    two-factor interactions ("AB") and quadratic terms ("A^2")
+    """
+    terms = list(factors)
+    if interactions:
+        terms += [a + b for i, a in enumerate(factors) for b in factors[i + 1 :]]
+    if quadratic:
+        terms += [f"{factor}^2" for factor in factors]
+    return terms
+
+
+def model_matrix(data, terms: Sequence[str]) -> np.ndarray:
+    """
+    Intercept column plus one column per term, the product of its factor
+    columns in `data` (a DataFrame or a dict of arrays of coded levels)
+    """
+    columns = [np.ones(len(data[next(iter(data))]))]
+    for term in terms:
+        if term.endswith("^2"):
+            columns.append(np.asarray(data[term[:-2]], dtype=float) ** 2)
+        else:
+            columns.append(
+                np.prod([np.asarray(data[f], dtype=float) for f in term], axis=0)
+            )
+    return np.column_stack(columns)
+
+
+class LeastSquaresFit:
+    """
+    (Weighted) least squares fit of a model matrix, factored once by
+    column-pivoted QR and reused for any number of responses.
+
+    Columns that are linear combinations of earlier ones (aliased effects,
+    e.g. E = F in the 2^(6-3) design, or A^2 on two levels) are detected
+    from the QR diagonal; their coefficients are NaN instead of an
+    arbitrary split of the shared effect. With weights (1 / variance of
+    each row) the fit is weighted least squares.
+    """
+
+    def __init__(self, X: np.ndarray, weights: np.ndarray = None):
+        from scipy.linalg import qr, solve_triangular
+
+        self.X = np.asarray(X, dtype=float)
+        n, p = self.X.shape
+        self.sqrt_weights = (
+            np.ones(n) if weights is None else np.sqrt(np.asarray(weights, dtype=float))
+        )
+        Q, R, pivot = qr(
+            self.X * self.sqrt_weights[:, None], mode="economic", pivoting=True
+        )
+
+        diagonal = np.abs(np.diag(R))
+        tolerance = diagonal.max(initial=0.0) * max(n, p) * np.finfo(float).eps
+        self.rank = int(np.sum(diagonal > tolerance))
+        self.estimable = pivot[: self.rank]  # in QR (pivot) order
+        self.aliased = np.sort(pivot[self.rank :])
+        self.Q, self.R = Q[:, : self.rank], R[: self.rank, : self.rank]
+
+        # (X'WX)^-1 of the estimable columns is R^-1 R^-T
+        R_inv = solve_triangular(self.R, np.eye(self.rank))
+        self.covariance_unscaled = np.full((p, p), np.nan)
+        self.covariance_unscaled[np.ix_(self.estimable, self.estimable)] = (
+            R_inv @ R_inv.T
+        )
+        self.df_resid = n - self.rank
+
+    def coefficients(self, Y: np.ndarray) -> np.ndarray:
+        """Coefficients (p,) or (p, m) for a response vector or an (n, m) matrix"""
+        from scipy.linalg import solve_triangular
+
+        Y = np.asarray(Y, dtype=float)
+        weighted = Y * (
+            self.sqrt_weights if Y.ndim == 1 else self.sqrt_weights[:, None]
+        )
+        beta = np.full((self.X.shape[1], *Y.shape[1:]), np.nan)
+        beta[self.estimable] = solve_triangular(self.R, self.Q.T @ weighted)
+        return beta
+
+    def deletion_coefficients(self, Y: np.ndarray) -> np.ndarray:
+        """
+        Leave-one-row-out coefficients (n, p) or (n, p, m) from the deletion
+        formula beta_(i) = beta - R^-1 q_i e_i / (1 - h_i) on the existing
+        factors, without refitting; rows with leverage 1 give NaN
+        """
+        from scipy.linalg import solve_triangular
+
+        Y = np.asarray(Y, dtype=float)
+        columns = Y.reshape(len(Y), -1)
+        beta = self.coefficients(columns)
+        residuals = (columns - self.X @ np.nan_to_num(beta)) * self.sqrt_weights[
+            :, None
+        ]
+        leverage = np.sum(self.Q**2, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scaled = residuals / (1 - leverage)[:, None]
+        scaled[leverage > 1 - 1e-10] = np.nan
+
+        change = solve_triangular(self.R, self.Q.T)  # (rank, n)
+        deleted = np.repeat(beta[None], len(Y), axis=0)
+        deleted[:, self.estimable] -= change.T[:, :, None] * scaled[:, None, :]
+        return deleted.reshape(len(Y), self.X.shape[1], *Y.shape[1:])
+
+    def statistics(self, Y: np.ndarray, beta: np.ndarray = None) -> dict:
+        """
+        Coefficients with standard errors, t statistics, p-values and fit
+        measures, all computed for every column of Y at once
+        """
+        from scipy import stats
+
+        Y = np.asarray(Y, dtype=float)
+        if beta is None:
+            beta = self.coefficients(Y)
+        weights = self.sqrt_weights**2
+        if Y.ndim == 2:
+            weights = weights[:, None]
+
+        y_pred = self.X @ np.nan_to_num(beta)
+        residuals = Y - y_pred
+        SSR = np.sum(weights * residuals**2, axis=0)
+        y_mean = np.sum(weights * Y, axis=0) / np.sum(weights, axis=0)
+        SST = np.sum(weights * (Y - y_mean) ** 2, axis=0)
+
+        n = len(Y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            MSE = SSR / self.df_resid if self.df_resid > 0 else np.zeros_like(SSR)
+            r_squared = np.where(SST > 0, 1 - SSR / SST, 0.0)
+            adj_r_squared = (
+                1 - (SSR / self.df_resid) / (SST / (n - 1))
+                if self.df_resid > 0
+                else np.zeros_like(SSR)
+            )
+            variance = np.diag(self.covariance_unscaled)
+            se_beta = np.sqrt(np.multiply.outer(variance, MSE))
+            t_stats = beta / se_beta
+        p_values = 2 * stats.t.sf(np.abs(t_stats), df=max(self.df_resid, 1))
+
+        if Y.ndim == 1:
+            r_squared, adj_r_squared = float(r_squared), float(adj_r_squared)
+            MSE, SSR, SST = float(MSE), float(SSR), float(SST)
+        return {
+            "beta": beta,
+            "se_beta": se_beta,
+            "t_stats": t_stats,
+            "p_values": p_values,
+            "y_pred": y_pred,
+            "residuals": residuals,
+            "r_squared": r_squared,
+            "adj_r_squared": adj_r_squared,
+            "MSE": MSE,
+            "SSR": SSR,
+            "SSE": SST - SSR,
+            "SST": SST,
+        }
+
+
+def group_variances(groups, y) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Row-to-group index (groups in sorted order), replicate counts and
+    replicate variances of each group (e.g. run) of the responses y.
+    Groups with no spread get the smallest positive variance, so that
+    no row gets an infinite WLS weight.
+    """
+    _, index = np.unique(groups, return_inverse=True)
+    y = np.asarray(y, dtype=float)
+    counts = np.bincount(index)
+    means = np.bincount(index, weights=y) / counts
+    squares = np.bincount(index, weights=(y - means[index]) ** 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variances = squares / (counts - 1)
+    valid = np.isfinite(variances) & (variances > 0)
+    if not valid.any():
+        raise ValueError("Weighting needs runs with 2+ distinct replicates")
+    return index, counts, np.where(valid, variances, variances[valid].min())
@@ -0,0 +1,98 @@
+"""
+Assignment 4: Array-Backed Patient Store
+Per-patient records kept as columns of one NumPy structured array
+"""
+
+import math
+import numpy as np
+
+PATIENT_DTYPE = np.dtype(
+    [
+        ("id", np.int64),
+        ("is_emergency", np.bool_),
+        ("arrival_time", np.float64),
+        ("prep_queue_length_on_arrival", np.int64),
+        ("prep_start", np.float64),
+        ("prep_end", np.float64),
+        ("surgery_start", np.float64),
+        ("surgery_end", np.float64),
+        ("recovery_start", np.float64),
+        ("recovery_end", np.float64),
+    ]
+)
+
+# Timestamps a patient only gets on the way through; NaN until departure
+TIMESTAMP_COLUMNS = (
+    "prep_start",
+    "prep_end",
+    "surgery_start",
+    "surgery_end",
+    "recovery_start",
+    "recovery_end",
+)
+
+
+def empty_rows(capacity: int) -> np.ndarray:
+    """Zeroed rows with NaN timestamps"""
+    data = np.zeros(capacity, dtype=PATIENT_DTYPE)
+    for column in TIMESTAMP_COLUMNS:
+        data[column] = math.nan
+    return data
+
+
+class PatientStore:
+    """
+    Growable struct-of-arrays store, one row per patient.
+
+    Patient ids are assigned 1, 2, 3, ... in arrival order, so patient
+    ``id`` lives in row ``id - 1``. A row is written when the patient
+    arrives and completed with all timestamps when the patient departs;
+    patients still in the system at the end keep NaN timestamps, so
+    consumers select finished patients with ~np.isnan(store["recovery_end"])
+    (comparisons such as recovery_end > warmup are False for them too).
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.data = empty_rows(max(1, capacity))
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """Column view over the rows written so far"""
+        return self.data[column][: self.size]
+
+    def grow(self):
+        """Double the capacity, keeping existing rows"""
+        data = empty_rows(2 * len(self.data))
+        data[: self.size] = self.data[: self.size]
+        self.data = data
+
+    def append(self, patient):
+        """Write the arrival fields of a newly arrived patient"""
+        if self.size == len(self.data):
+            self.grow()
+        self.data[self.size] = (
+            patient.id,
+            patient.is_emergency,
+            patient.arrival_time,
+            patient.prep_queue_length_on_arrival,
+            *(math.nan for _ in TIMESTAMP_COLUMNS),
+        )
+        self.size += 1
+
+    def record(self, patient):
+        """Complete a departing patient's row with all timestamps"""
+        self.data[patient.id - 1] = (
+            patient.id,
+            patient.is_emergency,
+            patient.arrival_time,
+            patient.prep_queue_length_on_arrival,
+            patient.prep_start,
+            patient.prep_end,
+            patient.surgery_start,
+            patient.surgery_end,
+            patient.recovery_start,
+            patient.recovery_end,
+        )
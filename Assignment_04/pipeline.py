@@ -0,0 +1,176 @@
+"""
+Assignment 4: Incremental Pipeline Runner
+Runs analysis stages as a DAG, skipping stages whose inputs are unchanged
+"""
+
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Sequence, Tuple
+from result_cache import code_version
+
+STATE_PATH = "results/pipeline_state.json"
+
+
+@dataclass
+class Stage:
+    """
+    One pipeline step.
+
+    `target` is "module:function" (resolved in the worker process). The
+    stage is re-run when the source of `target`'s module and the local
+    modules it imports, its `params`, or the content of its `inputs`
+    (usually upstream outputs) change, or when an output is missing.
+    A forced run (--force) also passes `force_params`, e.g. resume=False
+    so that a stage does not resume from its experiment journal.
+    """
+
+    name: str
+    target: str
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    after: Tuple[str, ...] = ()  # stages that must finish first
+    params: Dict = field(default_factory=dict)
+    force_params: Dict = field(default_factory=dict)
+
+
+def file_hash(path: str) -> str:
+    if not os.path.exists(path):
+        return "missing"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(stage: Stage) -> str:
+    payload = {
+        "target": stage.target,
+        "code": code_version(stage.target.split(":")[0]),
+        "params": stage.params,
+        "inputs": {path: file_hash(path) for path in stage.inputs},
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def run_stage(target: str, params: Dict) -> Tuple[bool, str, float]:
+    """Call `target(**params)`, returning (success, captured output, seconds)"""
+    module_name, function_name = target.split(":")
+    output = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            function = getattr(importlib.import_module(module_name), function_name)
+            function(**params)
+        success = True
+    except Exception:
+        output.write(traceback.format_exc())
+        success = False
+    return success, output.getvalue(), time.perf_counter() - start
+
+
+class Pipeline:
+    """Stages in dependency order, with fingerprints kept in a state file"""
+
+    def __init__(self, stages: Sequence[Stage], state_path: str = STATE_PATH):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        for stage in stages:
+            for name in stage.after:
+                if name not in self.stages:
+                    raise ValueError(f"Unknown stage: {name}")
+        try:
+            with open(state_path) as f:
+                self.state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.state = {}
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(self.state_path, "w") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+
+    def is_current(self, stage: Stage) -> bool:
+        """Whether the stage's fingerprint matches its last successful run"""
+        return self.state.get(stage.name) == fingerprint(stage) and all(
+            os.path.exists(path) for path in stage.outputs
+        )
+
+    def run(self, jobs: int = 2, force: bool = False, dry_run: bool = False) -> bool:
+        """
+        Run every out-of-date stage once its `after` stages are done.
+
+        Ready stages run concurrently in up to `jobs` processes; a stage is
+        only checked when it becomes ready, so it sees its upstream outputs.
+        Each stage's output is printed when it finishes. Returns whether all
+        stages succeeded.
+        """
+        done, failed = set(), set()
+        would_run = set()  # dry run: out-of-date stages, and so their dependents
+        waiting = list(self.stages)
+        running = {}
+
+        with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+            while waiting or running:
+                num_waiting = len(waiting)
+                for name in list(waiting):
+                    stage = self.stages[name]
+                    if any(dep in failed for dep in stage.after):
+                        waiting.remove(name)
+                        failed.add(name)
+                        print(f"✗ {name}: skipped (upstream stage failed)")
+                    elif all(dep in done for dep in stage.after):
+                        waiting.remove(name)
+                        if (
+                            not force
+                            and not would_run.intersection(stage.after)
+                            and self.is_current(stage)
+                        ):
+                            print(f"✓ {name}: up to date")
+                            done.add(name)
+                        elif dry_run:
+                            print(f"• {name}: would run")
+                            done.add(name)
+                            would_run.add(name)
+                        else:
+                            print(f"▶ {name}: running")
+                            params = {
+                                **stage.params,
+                                **(stage.force_params if force else {}),
+                            }
+                            future = pool.submit(run_stage, stage.target, params)
+                            running[future] = name
+
+                if not running:
+                    if waiting and len(waiting) == num_waiting:
+                        raise ValueError(f"Stages wait on each other: {waiting}")
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    success, output, seconds = future.result()
+                    print(output, end="")
+                    if success:
+                        # Fingerprint after the run: inputs are upstream outputs
+                        self.state[name] = fingerprint(self.stages[name])
+                        self.save_state()
+                        done.add(name)
+                        print(f"✓ {name}: finished in {seconds:.1f} s")
+                    else:
+                        self.state.pop(name, None)
+                        self.save_state()
+                        failed.add(name)
+                        print(f"✗ {name}: failed after {seconds:.1f} s")
+
+        return not failed
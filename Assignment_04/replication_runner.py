@@ -0,0 +1,201 @@
+"""
+Assignment 4: Parallel Replication Runner
+Fans (config, seed) jobs out over a process pool
+"""
+
+import math
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def run_replication(simulation_class, config, seed: int) -> Dict:
+    """Run one replication of `config` with the given seed"""
+    sim = simulation_class(replace(config, random_seed=seed))
+    sim.run()
+    return sim.get_statistics()
+
+
+def resolve_jobs(jobs) -> int:
+    """Number of worker processes (None, 0 or -1 = all cores)"""
+    if jobs in (None, 0, -1):
+        return os.cpu_count() or 1
+    return max(1, int(jobs))
+
+
+def run_jobs(
+    simulation_class, job_list: Sequence[Tuple], jobs=1, chunksize=None, cache=None
+) -> List[Dict]:
+    """
+    Run (config, seed) jobs and return their statistics in job order.
+
+    With jobs=1 everything runs in this process; otherwise the jobs are
+    mapped over a ProcessPoolExecutor in chunks. Each replication only
+    depends on its own seed, so both paths give identical results.
+
+    With a result_cache.ResultCache, jobs already in the cache are not
+    simulated and the statistics of new ones are added to it.
+    """
+    if cache is not None:
+        return cache.run_jobs(
+            simulation_class,
+            job_list,
+            lambda missing: run_jobs(simulation_class, missing, jobs, chunksize),
+        )
+
+    configs = [config for config, _ in job_list]
+    seeds = [seed for _, seed in job_list]
+    workers = min(resolve_jobs(jobs), len(job_list))
+
+    if workers <= 1:
+        return [
+            run_replication(simulation_class, config, seed) for config, seed in job_list
+        ]
+
+    if chunksize is None:
+        chunksize = max(1, len(job_list) // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(
+            pool.map(
+                run_replication,
+                [simulation_class] * len(job_list),
+                configs,
+                seeds,
+                chunksize=chunksize,
+            )
+        )
+
+
+def run_replications(
+    simulation_class, config, seeds: Sequence[int], jobs=1, chunksize=None, cache=None
+) -> List[Dict]:
+    """Statistics for one configuration, one entry per seed in seed order"""
+    return run_jobs(
+        simulation_class, [(config, seed) for seed in seeds], jobs, chunksize, cache
+    )
+
+
+def half_width(values: Sequence[float], confidence: float = 0.95) -> float:
+    """t-based confidence-interval half-width of the mean (inf below n=2)"""
+    from scipy import stats
+
+    n = len(values)
+    if n < 2:
+        return math.inf
+    t_critical = stats.t.ppf((1 + confidence) / 2, n - 1)
+    return float(t_critical * statistics.stdev(values) / math.sqrt(n))
+
+
+def precision_reached(
+    mean: float,
+    width: float,
+    relative_precision: Optional[float],
+    absolute_precision: Optional[float],
+) -> bool:
+    """Whether the half-width meets either of the given targets"""
+    if absolute_precision is not None and width <= absolute_precision:
+        return True
+    if relative_precision is not None and width <= relative_precision * abs(mean):
+        return True
+    return False
+
+
+def run_sequential(
+    run_seeds: Callable[[List[int]], List[Dict]],
+    metric: str,
+    relative_precision: Optional[float] = None,
+    absolute_precision: Optional[float] = None,
+    initial_replications: int = 10,
+    max_replications: int = 100,
+    step: int = 1,
+    confidence: float = 0.95,
+    first_seed: int = 42,
+) -> Tuple[List[Dict], Dict]:
+    """
+    Add replications until the CI half-width of `metric` meets a target.
+
+    `run_seeds(seeds)` returns one statistics dict (or None) per seed.
+    After the initial batch, the replications still needed are estimated
+    from the current half-width (it shrinks like 1/sqrt(n)) and run as one
+    chunk, rounded up to a multiple of `step` (e.g. the worker count) and
+    capped at `max_replications`. Seeds are first_seed, first_seed + 1, ...
+    so the first replications match a fixed-count run.
+
+    Returns all statistics in seed order and a summary with the achieved
+    mean, half-width, relative half-width, replication count, the seeds
+    run and whether the target was reached.
+    """
+    if relative_precision is None and absolute_precision is None:
+        raise ValueError("Need a relative_precision or absolute_precision target")
+
+    all_stats = []
+    all_seeds = []
+    num_new = min(max(initial_replications, 2), max_replications)
+
+    while num_new > 0:
+        seeds = list(
+            range(first_seed + len(all_stats), first_seed + len(all_stats) + num_new)
+        )
+        all_stats.extend(run_seeds(seeds))
+        all_seeds.extend(seeds)
+
+        values = [stats[metric] for stats in all_stats if stats]
+        mean = statistics.mean(values) if values else 0.0
+        width = half_width(values, confidence)
+        if precision_reached(mean, width, relative_precision, absolute_precision):
+            break
+
+        # Replications needed if the sample std stays where it is
+        targets = [
+            target
+            for target in (
+                absolute_precision,
+                relative_precision * abs(mean) if relative_precision else None,
+            )
+            if target
+        ]
+        if math.isfinite(width) and targets:
+            needed = math.ceil(len(values) * (width / max(targets)) ** 2)
+        else:
+            needed = len(all_stats) + step
+        num_new = max(needed - len(values), 1)
+        num_new = step * math.ceil(num_new / step)
+        num_new = min(num_new, max_replications - len(all_stats))
+
+    return all_stats, {
+        "metric": metric,
+        "mean": mean,
+        "half_width": width,
+        "relative_half_width": width / abs(mean) if mean else math.inf,
+        "num_replications": len(all_stats),
+        "seeds": all_seeds,
+        "converged": precision_reached(
+            mean, width, relative_precision, absolute_precision
+        ),
+    }
+
+
+def run_replications_to_precision(
+    simulation_class,
+    config,
+    metric: str,
+    jobs=1,
+    chunksize=None,
+    step=None,
+    cache=None,
+    **kwargs,
+) -> Tuple[List[Dict], Dict]:
+    """run_sequential() over run_replications(), chunks sized to the pool"""
+    if step is None:
+        step = resolve_jobs(jobs)
+    return run_sequential(
+        lambda seeds: run_replications(
+            simulation_class, config, seeds, jobs, chunksize, cache
+        ),
+        metric,
+        step=step,
+        **kwargs,
+    )
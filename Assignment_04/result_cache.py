@@ -0,0 +1,240 @@
+"""
+Assignment 4: Replication Result Cache
+Content-addressed on-disk store of per-replication statistics
+
+Usage:
+    python result_cache.py info
+    python result_cache.py invalidate            # drop every entry
+    python result_cache.py invalidate --stale    # drop entries of old model code
+"""
+
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+CACHE_PATH = "results/result_cache.sqlite"
+MAX_BYTES = 64 * 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def code_version(module_name: str) -> str:
+    """
+    SHA-256 over the source of a module and of every module from its
+    directory it imports, directly or through other local modules. Imports
+    are read from the parsed source, so modules imported inside functions
+    (warmup_detection, instrumentation, ...) count too. Editing the model
+    changes every key while editing analysis or plotting code does not.
+    """
+    module = sys.modules.get(module_name) or importlib.import_module(module_name)
+    directory = os.path.dirname(os.path.abspath(module.__file__))
+
+    paths = set()
+    pending = [os.path.abspath(module.__file__)]
+    while pending:
+        path = pending.pop()
+        if path in paths:
+            continue
+        paths.add(path)
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                dependency = os.path.join(directory, name.split(".")[0] + ".py")
+                if os.path.exists(dependency):
+                    pending.append(dependency)
+
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            digest.update(os.path.basename(path).encode())
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def to_json(stats) -> str:
+    """Statistics dict as JSON (NumPy scalars become Python numbers)"""
+    return json.dumps(stats, sort_keys=True, default=lambda value: value.item())
+
+
+class ResultCache:
+    """
+    SQLite-backed cache of replication statistics.
+
+    Keys are SHA-256 hashes of the simulation class, the canonical config
+    (random_seed replaced by the job's seed) and the model code version.
+    Hits refresh their access time; once the stored statistics exceed
+    `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, model TEXT, code_version TEXT,"
+            " stats TEXT, size INTEGER, last_access REAL)"
+        )
+        self.connection.commit()
+
+    def key(self, simulation_class, config, seed: int) -> str:
+        """Content address of one replication"""
+        data = config.to_dict()
+        data["random_seed"] = int(seed)
+        payload = json.dumps(
+            {
+                "model": model_name(simulation_class),
+                "config": data,
+                "code": code_version(simulation_class.__module__),
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Optional[Dict]]:
+        """Cached statistics for the keys that are present"""
+        hits = {}
+        for start in range(0, len(keys), 500):
+            chunk = list(keys[start : start + 500])
+            rows = self.connection.execute(
+                "SELECT key, stats FROM results WHERE key IN "
+                f"({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            hits.update((key, json.loads(stats)) for key, stats in rows)
+
+        if hits:
+            now = time.time()
+            self.connection.executemany(
+                "UPDATE results SET last_access = ? WHERE key = ?",
+                [(now, key) for key in hits],
+            )
+            self.connection.commit()
+        return hits
+
+    def put_many(self, simulation_class, entries: Sequence):
+        """Store (key, stats) pairs, then evict down to max_bytes"""
+        model = model_name(simulation_class)
+        version = code_version(simulation_class.__module__)
+        now = time.time()
+        rows = []
+        for key, stats in entries:
+            text = to_json(stats)
+            rows.append((key, model, version, text, len(text), now))
+
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        self.connection.commit()
+        self.evict()
+
+    def run_jobs(self, simulation_class, job_list: Sequence, run) -> List:
+        """
+        Statistics for (config, seed) jobs, simulating only cache misses.
+
+        `run(missing_jobs)` returns the statistics of the missing jobs in
+        order; they are stored and merged back in job order.
+        """
+        keys = [self.key(simulation_class, config, seed) for config, seed in job_list]
+        hits = self.get_many(keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in hits]
+        if missing:
+            new_stats = run([job_list[i] for i in missing])
+            entries = [(keys[i], stats) for i, stats in zip(missing, new_stats)]
+            self.put_many(simulation_class, entries)
+            hits.update(entries)
+
+        return [hits[key] for key in keys]
+
+    def evict(self):
+        """Drop least recently used entries until the size bound holds"""
+        (total,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        doomed = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM results ORDER BY last_access"
+        ):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self.connection.executemany("DELETE FROM results WHERE key = ?", doomed)
+        self.connection.commit()
+
+    def invalidate(self, stale_only: bool = False) -> int:
+        """Delete every entry, or only those whose model code has changed"""
+        if not stale_only:
+            deleted = self.connection.execute("DELETE FROM results").rowcount
+        else:
+            deleted = 0
+            for model, version in self.connection.execute(
+                "SELECT DISTINCT model, code_version FROM results"
+            ).fetchall():
+                module_name = model.rsplit(".", 1)[0]
+                try:
+                    current = code_version(module_name)
+                except ImportError:
+                    current = None
+                if version != current:
+                    deleted += self.connection.execute(
+                        "DELETE FROM results WHERE model = ? AND code_version = ?",
+                        (model, version),
+                    ).rowcount
+        self.connection.commit()
+        return deleted
+
+    def info(self) -> Dict:
+        count, total = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes}
+
+
+def model_name(simulation_class) -> str:
+    return f"{simulation_class.__module__}.{simulation_class.__qualname__}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the replication cache")
+    parser.add_argument("command", choices=["info", "invalidate"])
+    parser.add_argument("--path", default=CACHE_PATH)
+    parser.add_argument(
+        "--stale", action="store_true", help="only entries of outdated model code"
+    )
+    args = parser.parse_args()
+
+    cache = ResultCache(args.path)
+    if args.command == "info":
+        info = cache.info()
+        print(
+            f"{info['entries']} entries, {info['bytes'] / 1e6:.2f} MB "
+            f"(limit {info['max_bytes'] / 1e6:.0f} MB) in {args.path}"
+        )
+    else:
+        deleted = cache.invalidate(stale_only=args.stale)
+        print(f"Removed {deleted} entries from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
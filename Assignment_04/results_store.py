@@ -0,0 +1,87 @@
+"""
+Assignment 4: Columnar Results Store
+One row per replication (factors, seed, metrics, wall time) in an .npz file
+"""
+
+import json
+import math
+import os
+import tempfile
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+SCHEMA_VERSION = 1
+
+
+def to_columns(rows: Sequence[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Flat row dicts as one array per key (in first-seen key order).
+
+    Keys missing from a row become NaN; integer and boolean columns keep
+    their type when every row has them.
+    """
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    columns = {}
+    for name in names:
+        column = np.asarray([row.get(name, math.nan) for row in rows])
+        if column.dtype == object:
+            raise ValueError(f"Unknown column type: {name}")
+        columns[name] = column
+    return columns
+
+
+def save_results(path: str, columns: Dict[str, np.ndarray]):
+    """
+    Write equal-length columns and their schema (name -> dtype) to `path`.
+
+    The file is uncompressed so it loads at memory speed, and replaced
+    atomically so readers never see a partial file.
+    """
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+
+    schema = {
+        "version": SCHEMA_VERSION,
+        "columns": {
+            name: np.asarray(column).dtype.str for name, column in columns.items()
+        },
+    }
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".npz", delete=False) as f:
+        np.savez(f, __schema__=np.array(json.dumps(schema)), **columns)
+    os.replace(f.name, path)
+
+
+def load_results(
+    path: str, columns: Optional[Sequence[str]] = None, as_frame: bool = True
+):
+    """
+    Columns of a results file as a pandas DataFrame (or a dict of arrays).
+
+    Only the requested `columns` are read; their dtypes are checked against
+    the stored schema.
+    """
+    with np.load(path) as data:
+        schema = json.loads(str(data["__schema__"]))
+        if schema["version"] != SCHEMA_VERSION:
+            raise ValueError(f"Unknown results schema version: {schema['version']}")
+
+        arrays = {}
+        for name in columns or schema["columns"]:
+            if name not in schema["columns"]:
+                raise ValueError(f"Unknown results column: {name}")
+            arrays[name] = data[name]
+            if arrays[name].dtype.str != schema["columns"][name]:
+                raise ValueError(
+                    f"Column {name} has dtype {arrays[name].dtype.str}, "
+                    f"schema says {schema['columns'][name]}"
+                )
+
+    if not as_frame:
+        return arrays
+
+    import pandas as pd
+
+    return pd.DataFrame(arrays, copy=False)
@@ -1,59 +1,123 @@
 """
 Assignment 4 - Main Runner
-Executes all analysis steps
-"""
-
-print("\n" + "=" * 70)
-print("ASSIGNMENT 4 - COMPLETE ANALYSIS PIPELINE")
-print("=" * 70)
-print("\nThis will run:")
-print("  1. Serial Correlation Analysis")
-print("  2. Design of Experiments (8 experiments x 10 replications)")
-print("  3. Regression Analysis")
-print("=" * 70 + "\n")
+Executes all analysis steps as an incremental pipeline
 
-input("Press ENTER to start...")
-
-# Step 1: Serial Correlation
-print("\n" + "=" * 70)
-print("STEP 1: SERIAL CORRELATION ANALYSIS")
-print("=" * 70 + "\n")
+Usage:
+    python run_assignment4.py             # run out-of-date stages
+    python run_assignment4.py --dry-run   # show which stages would run
+    python run_assignment4.py --force     # rerun everything
+"""
 
-import step1_serial_correlation
+import argparse
+import os
+import sys
+from pipeline import Pipeline, Stage
 
-step1_serial_correlation.run_correlation_tests()
+# serial correlation  (independent)
+# experiments -> regression -> figures
+#             -> foldover -> foldover regression
+STAGES = [
+    Stage(
+        name="serial_correlation",
+        target="step1_serial_correlation:run_correlation_tests",
+        outputs=(
+            "figures/autocorr_interval100.png",
+            "figures/autocorr_interval200.png",
+            "figures/correlogram_surface.png",
+        ),
+    ),
+    Stage(
+        name="experiments",
+        target="step2_design_of_experiments:main",
+        outputs=(
+            "results/experiment_results.json",
+            "results/experiment_results.npz",
+            "results/experiment_summary.csv",
+        ),
+        force_params={"resume": False},
+    ),
+    Stage(
+        name="regression",
+        target="step3_regression_analysis:run_regression",
+        inputs=("results/experiment_results.npz",),
+        outputs=("results/regression_results.json",),
+        after=("experiments",),
+        params={"bootstrap": "bca"},
+    ),
+    Stage(
+        name="figures",
+        target="step3_regression_analysis:plot_figures",
+        inputs=("results/experiment_results.npz",),
+        outputs=("figures/regression_diagnostics.png",),
+        after=("regression",),
+    ),
+    Stage(
+        name="foldover",
+        target="step2_design_of_experiments:main_foldover",
+        inputs=("results/experiment_results.json",),
+        outputs=(
+            "results/foldover_results.json",
+            "results/foldover_results.npz",
+            "results/foldover_summary.csv",
+        ),
+        after=("experiments",),
+        force_params={"resume": False},
+    ),
+    Stage(
+        name="foldover_regression",
+        target="step3_regression_analysis:run_regression",
+        inputs=("results/foldover_results.npz",),
+        outputs=("results/foldover_regression_results.json",),
+        after=("foldover",),
+        params={
+            "results_file": "results/foldover_results.npz",
+            "output_file": "results/foldover_regression_results.json",
+            "bootstrap": "bca",
+        },
+    ),
+]
 
-print("\nStep 1 completed.")
-input("\nPress ENTER to continue to Step 2...")
 
-# Step 2: Design of Experiments
-print("\n" + "=" * 70)
-print("STEP 2: DESIGN OF EXPERIMENTS")
-print("=" * 70 + "\n")
+def main():
+    parser = argparse.ArgumentParser(description="Assignment 4 analysis pipeline")
+    parser.add_argument("--force", action="store_true", help="rerun every stage")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only show which stages would run"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=2, help="stages run concurrently (default 2)"
+    )
+    args = parser.parse_args()
 
-import step2_design_of_experiments
+    os.makedirs("results", exist_ok=True)
+    os.makedirs("figures", exist_ok=True)
 
-results = step2_design_of_experiments.run_full_experiment_series()
+    print("\n" + "=" * 70)
+    print("ASSIGNMENT 4 - COMPLETE ANALYSIS PIPELINE")
+    print("=" * 70)
+    print("\nStages:")
+    print("  1. Serial Correlation Analysis")
+    print("  2. Design of Experiments (8 experiments x 10 replications)")
+    print("  3. Regression Analysis")
+    print("  4. Regression Diagnostics Figures")
+    print("  5. Foldover of the design (8 more experiments) and its regression")
+    print("=" * 70 + "\n")
 
-print("\nStep 2 completed.")
-input("\nPress ENTER to continue to Step 3...")
+    success = Pipeline(STAGES).run(
+        jobs=args.jobs, force=args.force, dry_run=args.dry_run
+    )
 
-# Step 3: Regression Analysis
-print("\n" + "=" * 70)
-print("STEP 3: REGRESSION ANALYSIS")
-print("=" * 70 + "\n")
+    print("\n" + "=" * 70)
+    print("Analysis complete." if success else "Analysis FAILED.")
+    print("=" * 70)
+    print("\nGenerated files:")
+    for stage in STAGES:
+        for path in stage.outputs:
+            print(f"  - {path}")
+    print("=" * 70 + "\n")
 
-import step3_regression_analysis
+    return 0 if success else 1
 
-step3_regression_analysis.main()
 
-print("\n" + "=" * 70)
-print("Analysis complete.")
-print("=" * 70)
-print("\nGenerated files:")
-print("  - results/experiment_results.json")
-print("  - results/experiment_summary.csv")
-print("  - figures/autocorr_interval100.png")
-print("  - figures/autocorr_interval200.png")
-print("  - figures/regression_diagnostics.png")
-print("=" * 70 + "\n")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,45 +3,174 @@ Assignment 4 - Step 1: Serial Correlation Analysis
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
-import statistics
+from dataclasses import replace
 from surgery_simulation_a4 import SurgerySimulation, SimulationConfig, DistributionType
 
 
-def compute_autocorrelation(time_series_list, max_lag=9):
-    """Compute autocorrelation for multiple time series"""
-    autocorrelations = []
+def series_matrix(time_series_list):
+    """Stack series of possibly different lengths into a NaN-padded 2-D array"""
+    if isinstance(time_series_list, np.ndarray) and time_series_list.ndim == 2:
+        data = time_series_list.astype(float)
+        return data, np.full(len(data), data.shape[1])
+
+    lengths = np.array([len(series) for series in time_series_list], dtype=int)
+    data = np.full((len(lengths), max(lengths.max(initial=0), 1)), np.nan)
+    for row, series in enumerate(time_series_list):
+        data[row, : lengths[row]] = series
+    return data, lengths
+
+
+def lagged_correlations(data, lengths, max_lag):
+    """
+    Lag-k Pearson correlation of x = s[:-k] and y = s[k:] for every row
+    and k = 1..max_lag, each half with its own mean as in np.corrcoef.
+
+    The cross-products sum(s_t * s_t+k) for all lags come from one FFT per
+    row and the head/tail sums from prefix sums, so the cost is
+    O(n log n) per row instead of O(n * max_lag). Returns the correlations
+    and the covariance / variance sums (rows x lags), NaN where a lag has
+    fewer than two pairs or a constant half.
+    """
+    num_rows, n = data.shape
+    rows = np.arange(num_rows)[:, None]
+    lags = np.arange(1, max_lag + 1)[None, :]
+    in_series = np.arange(n)[None, :] < lengths[:, None]
+
+    # Centre each row (Pearson is shift invariant) and zero the padding
+    values = np.where(in_series, data, 0.0)
+    means = values.sum(axis=1) / np.maximum(lengths, 1)
+    z = np.where(in_series, values - means[:, None], 0.0)
+
+    size = 1 << (2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(z, n=size, axis=1)
+    products = np.fft.irfft(spectrum * np.conj(spectrum), n=size, axis=1)
+    products = products[:, 1 : max_lag + 1]
+    if max_lag > n - 1:
+        products = np.pad(products, ((0, 0), (0, max_lag - products.shape[1])))
+
+    # prefix[:, j] = sum of the first j values (and of their squares)
+    zeros = np.zeros((num_rows, 1))
+    prefix = np.hstack([zeros, np.cumsum(z, axis=1)])
+    prefix_sq = np.hstack([zeros, np.cumsum(z**2, axis=1)])
+    total = prefix[rows[:, 0], lengths][:, None]
+    total_sq = prefix_sq[rows[:, 0], lengths][:, None]
+
+    pairs = lengths[:, None] - lags
+    head_end = np.clip(pairs, 0, n)
+    tail_start = np.minimum(lags, lengths[:, None])
+    sum_x = prefix[rows, head_end]
+    sum_xx = prefix_sq[rows, head_end]
+    sum_y = total - prefix[rows, tail_start]
+    sum_yy = total_sq - prefix_sq[rows, tail_start]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        count = np.maximum(pairs, 1)
+        covariance = products - sum_x * sum_y / count
+        var_x = sum_xx - sum_x**2 / count
+        var_y = sum_yy - sum_y**2 / count
+
+        # A constant half has zero variance up to rounding; np.corrcoef
+        # gives NaN there, so treat it as undefined too
+        scale = 1e-12 * np.maximum(total_sq, np.finfo(float).tiny)
+        defined = (pairs >= 2) & (var_x > scale) & (var_y > scale)
+        correlations = np.where(defined, covariance / np.sqrt(var_x * var_y), np.nan)
+
+    return correlations, covariance, var_x, var_y, defined
+
+
+def compute_autocorrelation(time_series_list, max_lag=9, return_details=False):
+    """
+    Compute autocorrelation for multiple time series.
+
+    `time_series_list` is a list of series (lengths may differ) or a 2-D
+    array (replications x time). Returns the average over series of the
+    lag-1..max_lag correlations, skipping series where a lag is undefined
+    (0.0 if none has it). With return_details=True a dict is returned
+    instead, adding the per-replication ACFs, a pooled ACF (sums across
+    replications) and 95% bands.
+    """
+    data, lengths = series_matrix(time_series_list)
+    correlations, covariance, var_x, var_y, defined = lagged_correlations(
+        data, lengths, max_lag
+    )
+
+    num_defined = defined.sum(axis=0)
+    totals = np.where(defined, correlations, 0.0).sum(axis=0)
+    mean_acf = np.where(num_defined > 0, totals / np.maximum(num_defined, 1), 0.0)
+    autocorrelations = [float(value) for value in mean_acf]
 
-    for lag in range(1, max_lag + 1):
-        correlations = []
+    if not return_details:
+        return autocorrelations
 
-        for series in time_series_list:
-            if len(series) <= lag:
-                continue
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pooled = np.where(defined, covariance, 0.0).sum(axis=0) / np.sqrt(
+            np.where(defined, var_x, 0.0).sum(axis=0)
+            * np.where(defined, var_y, 0.0).sum(axis=0)
+        )
+        spread = np.sqrt(
+            np.where(defined, (correlations - mean_acf) ** 2, 0.0).sum(axis=0)
+            / np.maximum(num_defined - 1, 1)
+        )
 
-            x = series[:-lag]
-            y = series[lag:]
+    return {
+        "lags": list(range(1, max_lag + 1)),
+        "autocorrelations": autocorrelations,
+        "per_replication": correlations,
+        "pooled": np.nan_to_num(pooled).tolist(),
+        # 95% CI half-width of the mean ACF from the spread across series
+        "mean_band": (1.96 * spread / np.sqrt(np.maximum(num_defined, 1))).tolist(),
+        # 95% band for the pooled ACF of white noise (Bartlett)
+        "white_noise_band": float(1.96 / np.sqrt(max(lengths.sum(), 1))),
+    }
 
-            if len(x) < 2:
-                continue
 
-            try:
-                corr = np.corrcoef(x, y)[0, 1]
-                if not np.isnan(corr):
-                    correlations.append(corr)
-            except:
-                pass
+def simulate_replications(config, num_replications, horizon):
+    """
+    One "array" mode run per replication (seeds 42, 43, ...) up to `horizon`.
 
-        if correlations:
-            autocorrelations.append(np.mean(correlations))
-        else:
-            autocorrelations.append(0.0)
+    A run's path up to time t does not depend on sim_duration, so these
+    runs serve every sample interval whose windows end by `horizon`.
+    """
+    stores = []
+    for rep in range(num_replications):
+        sim = SurgerySimulation(
+            replace(
+                config,
+                random_seed=42 + rep,
+                warmup_period=0.0,
+                sim_duration=horizon,
+                record_mode="array",
+            )
+        )
+        sim.run()
+        stores.append(sim.store)
+    return stores
+
+
+def interval_series(store, sample_interval, num_samples, warmup=None):
+    """
+    Average queue length at arrival in each window [t, t + sample_interval)
+    after `warmup` (default: one interval); empty windows count as 0.0.
+
+    Arrival times are sorted, so the window edges are located with
+    searchsorted and the window sums taken from one cumulative sum.
+    """
+    if warmup is None:
+        warmup = sample_interval
+    arrival_times = store["arrival_time"]
+    cumulative = np.concatenate(
+        [[0.0], np.cumsum(store["prep_queue_length_on_arrival"])]
+    )
 
-    return autocorrelations
+    edges = warmup + sample_interval * np.arange(num_samples + 1)
+    index = np.searchsorted(arrival_times, edges, side="left")
+    totals = cumulative[index[1:]] - cumulative[index[:-1]]
+    counts = np.diff(index)
+    return np.where(counts > 0, totals / np.maximum(counts, 1), 0.0).tolist()
 
 
 def test_serial_correlation_scenario(
-    config, num_replications=10, num_samples=10, sample_interval=100
+    config, num_replications=10, num_samples=10, sample_interval=100, stores=None
 ):
     """Run serial correlation test"""
     print(f"\n{'='*70}")
@@ -63,40 +192,17 @@ def test_serial_correlation_scenario(
     print(f"  Sample interval: {sample_interval} time units")
     print(f"{'='*70}\n")
 
-    all_time_series = []
-
-    for rep in range(num_replications):
-        config.random_seed = 42 + rep
-        config.warmup_period = sample_interval
-        config.sim_duration = config.warmup_period + (num_samples * sample_interval)
-
-        sim = SurgerySimulation(config)
-        sim.run()
-
-        queue_samples = sim.queue_length_on_arrivals
-
-        # Downsample to regular intervals
-        time_series = []
-        valid_patients = [
-            p for p in sim.patients if p.arrival_time >= config.warmup_period
-        ]
+    config.warmup_period = sample_interval
+    config.sim_duration = config.warmup_period + (num_samples * sample_interval)
 
-        for i in range(num_samples):
-            t_start = config.warmup_period + i * sample_interval
-            t_end = t_start + sample_interval
+    # Reuse runs that already reach sim_duration (see simulate_replications)
+    if stores is None:
+        stores = simulate_replications(config, num_replications, config.sim_duration)
 
-            patients_in_window = [
-                p for p in valid_patients if t_start <= p.arrival_time < t_end
-            ]
-
-            if patients_in_window:
-                avg_queue = statistics.mean(
-                    [p.prep_queue_length_on_arrival for p in patients_in_window]
-                )
-                time_series.append(avg_queue)
-            else:
-                time_series.append(0.0)
+    all_time_series = []
 
+    for rep in range(num_replications):
+        time_series = interval_series(stores[rep], sample_interval, num_samples)
         all_time_series.append(time_series)
         print(
             f"Rep {rep+1:2d}: Queue samples = {[f'{q:.1f}' for q in time_series[:5]]}... (first 5)"
@@ -166,8 +272,68 @@ def test_serial_correlation_scenario(
     }
 
 
+def correlogram_surface(
+    config, intervals, num_replications=10, num_samples=10, max_lag=9, stores=None
+):
+    """
+    Mean autocorrelation for every (sample interval, lag) pair.
+
+    Each replication is simulated once to the longest horizon needed,
+    (num_samples + 1) * max(intervals), and every interval's series is cut
+    from the same runs.
+    """
+    if stores is None:
+        horizon = (num_samples + 1) * max(intervals)
+        stores = simulate_replications(config, num_replications, horizon)
+
+    surface = []
+    for sample_interval in intervals:
+        series = [
+            interval_series(store, sample_interval, num_samples) for store in stores
+        ]
+        surface.append(compute_autocorrelation(series, max_lag=max_lag))
+
+    surface = np.array(surface)
+    return {
+        "intervals": list(intervals),
+        "lags": list(range(1, max_lag + 1)),
+        "surface": surface,
+        "max_correlation": np.abs(surface).max(axis=1).tolist(),
+    }
+
+
+def plot_correlogram_surface(
+    surface_results, save_path="figures/correlogram_surface.png"
+):
+    """Heatmap of autocorrelation by sample interval and lag"""
+    import matplotlib.pyplot as plt
+
+    surface = surface_results["surface"]
+
+    plt.figure(figsize=(10, 6))
+    plt.imshow(surface, aspect="auto", origin="lower", cmap="RdBu_r", vmin=-1, vmax=1)
+    plt.colorbar(label="Autocorrelation ρ")
+    plt.xticks(range(len(surface_results["lags"])), surface_results["lags"])
+    plt.yticks(range(len(surface_results["intervals"])), surface_results["intervals"])
+
+    plt.xlabel("Lag", fontsize=12)
+    plt.ylabel("Sample interval (time units)", fontsize=12)
+    plt.title(
+        "Correlogram Surface - Queue Length Samples",
+        fontsize=14,
+        fontweight="bold",
+    )
+    plt.tight_layout()
+
+    plt.savefig(save_path, dpi=300, bbox_inches="tight")
+    print(f"✅ Correlogram surface saved to: {save_path}")
+    plt.close()
+
+
 def plot_autocorrelation(results, save_path="figures/autocorrelation.png"):
     """Plot autocorrelation function"""
+    import matplotlib.pyplot as plt
+
     autocorr = results["autocorrelations"]
     lags = list(range(1, len(autocorr) + 1))
 
@@ -226,18 +392,38 @@ def run_correlation_tests():
         emergency_probability=0.0,
     )
 
+    # One run per replication, long enough for every interval below
+    intervals = list(range(100, 1001, 100))
+    stores = simulate_replications(
+        config_high_util, num_replications=10, horizon=11 * max(intervals)
+    )
+
     print("\n### TEST 1: Sample interval = 100 time units ###")
     results_100 = test_serial_correlation_scenario(
-        config_high_util, num_replications=10, num_samples=10, sample_interval=100
+        config_high_util,
+        num_replications=10,
+        num_samples=10,
+        sample_interval=100,
+        stores=stores,
     )
     plot_autocorrelation(results_100, "figures/autocorr_interval100.png")
 
     print("\n### TEST 2: Sample interval = 200 time units ###")
     results_200 = test_serial_correlation_scenario(
-        config_high_util, num_replications=10, num_samples=10, sample_interval=200
+        config_high_util,
+        num_replications=10,
+        num_samples=10,
+        sample_interval=200,
+        stores=stores,
     )
     plot_autocorrelation(results_200, "figures/autocorr_interval200.png")
 
+    print("\n### Correlogram surface: intervals 100-1000 ###")
+    surface = correlogram_surface(config_high_util, intervals, stores=stores)
+    for sample_interval, max_corr in zip(intervals, surface["max_correlation"]):
+        print(f"  Interval {sample_interval:5d}: max |ρ| = {max_corr:.3f}")
+    plot_correlogram_surface(surface, "figures/correlogram_surface.png")
+
     print("\n" + "=" * 70)
     print("RECOMMENDATION FOR MAIN EXPERIMENTS")
     print("=" * 70)
@@ -268,4 +454,5 @@ if __name__ == "__main__":
     print(f"\nPlots saved:")
     print(f"  - figures/autocorr_interval100.png")
     print(f"  - figures/autocorr_interval200.png")
+    print(f"  - figures/correlogram_surface.png")
     print("=" * 70 + "\n")
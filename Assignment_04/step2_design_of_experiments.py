@@ -1,112 +1,240 @@
 """
 Assignment 4 - Step 2: Design of Experiments
-2^(6-3) Fractional Factorial Design
+2^(6-3) Fractional Factorial Design and other screening designs
 """
 
 import numpy as np
-import pandas as pd
 import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Sequence, Tuple
 from surgery_simulation_a4 import SurgerySimulation, SimulationConfig, DistributionType
+from batch_simulation import simulate_batch
+from factorial_design import (
+    FractionalFactorial,
+    alias_matrix,
+    foldover,
+    mixed_level_design,
+    plackett_burman,
+)
+from batch_means import run_batch_means
+from warmup_detection import apply_detected_warmup
+from result_cache import ResultCache, code_version
+from experiment_journal import ExperimentJournal, JOURNAL_PATH
+from results_store import load_results, save_results, to_columns
+from replication_runner import (
+    half_width,
+    resolve_jobs,
+    run_replications,
+    run_sequential,
+)
+
+
+@dataclass(frozen=True)
+class Factor:
+    """A design factor: the SimulationConfig fields set at each level"""
+
+    name: str
+    levels: Tuple[Dict, ...]  # low to high
+    labels: Tuple[str, ...]
+
+
+# Factor table: coded level -1 is levels[0], +1 is levels[-1] and the
+# levels in between are evenly spaced (e.g. 0 is the middle of three).
+# The first level of every factor is the default setting, so factors left
+# out of a design stay at their low level.
+FACTOR_TABLE = {
+    "A": Factor(
+        "Interarrival Time",
+        (
+            {
+                "interarrival_dist": DistributionType.EXPONENTIAL,
+                "interarrival_param1": 25.0,
+            },
+            {
+                "interarrival_dist": DistributionType.EXPONENTIAL,
+                "interarrival_param1": 22.5,
+            },
+        ),
+        ("exp(25)", "exp(22.5)    [faster]"),
+    ),
+    "B": Factor(
+        "Preparation Time",
+        (
+            {"prep_dist": DistributionType.EXPONENTIAL, "prep_param1": 40.0},
+            {
+                "prep_dist": DistributionType.UNIFORM,
+                "prep_param1": 30.0,
+                "prep_param2": 50.0,
+            },
+        ),
+        ("exp(40)", "Unif(30,50)  [variable]"),
+    ),
+    "C": Factor(
+        "Recovery Time",
+        (
+            {"recovery_dist": DistributionType.EXPONENTIAL, "recovery_param1": 40.0},
+            {
+                "recovery_dist": DistributionType.UNIFORM,
+                "recovery_param1": 30.0,
+                "recovery_param2": 50.0,
+            },
+        ),
+        ("exp(40)", "Unif(30,50)  [variable]"),
+    ),
+    "D": Factor(
+        "Prep Units",
+        ({"num_prep_rooms": 4}, {"num_prep_rooms": 5}),
+        ("4 units", "5 units"),
+    ),
+    "E": Factor(
+        "Recovery Units",
+        ({"num_recovery_rooms": 4}, {"num_recovery_rooms": 5}),
+        ("4 units", "5 units"),
+    ),
+    "F": Factor(
+        "Priority System",
+        ({"emergency_probability": 0.0}, {"emergency_probability": 0.2}),
+        ("disabled", "enabled (20% emergency)"),
+    ),
+    "G": Factor(
+        "Surgery Time",
+        ({"surgery_mean": 20.0}, {"surgery_mean": 22.0}, {"surgery_mean": 24.0}),
+        ("exp(20)", "exp(22)", "exp(24)"),
+    ),
+    "H": Factor(
+        "Operating Rooms",
+        ({"num_operating_rooms": 1}, {"num_operating_rooms": 2}),
+        ("1 room", "2 rooms"),
+    ),
+    "J": Factor(
+        "Warmup Period",
+        ({"warmup_period": 1000.0}, {"warmup_period": 2000.0}),
+        ("1000 min", "2000 min"),
+    ),
+    "K": Factor(
+        "Run Length",
+        ({"sim_duration": 5000.0}, {"sim_duration": 10000.0}),
+        ("5000 min", "10000 min"),
+    ),
+}
+
+# Settings of every experiment before the factor levels are applied
+FIXED_SETTINGS = {"sim_duration": 5000.0, "warmup_period": 1000.0}
+
+# The original 2^(6-3) design (note E = AB = CD = F: E and F are aliased)
+DEFAULT_GENERATORS = ("D=ABC", "E=AB", "F=CD")
 
 
 class ExperimentDesign:
-    """2^(6-3) Fractional Factorial Design for 6 factors"""
-
-    def __init__(self):
-        self.factors = ["A", "B", "C", "D", "E", "F"]
-        self.factor_names = {
-            "A": "Interarrival Time",
-            "B": "Preparation Time",
-            "C": "Recovery Time",
-            "D": "Prep Units",
-            "E": "Recovery Units",
-            "F": "Priority System",
-        }
+    """
+    Designs over factors of FACTOR_TABLE (design columns in the order of
+    `factors`): 2^(k-p) fractional factorials from generators or a
+    resolution, Plackett-Burman screening designs and mixed-level full
+    factorials. Design matrices hold coded levels in [-1, 1].
+    """
+
+    def __init__(self, factors: Sequence[str] = "ABCDEF"):
+        for name in factors:
+            if name not in FACTOR_TABLE:
+                raise ValueError(f"Unknown factor: {name}")
+        self.factors = list(factors)
+        self.factor_names = {name: FACTOR_TABLE[name].name for name in self.factors}
+        self.title = None
+        self.fraction = None  # FractionalFactorial of a 2^(k-p) design
 
     def create_2_6_3_design(self):
         """Create 2^(6-3) design (8 runs)"""
-        n_runs = 8
-        design_matrix = np.zeros((n_runs, 6), dtype=int)
-
-        # Full factorial for 3 factors
-        for i in range(n_runs):
-            design_matrix[i, 0] = 1 if (i & 4) else -1  # A
-            design_matrix[i, 1] = 1 if (i & 2) else -1  # B
-            design_matrix[i, 2] = 1 if (i & 1) else -1  # C
-
-        # Generators
-        for i in range(n_runs):
-            A, B, C = design_matrix[i, :3]
-            design_matrix[i, 3] = A * B * C  # D = ABC
-            design_matrix[i, 4] = A * B  # E = AB
-            design_matrix[i, 5] = C * design_matrix[i, 3]  # F = CD
+        return self.create_fractional_design(DEFAULT_GENERATORS)
+
+    def create_fractional_design(self, generators=None, resolution=None):
+        """
+        2^(k-p) design from generators such as "D=ABC" (letters are design
+        columns: A is the first factor), or the smallest one found with at
+        least `resolution`; the full factorial if neither is given
+        """
+        k = len(self.factors)
+        if generators is not None:
+            self.fraction = FractionalFactorial(generators, k)
+        elif resolution is not None:
+            self.fraction = FractionalFactorial.with_resolution(k, resolution)
+        else:
+            self.fraction = FractionalFactorial((), k)
+        p = len(self.fraction.generators)
+        self.title = f"2^({k}-{p}) Fractional Factorial"
+        return self.fraction.matrix()
+
+    def create_plackett_burman_design(self, num_runs=None):
+        """Plackett-Burman screening design (main effects only)"""
+        design_matrix = plackett_burman(len(self.factors), num_runs)
+        self.fraction = None
+        self.title = f"Plackett-Burman ({len(design_matrix)} runs)"
+        return design_matrix
 
+    def create_foldover_design(self, design_matrix, factors=None, half=None):
+        """
+        `design_matrix` followed by its foldover runs on `factors` (names;
+        all if None), or with half=(name, level) by the semi-foldover half
+        """
+        columns = None if factors is None else [self.factors.index(f) for f in factors]
+        if half is not None:
+            half = (self.factors.index(half[0]), half[1])
+        new_runs = foldover(design_matrix, columns, half)
+        self.fraction = None
+        folded_on = "all factors" if factors is None else "".join(factors)
+        self.title = (
+            f"{self.title or 'Design'} + {'semi-' if half else ''}foldover on "
+            f"{folded_on} ({len(design_matrix)} + {len(new_runs)} runs)"
+        )
+        return np.vstack([design_matrix, new_runs])
+
+    def create_mixed_level_design(self, levels=None):
+        """Full factorial over all levels of each factor (or `levels` of them)"""
+        if levels is None:
+            levels = [len(FACTOR_TABLE[name].levels) for name in self.factors]
+        design_matrix = mixed_level_design(levels)
+        self.fraction = None
+        self.title = f"Mixed-Level Full Factorial ({'x'.join(map(str, levels))})"
         return design_matrix
 
+    def level_index(self, name, value):
+        """Index in FACTOR_TABLE[name].levels of a coded level"""
+        num_levels = len(FACTOR_TABLE[name].levels)
+        position = (value + 1) / 2 * (num_levels - 1)
+        index = int(round(position))
+        if abs(position - index) > 1e-9 or not 0 <= index < num_levels:
+            raise ValueError(f"Unknown level of factor {name}: {value}")
+        return index
+
+    def level_symbol(self, value):
+        if value == 1:
+            return "+"
+        if value == -1:
+            return "-"
+        return "0" if value == 0 else f"{value:+.2f}"
+
     def design_to_config(self, design_row):
         """Convert design row to SimulationConfig"""
-        A, B, C, D, E, F = design_row
-
-        config = SimulationConfig()
-
-        # Factor A: Interarrival
-        if A == -1:
-            config.interarrival_dist = DistributionType.EXPONENTIAL
-            config.interarrival_param1 = 25.0
-        else:
-            config.interarrival_dist = DistributionType.EXPONENTIAL
-            config.interarrival_param1 = 22.5
-
-        # Factor B: Preparation
-        if B == -1:
-            config.prep_dist = DistributionType.EXPONENTIAL
-            config.prep_param1 = 40.0
-        else:
-            config.prep_dist = DistributionType.UNIFORM
-            config.prep_param1 = 30.0
-            config.prep_param2 = 50.0
-
-        # Factor C: Recovery
-        if C == -1:
-            config.recovery_dist = DistributionType.EXPONENTIAL
-            config.recovery_param1 = 40.0
-        else:
-            config.recovery_dist = DistributionType.UNIFORM
-            config.recovery_param1 = 30.0
-            config.recovery_param2 = 50.0
-
-        # Factor D: Prep units
-        config.num_prep_rooms = 4 if D == -1 else 5
-
-        # Factor E: Recovery units
-        config.num_recovery_rooms = 4 if E == -1 else 5
-
-        # Factor F: Priority system
-        config.emergency_probability = 0.0 if F == -1 else 0.2
-
-        # Fixed settings
-        config.sim_duration = 5000.0
-        config.warmup_period = 1000.0
-
-        return config
+        settings = dict(FIXED_SETTINGS)
+        for name, value in zip(self.factors, design_row):
+            factor = FACTOR_TABLE[name]
+            settings.update(factor.levels[self.level_index(name, value)])
+        return SimulationConfig(**settings)
 
     def print_design_table(self, design_matrix):
         """Print design matrix"""
+        import pandas as pd
+
         print("\n" + "=" * 100)
-        print("EXPERIMENT DESIGN MATRIX - 2^(6-3) Fractional Factorial")
+        print(f"EXPERIMENT DESIGN MATRIX - {self.title or 'Custom Design'}")
         print("=" * 100)
 
         rows = []
         for i, row in enumerate(design_matrix, 1):
-            row_dict = {
-                "Run": i,
-                "A": "+" if row[0] == 1 else "-",
-                "B": "+" if row[1] == 1 else "-",
-                "C": "+" if row[2] == 1 else "-",
-                "D": "+" if row[3] == 1 else "-",
-                "E": "+" if row[4] == 1 else "-",
-                "F": "+" if row[5] == 1 else "-",
-            }
+            row_dict = {"Run": i}
+            for name, value in zip(self.factors, row):
+                row_dict[name] = self.level_symbol(value)
             rows.append(row_dict)
 
         df = pd.DataFrame(rows)
@@ -115,97 +243,359 @@ class ExperimentDesign:
         print("\n" + "=" * 100)
         print("FACTOR DEFINITIONS:")
         print("=" * 100)
-        print("A (Interarrival):  - = exp(25)      | + = exp(22.5)    [faster]")
-        print("B (Preparation):   - = exp(40)      | + = Unif(30,50)  [variable]")
-        print("C (Recovery):      - = exp(40)      | + = Unif(30,50)  [variable]")
-        print("D (Prep Units):    - = 4 units      | + = 5 units")
-        print("E (Recovery Units):- = 4 units      | + = 5 units")
-        print("F (Priority):      - = disabled     | + = enabled (20% emergency)")
+        for name in self.factors:
+            factor = FACTOR_TABLE[name]
+            coded = np.linspace(-1, 1, len(factor.levels))
+            print(
+                f"{name} ({factor.name}):".ljust(24)
+                + " | ".join(
+                    f"{self.level_symbol(value)} = {label}"
+                    for value, label in zip(coded, factor.labels)
+                )
+            )
+
+        if self.fraction is not None and self.fraction.generators:
+            # Design letters are columns; name them after the table factors
+            rename = str.maketrans(
+                "".join(self.fraction.factors), "".join(self.factors)
+            )
+            print("\n" + "=" * 100)
+            print(
+                f"ALIAS STRUCTURE (resolution {self.fraction.resolution}, "
+                "up to two-factor interactions):"
+            )
+            print("=" * 100)
+            relation = " = ".join(self.fraction.defining_relation())
+            print(f"I = {relation}".translate(rename))
+            # Main effects, and the two-factor interactions that are aliased
+            # with another effect of at most two factors
+            for effect, aliases in self.fraction.alias_structure(2, 2).items():
+                if len(effect) == 1 or aliases:
+                    chain = " = ".join(aliases) or "(clear)"
+                    print(f"{effect} = {chain}".translate(rename))
+        elif np.isin(design_matrix, (-1, 1)).all():
+            # Non-regular two-level designs (Plackett-Burman, foldovers):
+            # what each main-effect estimate is biased by
+            print("\n" + "=" * 100)
+            print("ALIAS MATRIX (main effects vs two-factor interactions):")
+            print("=" * 100)
+            correlation = design_matrix.T @ design_matrix / len(design_matrix)
+            for i, j in zip(*np.triu_indices(len(self.factors), 1)):
+                if abs(correlation[i, j]) == 1:
+                    sign = "" if correlation[i, j] > 0 else "-"
+                    print(f"{self.factors[i]} = {sign}{self.factors[j]} (confounded)")
+            for effect, aliases in alias_matrix(design_matrix, self.factors).items():
+                if effect != "I":
+                    chain = " ".join(f"{c:+.2f}·{name}" for name, c in aliases.items())
+                    print(f"E[{effect}] = {effect} {chain or '(clear)'}")
         print("=" * 100 + "\n")
 
 
-def run_single_experiment(config, num_replications=10):
-    """Run single experiment with replications"""
-    queue_lengths = []
+def timed(run_seeds):
+    """Add each replication's wall time (amortized over its chunk) to its stats"""
+
+    def run_timed(seeds):
+        start = time.perf_counter()
+        all_stats = run_seeds(seeds)
+        wall_time = (time.perf_counter() - start) / max(len(seeds), 1)
+        return [dict(stats, wall_time=wall_time) for stats in all_stats]
+
+    return run_timed
+
+
+def run_single_experiment(
+    config,
+    num_replications=10,
+    vectorized=False,
+    jobs=1,
+    relative_precision=None,
+    absolute_precision=None,
+    max_replications=100,
+    method="replications",
+    cache=None,
+    journal=None,
+    journal_fields=None,
+):
+    """
+    Run single experiment with replications (jobs = worker processes).
+
+    With a relative or absolute precision target, num_replications is only
+    the initial batch: replications are added until the 95% CI half-width
+    of the average queue length meets the target or max_replications runs.
+
+    method="batch_means" instead simulates one run with a single warmup and
+    the same total measured time (num_replications measurement periods),
+    and treats its batch means as the replicates. That single run is not
+    vectorized, parallel, sequential, cached or journaled, so those
+    arguments raise a ValueError with it.
+
+    With config.auto_warmup the MSER-5 warmup is resolved once here rather
+    than in every replication.
+
+    With a ResultCache, event-driven replications that were already run for
+    the same config, seed and model code are read from disk instead.
+
+    With an ExperimentJournal, each finished replication is appended to it
+    (with journal_fields) and seeds already journaled for this config and
+    the current model code are not run again.
+
+    Replications also return their seeds and full statistics (plus
+    wall_time) as "seeds" and "replicate_stats"; with a precision target
+    the result also has "converged" (target met before max_replications)
+    and the final "relative_half_width". Every result carries the
+    code_version() of the model that produced it as "code".
+    """
+    if config.auto_warmup:
+        config = apply_detected_warmup(config)
+    code = code_version(
+        (simulate_batch if vectorized else SurgerySimulation).__module__
+    )
+
+    if method == "batch_means":
+        unsupported = [
+            name
+            for name, used in (
+                ("vectorized", vectorized),
+                ("jobs", jobs != 1),
+                ("relative_precision", relative_precision is not None),
+                ("absolute_precision", absolute_precision is not None),
+                ("cache", cache is not None),
+                ("journal", journal is not None),
+            )
+            if used
+        ]
+        if unsupported:
+            raise ValueError(
+                f"Not supported with method='batch_means': {', '.join(unsupported)}"
+            )
+        result = run_batch_means(
+            config,
+            measurement_length=num_replications
+            * (config.sim_duration - config.warmup_period),
+        )
+        return {**result, "code": code}
+    elif method != "replications":
+        raise ValueError(f"Unknown method: {method}")
+
+    if vectorized:
+
+        def run_seeds(seeds):
+            # All replications of a chunk in one NumPy pass
+            batch = simulate_batch(config, seeds)
+            return [dict(zip(batch, values)) for values in zip(*batch.values())]
+
+    else:
+
+        def run_seeds(seeds):
+            return run_replications(
+                SurgerySimulation, config, seeds, jobs=jobs, cache=cache
+            )
+
+    run_seeds = timed(run_seeds)
+
+    if journal is not None:
+        run_all_seeds = run_seeds
+        key = config.digest(exclude=("random_seed",))
+
+        def run_seeds(seeds):
+            return journal.run(
+                key,
+                seeds,
+                run_all_seeds,
+                chunk_size=None if vectorized else resolve_jobs(jobs),
+                code=code,
+                **(journal_fields or {}),
+            )
+
+    precision = None
+    if relative_precision is None and absolute_precision is None:
+        seeds = [42 + rep for rep in range(num_replications)]
+        all_stats = run_seeds(seeds)
+    else:
+        all_stats, precision = run_sequential(
+            run_seeds,
+            "avg_queue_length",
+            relative_precision=relative_precision,
+            absolute_precision=absolute_precision,
+            initial_replications=num_replications,
+            max_replications=max_replications,
+            step=1 if vectorized else resolve_jobs(jobs),
+        )
+        seeds = precision["seeds"]
 
-    for rep in range(num_replications):
-        config.random_seed = 42 + rep
-        sim = SurgerySimulation(config)
-        sim.run()
-        stats = sim.get_statistics()
-        queue_lengths.append(stats["avg_queue_length"])
+    queue_lengths = [float(stats["avg_queue_length"]) for stats in all_stats]
 
-    return {
+    result = {
         "mean": np.mean(queue_lengths),
         "std": np.std(queue_lengths, ddof=1),
+        "half_width": half_width(queue_lengths),
+        "num_replications": len(queue_lengths),
         "replicates": queue_lengths,
+        "seeds": seeds,
+        "replicate_stats": all_stats,
+        "code": code,
     }
+    if precision is not None:
+        # False when max_replications stopped the run short of the target
+        result["converged"] = precision["converged"]
+        result["relative_half_width"] = precision["relative_half_width"]
+    return result
+
+
+def run_full_experiment_series(
+    vectorized=False,
+    jobs=1,
+    relative_precision=None,
+    absolute_precision=None,
+    method="replications",
+    cache=None,
+    journal_path=JOURNAL_PATH,
+    resume=True,
+    design=None,
+    design_matrix=None,
+    reuse=None,
+    output_prefix="results/experiment",
+):
+    """
+    Run complete design of experiments (optionally to a CI precision target).
+
+    By default this is the 2^(6-3) design; pass an ExperimentDesign and a
+    matrix from one of its create_*_design() methods to run another.
+    Design points found in `reuse` (results as saved in the JSON file) are
+    not run again if they were saved with the current model code; older
+    entries (or ones without a "code") are rerun. Reused entries with
+    "replicate_stats" keep them in the .npz file, others only hold the
+    queue length.
+    Results are saved to {output_prefix}_results.json/.npz and
+    {output_prefix}_summary.csv.
+
+    Replications are journaled to journal_path as they finish; with resume
+    a restarted series skips those already there, and the saved results
+    are built from the journal. journal_path=None turns journaling off;
+    batch means runs (method="batch_means") are never journaled.
+    """
+    import pandas as pd
+
+    if method == "batch_means":
+        journal_path = None
+    journal = ExperimentJournal(journal_path, resume) if journal_path else None
+    sequential = relative_precision is not None or absolute_precision is not None
 
-
-def run_full_experiment_series():
-    """Run complete design of experiments"""
     print("\n" + "=" * 100)
     print("ASSIGNMENT 4 - DESIGN OF EXPERIMENTS")
     print("=" * 100)
-    print("\nRunning 2^(6-3) fractional factorial (8 experiments)")
-    print("Each experiment: 10 replications = 80 total runs")
+    if design is None:
+        design = ExperimentDesign()
+        design_matrix = design.create_2_6_3_design()
+    num_runs = len(design_matrix)
+
+    print(f"\nRunning {design.title or 'custom design'} ({num_runs} experiments)")
+    if sequential:
+        print("Each experiment: 10+ replications until the 95% CI target is met")
+    else:
+        print(f"Each experiment: 10 replications = {10 * num_runs} total runs")
     print("=" * 100 + "\n")
 
-    design = ExperimentDesign()
-    design_matrix = design.create_2_6_3_design()
     design.print_design_table(design_matrix)
 
+    reusable = {
+        tuple(r["factors"].get(name) for name in design.factors): r for r in reuse or ()
+    }
+    # Saved runs are only reused if the same model code produced them
+    code = code_version(
+        (simulate_batch if vectorized else SurgerySimulation).__module__
+    )
     results = []
+    rows = []  # one per replication, for the columnar results file
 
     for run_id, design_row in enumerate(design_matrix, 1):
         print(f"\n{'='*100}")
-        print(f"Running Experiment {run_id}/8")
+        print(f"Running Experiment {run_id}/{num_runs}")
         print(f"{'='*100}")
 
         config = design.design_to_config(design_row)
 
         print(f"\nConfiguration:")
-        print(f"  A: {config.interarrival_dist.value}({config.interarrival_param1})")
-        print(
-            f"  B: {config.prep_dist.value}({config.prep_param1}, {config.prep_param2})"
-        )
-        print(
-            f"  C: {config.recovery_dist.value}({config.recovery_param1}, {config.recovery_param2})"
-        )
-        print(f"  D: {config.num_prep_rooms} prep rooms")
-        print(f"  E: {config.num_recovery_rooms} recovery rooms")
-        print(
-            f"  F: Priority {'Enabled' if config.emergency_probability > 0 else 'Disabled'}"
-        )
-
-        print(f"\nRunning 10 replications...")
-        result = run_single_experiment(config, num_replications=10)
+        for name, value in zip(design.factors, design_row):
+            factor = FACTOR_TABLE[name]
+            label = factor.labels[design.level_index(name, value)]
+            print(f"  {name}: {factor.name} {label}")
+
+        previous = reusable.get(tuple(design_row.tolist()))
+        if previous is not None and previous.get("code") != code:
+            print(
+                f"\nEarlier run {previous['run']} was saved with other model code, "
+                "running it again"
+            )
+            previous = None
+        if previous is not None:
+            print(f"\nReusing the replications of earlier run {previous['run']}")
+            result = reused_result(previous)
+        else:
+            print(f"\nRunning {'10+' if sequential else '10'} replications...")
+            result = run_single_experiment(
+                config,
+                num_replications=10,
+                vectorized=vectorized,
+                jobs=jobs,
+                relative_precision=relative_precision,
+                absolute_precision=absolute_precision,
+                method=method,
+                cache=cache,
+                journal=journal,
+                journal_fields={"run": run_id, "design": design_row.tolist()},
+            )
 
         print(f"\n📊 Results:")
         print(f"   Avg Queue Length: {result['mean']:.3f} ± {result['std']:.3f}")
+        print(
+            f"   95% CI half-width: ±{result['half_width']:.3f} "
+            f"(n = {result['num_replications']})"
+        )
         print(f"   Replicates: {[f'{q:.2f}' for q in result['replicates']]}")
+        if result.get("converged") is False:
+            print(
+                f"⚠️  Warning: stopped at {result['num_replications']} replications "
+                f"with relative half-width {result['relative_half_width']:.3f}, "
+                f"short of the precision target"
+            )
 
         results.append(
             {
                 "run": run_id,
                 "design": design_row.tolist(),
-                "factors": {
-                    "A": int(design_row[0]),
-                    "B": int(design_row[1]),
-                    "C": int(design_row[2]),
-                    "D": int(design_row[3]),
-                    "E": int(design_row[4]),
-                    "F": int(design_row[5]),
-                },
+                "factors": dict(zip(design.factors, design_row.tolist())),
                 "avg_queue_length": result["mean"],
                 "std_queue_length": result["std"],
+                "half_width": result["half_width"],
+                "num_replications": result["num_replications"],
                 "replicates": result["replicates"],
+                **{
+                    key: result[key]
+                    for key in ("seeds", "code", "converged", "relative_half_width")
+                    if key in result
+                },
             }
         )
+        factors = results[-1]["factors"]
+        for seed, stats in zip(
+            result.get("seeds", []), result.get("replicate_stats", [])
+        ):
+            rows.append(
+                {
+                    "run": run_id,
+                    **factors,
+                    "seed": seed,
+                    "code": result["code"],
+                    **stats,
+                }
+            )
 
     # Save results
-    with open("results/experiment_results.json", "w") as f:
+    with open(f"{output_prefix}_results.json", "w") as f:
         json.dump(results, f, indent=2)
+    if rows:
+        save_results(f"{output_prefix}_results.npz", to_columns(rows))
 
     # Summary table
     print("\n" + "=" * 100)
@@ -217,14 +607,15 @@ def run_full_experiment_series():
         summary_data.append(
             {
                 "Run": r["run"],
-                "A": "+" if r["factors"]["A"] == 1 else "-",
-                "B": "+" if r["factors"]["B"] == 1 else "-",
-                "C": "+" if r["factors"]["C"] == 1 else "-",
-                "D": "+" if r["factors"]["D"] == 1 else "-",
-                "E": "+" if r["factors"]["E"] == 1 else "-",
-                "F": "+" if r["factors"]["F"] == 1 else "-",
+                **{
+                    name: design.level_symbol(value)
+                    for name, value in r["factors"].items()
+                },
                 "Avg Queue": f"{r['avg_queue_length']:.3f}",
                 "Std": f"{r['std_queue_length']:.3f}",
+                "±95%": f"{r['half_width']:.3f}",
+                "n": r["num_replications"],
+                **({"Converged": r.get("converged")} if sequential else {}),
             }
         )
 
@@ -232,20 +623,132 @@ def run_full_experiment_series():
     print(df_summary.to_string(index=False))
     print("=" * 100)
 
-    df_summary.to_csv("results/experiment_summary.csv", index=False)
+    df_summary.to_csv(f"{output_prefix}_summary.csv", index=False)
 
     print(f"\n✅ Results saved:")
-    print(f"   - results/experiment_results.json")
-    print(f"   - results/experiment_summary.csv")
+    print(f"   - {output_prefix}_results.json")
+    if rows:
+        print(f"   - {output_prefix}_results.npz")
+    print(f"   - {output_prefix}_summary.csv")
 
     return results
 
 
-if __name__ == "__main__":
-    results = run_full_experiment_series()
+def reused_result(previous):
+    """
+    run_single_experiment()-style result from a saved JSON results entry
+    (with the "replicate_stats" run_foldover_series() attaches, if any)
+    """
+    replicates = previous["replicates"]
+    return {
+        "mean": previous["avg_queue_length"],
+        "std": previous["std_queue_length"],
+        "half_width": previous.get("half_width", half_width(replicates)),
+        "num_replications": previous.get("num_replications", len(replicates)),
+        "replicates": replicates,
+        # Results saved before the seeds were stored used 42, 43, ...
+        "seeds": previous.get("seeds", [42 + rep for rep in range(len(replicates))]),
+        "replicate_stats": previous.get(
+            "replicate_stats", [{"avg_queue_length": q} for q in replicates]
+        ),
+        "code": previous["code"],
+        **{
+            key: previous[key]
+            for key in ("converged", "relative_half_width")
+            if key in previous
+        },
+    }
+
+
+def attach_replicate_stats(results, path):
+    """
+    Add the per-replication statistics saved in the .npz file at `path`
+    to the matching JSON results entries (same run, seeds and code)
+    """
+    if not os.path.exists(path):
+        return
+    columns = load_results(path, as_frame=False)
+    if "code" not in columns:
+        return
+    names = [
+        name
+        for name in columns
+        if name not in ("run", "seed", "code") and name not in FACTOR_TABLE
+    ]
+    for entry in results:
+        rows = np.flatnonzero(
+            (columns["run"] == entry["run"]) & (columns["code"] == entry.get("code"))
+        )
+        if columns["seed"][rows].tolist() == entry.get("seeds"):
+            entry["replicate_stats"] = [
+                {name: columns[name][row].item() for name in names} for row in rows
+            ]
+
+
+def run_foldover_series(
+    factors=("F",),
+    half=None,
+    previous_file="results/experiment_results.json",
+    **kwargs,
+):
+    """
+    Augment the 2^(6-3) design with its foldover on `factors` (None for
+    all; half=(factor, level) for a semi-foldover) and run only the new
+    design points, reusing the runs saved in previous_file (and their full
+    statistics from the .npz file next to it) that the current model code
+    produced. The combined design is saved to results/foldover_*; other
+    keyword arguments are passed to run_full_experiment_series().
+
+    The base design has E = F (defining word EF), which a full foldover
+    keeps; folding on F (the default) leaves I = ABCD = ABE = CDE, so all
+    six main effects are estimable and F is clear of every interaction.
+    """
+    design = ExperimentDesign()
+    design_matrix = design.create_foldover_design(
+        design.create_2_6_3_design(), factors, half
+    )
+
+    model = np.column_stack([np.ones(len(design_matrix)), design_matrix])
+    rank = np.linalg.matrix_rank(model)
+    if rank < model.shape[1]:
+        print(
+            f"⚠️  Warning: the combined design has rank {rank} of "
+            f"{model.shape[1]}, so some main effects stay aliased "
+            "(fold on E or F to separate E = F)"
+        )
+    with open(previous_file) as f:
+        previous = json.load(f)
+    attach_replicate_stats(previous, os.path.splitext(previous_file)[0] + ".npz")
+
+    return run_full_experiment_series(
+        design=design,
+        design_matrix=design_matrix,
+        reuse=previous,
+        output_prefix="results/foldover",
+        **kwargs,
+    )
+
+
+def main(resume=True):
+    """
+    Run the experiment series, reusing cached replications (and, with
+    resume, those journaled by an interrupted run)
+    """
+    results = run_full_experiment_series(cache=ResultCache(), resume=resume)
 
     print("\n" + "=" * 100)
     print("EXPERIMENTS COMPLETE!")
     print("=" * 100)
     print("\nNext: Run step3_regression_analysis.py")
     print("=" * 100 + "\n")
+
+    return results
+
+
+def main_foldover(resume=True):
+    """Run the foldover runs of the experiment series, reusing cached ones"""
+    return run_foldover_series(cache=ResultCache(), resume=resume)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,124 +3,234 @@ Assignment 4 - Step 3: Regression Analysis
 """
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 import json
-from scipy import stats
+import os
+from bootstrap import DEFAULT_RESAMPLES, confidence_interval, stratified_indices
+from factorial_design import LETTERS
+from metamodel import LeastSquaresFit, group_variances, model_matrix
+from results_store import load_results
+
+FACTOR_LABELS = {
+    "A": "Interarrival",
+    "B": "Preparation",
+    "C": "Recovery",
+    "D": "Prep Rooms",
+    "E": "Recovery Rooms",
+    "F": "Priority",
+}
 
 
 class RegressionAnalysis:
-    """Regression analysis for factorial experiments"""
-
-    def __init__(self, results_file="results/experiment_results.json"):
-        with open(results_file, "r") as f:
-            self.results = json.load(f)
+    """
+    Regression analysis for factorial experiments.
+
+    The factors are the factor columns found in the results file (A-F for
+    the 2^(6-3) design); for a design augmented by a foldover
+    (results/foldover_results.npz) the main effects are fitted from the
+    combined runs, which separate effects that were aliased in the
+    original fraction (E and F after the default fold on F).
+
+    The model is fitted on one QR factorization (metamodel.py) shared by
+    all `responses`; the first one is printed and plotted. `terms` are
+    model terms as in metamodel.model_terms() (main effects by default).
+    With replicates=True every replication is a row instead of the run
+    means; weighted=True fits weighted least squares, weighting each run
+    by 1 / s^2 of its replicates of the first response (n / s^2 for means).
+
+    bootstrap_coefficients() gives percentile/BCa intervals of every
+    coefficient by resampling the replications within each run.
+    """
+
+    def __init__(
+        self,
+        results_file="results/experiment_results.npz",
+        responses=("avg_queue_length",),
+        terms=None,
+        replicates=False,
+        weighted=False,
+    ):
+        import pandas as pd
+
+        self.responses = list(responses)
+        fallback = results_file[: -len(".npz")] + ".json"
+        if (
+            results_file.endswith(".npz")
+            and not os.path.exists(results_file)
+            and os.path.exists(fallback)
+        ):
+            # Results saved before the .npz file existed
+            results_file = fallback
+        if results_file.endswith(".json"):
+            with open(results_file, "r") as f:
+                replications = pd.DataFrame(
+                    [
+                        {"run": r["run"], **r["factors"], "avg_queue_length": q}
+                        for r in json.load(f)
+                        for q in r["replicates"]
+                    ]
+                )
+        else:
+            replications = load_results(results_file)
+        for response in self.responses:
+            if response not in replications:
+                raise ValueError(f"Unknown response: {response}")
+
+        # Rows without every response (e.g. reused foldover runs) are left out
+        self.factors = [name for name in LETTERS if name in replications]
+        replications = replications[["run", *self.factors, *self.responses]].dropna(
+            subset=self.responses
+        )
+        runs = replications.groupby("run", as_index=False).mean()
+        self.replications = replications
+        self.results = replications if replicates else runs
+        self.replicates = replicates
+        self.terms = list(self.factors if terms is None else terms)
+
+        self.weights = None
+        if weighted:
+            index, counts, variances = group_variances(
+                replications["run"], replications[self.responses[0]]
+            )
+            self.weights = 1 / variances[index] if replicates else counts / variances
 
-        self.X, self.y, self.run_ids = self._prepare_data()
+        self.X, self.Y, self.run_ids = self._prepare_data()
+        self.y = self.Y[:, 0]
+        self.least_squares = LeastSquaresFit(self.X, self.weights)
 
     def _prepare_data(self):
         """Prepare design matrix and responses"""
-        n = len(self.results)
-        X = np.ones((n, 7))  # Intercept + 6 factors
-        y = np.zeros(n)
-        run_ids = []
-
-        for i, result in enumerate(self.results):
-            factors = result["factors"]
-            X[i, 1] = factors["A"]
-            X[i, 2] = factors["B"]
-            X[i, 3] = factors["C"]
-            X[i, 4] = factors["D"]
-            X[i, 5] = factors["E"]
-            X[i, 6] = factors["F"]
-            y[i] = result["avg_queue_length"]
-            run_ids.append(result["run"])
-
-        return X, y, run_ids
+        X = model_matrix(self.results, self.terms)  # Intercept + terms
+        Y = self.results[self.responses].to_numpy(dtype=float)
+        run_ids = self.results["run"].tolist()
+
+        return X, Y, run_ids
 
     def fit_model(self):
-        """Fit regression using least squares"""
-        XtX = self.X.T @ self.X
-        Xty = self.X.T @ self.y
+        """Fit regression by least squares on a QR factorization"""
+        if len(self.least_squares.aliased):
+            labels = ["Intercept", *self.terms]
+            aliased = [labels[i] for i in self.least_squares.aliased]
+            print(f"⚠️  Warning: aliased terms not estimable: {', '.join(aliased)}")
+        return self.least_squares.coefficients(self.y)
+
+    def calculate_statistics(self, beta, bootstrap=None):
+        """
+        Calculate regression statistics; bootstrap="bca" or "percentile"
+        adds bootstrap intervals of the coefficients (boot_lower/boot_upper)
+        """
+        stats_dict = self.least_squares.statistics(self.y, beta)
+        if bootstrap is not None:
+            intervals = self.bootstrap_coefficients(method=bootstrap)
+            for key in ("boot_lower", "boot_upper", "boot_std_error"):
+                stats_dict[key] = intervals[key][:, 0]
+            stats_dict["boot_method"] = bootstrap
+        return stats_dict
 
-        if np.linalg.det(XtX) == 0:
-            print("⚠️  Warning: Singular matrix!")
-            beta = np.linalg.pinv(XtX) @ Xty
+    def fit_responses(self, bootstrap=None):
+        """Statistics of every response, from one factorization"""
+        stats_all = self.least_squares.statistics(self.Y)
+        if bootstrap is not None:
+            stats_all.update(self.bootstrap_coefficients(method=bootstrap))
+        responses = {
+            response: {key: value[..., j] for key, value in stats_all.items()}
+            for j, response in enumerate(self.responses)
+        }
+        if bootstrap is not None:
+            for response_stats in responses.values():
+                response_stats["boot_method"] = bootstrap
+        return responses
+
+    def bootstrap_coefficients(
+        self,
+        num_resamples=DEFAULT_RESAMPLES,
+        confidence=0.95,
+        method="bca",
+        seed=42,
+    ):
+        """
+        Bootstrap intervals (p, responses) of the coefficients. Each resample
+        redraws the replications of every run with replacement, keeping the
+        design fixed; all resamples of all responses are fitted in one solve
+        on the existing factorization. The jackknife values for BCa leave
+        out one replication at a time, in closed form (no refits).
+        """
+        groups = self.replications["run"].to_numpy()
+        values = self.replications[self.responses].to_numpy(dtype=float)
+        n, m = values.shape
+        p = self.X.shape[1]
+        beta = self.least_squares.coefficients(self.Y)  # (p, m)
+
+        indices = stratified_indices(groups, num_resamples, seed)  # (B, n)
+        resampled = values[indices.T].reshape(n, -1)  # (n, B * m)
+        if self.replicates:
+            jackknife = self.least_squares.deletion_coefficients(values)
         else:
-            beta = np.linalg.inv(XtX) @ Xty
-
-        return beta
-
-    def calculate_statistics(self, beta):
-        """Calculate regression statistics"""
-        n = len(self.y)
-        p = len(beta)
-
-        y_pred = self.X @ beta
-        residuals = self.y - y_pred
-
-        SSR = np.sum(residuals**2)
-        SST = np.sum((self.y - np.mean(self.y)) ** 2)
-        SSE = SST - SSR
-
-        r_squared = 1 - (SSR / SST) if SST > 0 else 0
-        adj_r_squared = 1 - ((SSR / (n - p)) / (SST / (n - 1))) if n > p else 0
-
-        MSE = SSR / (n - p) if n > p else 0
-
-        # Use pseudo-inverse to handle singular matrix
-        try:
-            var_beta = MSE * np.linalg.inv(self.X.T @ self.X)
-        except np.linalg.LinAlgError:
-            # Singular matrix - use pseudo-inverse
-            var_beta = MSE * np.linalg.pinv(self.X.T @ self.X)
-
-        se_beta = np.sqrt(
-            np.abs(np.diag(var_beta))
-        )  # abs() to avoid negative from numerical errors
-
-        t_stats = beta / se_beta
-        p_values = 2 * (1 - stats.t.cdf(np.abs(t_stats), df=n - p))
-
+            # Run means as (runs x replications) averaging matrix
+            _, index, counts = np.unique(
+                groups, return_inverse=True, return_counts=True
+            )
+            averaging = (index == np.arange(len(counts))[:, None]) / counts[:, None]
+            resampled = averaging @ resampled
+
+            # Leaving out replication i moves its run mean by (mean - y_i) / (n_g - 1)
+            means = averaging @ values
+            with np.errstate(divide="ignore", invalid="ignore"):
+                shift = (means[index] - values) / (counts[index] - 1)[:, None]
+            shifts = np.zeros((len(counts), n, m))
+            shifts[index, np.arange(n)] = shift
+            change = self.least_squares.coefficients(shifts.reshape(len(counts), -1))
+            jackknife = beta + change.reshape(p, n, m).transpose(1, 0, 2)
+
+        replicates = self.least_squares.coefficients(resampled).reshape(
+            p, num_resamples, m
+        )
+        lower, upper = np.full((p, m), np.nan), np.full((p, m), np.nan)
+        for j in range(m):
+            lower[:, j], upper[:, j] = confidence_interval(
+                beta[:, j],
+                replicates[:, :, j].T,
+                jackknife[:, :, j] if method == "bca" else None,
+                confidence,
+                method,
+            )
         return {
-            "beta": beta,
-            "se_beta": se_beta,
-            "t_stats": t_stats,
-            "p_values": p_values,
-            "y_pred": y_pred,
-            "residuals": residuals,
-            "r_squared": r_squared,
-            "adj_r_squared": adj_r_squared,
-            "MSE": MSE,
-            "SSR": SSR,
-            "SSE": SSE,
-            "SST": SST,
+            "boot_lower": lower,
+            "boot_upper": upper,
+            "boot_std_error": replicates.std(axis=1, ddof=1),
         }
 
     def print_results(self, stats_dict):
         """Print regression results"""
+        import pandas as pd
+
         print("\n" + "=" * 100)
         print("REGRESSION ANALYSIS RESULTS")
         print("=" * 100)
 
-        print(f"\nModel: Queue = β₀ + β₁·A + β₂·B + β₃·C + β₄·D + β₅·E + β₆·F + ε")
+        subscripts = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
+        terms = [
+            f"β{i}·{name}".translate(subscripts) for i, name in enumerate(self.terms, 1)
+        ]
+        print(f"\nModel: {self.responses[0]} = β₀ + {' + '.join(terms)} + ε")
+        rows = "replications" if self.replicates else "run means"
+        method = "weighted" if self.weights is not None else "ordinary"
+        print(f"Fitted to {len(self.y)} {rows} by {method} least squares")
 
         print("\n" + "-" * 100)
         print("COEFFICIENTS")
         print("-" * 100)
 
-        factor_names = [
-            "Intercept",
-            "A (Interarrival)",
-            "B (Preparation)",
-            "C (Recovery)",
-            "D (Prep Rooms)",
-            "E (Recovery Rooms)",
-            "F (Priority)",
+        factor_names = ["Intercept"] + [
+            f"{name} ({FACTOR_LABELS[name]})" if name in FACTOR_LABELS else name
+            for name in self.terms
         ]
 
         coef_data = []
         for i, name in enumerate(factor_names):
+            if np.isnan(stats_dict["beta"][i]):
+                coef_data.append({"Factor": name, "Coefficient": "aliased"})
+                continue
+
             sig = ""
             if stats_dict["p_values"][i] < 0.001:
                 sig = "***"
@@ -141,12 +251,21 @@ class RegressionAnalysis:
                     "Sig.": sig,
                 }
             )
+            if "boot_lower" in stats_dict:
+                coef_data[-1]["Bootstrap CI"] = (
+                    f"[{stats_dict['boot_lower'][i]:.4f}, "
+                    f"{stats_dict['boot_upper'][i]:.4f}]"
+                )
 
-        df_coef = pd.DataFrame(coef_data)
+        df_coef = pd.DataFrame(coef_data).fillna("")
         print(df_coef.to_string(index=False))
 
         print("\n" + "-" * 100)
         print("Significance: *** p<0.001, ** p<0.01, * p<0.05, . p<0.1")
+        if "boot_lower" in stats_dict:
+            print(
+                f"Bootstrap CI: 95% {stats_dict['boot_method'].replace('bca', 'BCa')} interval"
+            )
         print("-" * 100)
 
         print("\n" + "-" * 100)
@@ -157,8 +276,11 @@ class RegressionAnalysis:
         print(f"  RMSE:          {np.sqrt(stats_dict['MSE']):.4f}")
         print("-" * 100)
 
-    def plot_diagnostics(self):
+    def plot_diagnostics(self, output_file="figures/regression_diagnostics.png"):
         """Create diagnostic plots"""
+        import matplotlib.pyplot as plt
+        from scipy import stats
+
         beta = self.fit_model()
         stats_dict = self.calculate_statistics(beta)
 
@@ -195,11 +317,11 @@ class RegressionAnalysis:
 
         # Coefficient plot
         ax = axes[1, 1]
-        factor_names = ["Int", "A", "B", "C", "D", "E", "F"]
+        factor_names = ["Int", *self.terms]
         colors = ["red" if p < 0.05 else "gray" for p in stats_dict["p_values"]]
 
         y_pos = np.arange(len(beta))
-        ax.barh(y_pos, beta, color=colors, alpha=0.7)
+        ax.barh(y_pos, np.nan_to_num(beta), color=colors, alpha=0.7)
         ax.set_yticks(y_pos)
         ax.set_yticklabels(factor_names)
         ax.set_xlabel("Coefficient Value", fontsize=12)
@@ -210,25 +332,88 @@ class RegressionAnalysis:
         ax.grid(True, alpha=0.3, axis="x")
 
         plt.tight_layout()
-        plt.savefig("figures/regression_diagnostics.png", dpi=300, bbox_inches="tight")
-        print("\n✅ Plot saved: figures/regression_diagnostics.png")
+        plt.savefig(output_file, dpi=300, bbox_inches="tight")
+        print(f"\n✅ Plot saved: {output_file}")
         plt.close()
 
         return stats_dict
 
 
+def coefficient_table(stats_dict):
+    """JSON-ready coefficients and fit measures (null for aliased terms)"""
+
+    def values(array):
+        return [None if np.isnan(value) else float(value) for value in array]
+
+    table = {
+        "beta": values(stats_dict["beta"]),
+        "se_beta": values(stats_dict["se_beta"]),
+        "t_stats": values(stats_dict["t_stats"]),
+        "p_values": values(stats_dict["p_values"]),
+        "r_squared": float(stats_dict["r_squared"]),
+        "adj_r_squared": float(stats_dict["adj_r_squared"]),
+        "MSE": float(stats_dict["MSE"]),
+    }
+    if "boot_lower" in stats_dict:
+        table["bootstrap"] = {
+            "method": stats_dict["boot_method"],
+            "ci_lower": values(stats_dict["boot_lower"]),
+            "ci_upper": values(stats_dict["boot_upper"]),
+            "std_error": values(stats_dict["boot_std_error"]),
+        }
+    return table
+
+
+def run_regression(
+    results_file="results/experiment_results.npz",
+    output_file="results/regression_results.json",
+    responses=("avg_queue_length",),
+    terms=None,
+    replicates=False,
+    weighted=False,
+    bootstrap=None,
+):
+    """
+    Fit and print the metamodel, saving the coefficient table (and, with
+    several responses, one table per response under "responses");
+    bootstrap="bca" or "percentile" adds bootstrap coefficient intervals
+    """
+    analysis = RegressionAnalysis(
+        results_file, responses, terms, replicates=replicates, weighted=weighted
+    )
+    beta = analysis.fit_model()
+    stats_dict = analysis.calculate_statistics(beta, bootstrap)
+
+    analysis.print_results(stats_dict)
+
+    output = {"terms": ["Intercept", *analysis.terms], **coefficient_table(stats_dict)}
+    if len(analysis.responses) > 1:
+        output["responses"] = {
+            response: coefficient_table(response_stats)
+            for response, response_stats in analysis.fit_responses(bootstrap).items()
+        }
+    with open(output_file, "w") as f:
+        json.dump(output, f, indent=2)
+
+    return stats_dict
+
+
+def plot_figures(
+    results_file="results/experiment_results.npz",
+    output_file="figures/regression_diagnostics.png",
+):
+    """Regression diagnostic plots"""
+    return RegressionAnalysis(results_file).plot_diagnostics(output_file)
+
+
 def main():
     """Run regression analysis"""
     print("\n" + "=" * 100)
     print("ASSIGNMENT 4 - REGRESSION ANALYSIS")
     print("=" * 100)
 
-    analysis = RegressionAnalysis()
-    beta = analysis.fit_model()
-    stats_dict = analysis.calculate_statistics(beta)
-
-    analysis.print_results(stats_dict)
-    stats_dict = analysis.plot_diagnostics()
+    run_regression()
+    plot_figures()
 
     print("\n" + "=" * 100)
     print("REGRESSION COMPLETE!")
@@ -3,13 +3,17 @@ Assignment 4: Surgery Simulation with Design of Experiments
 Main simulation model supporting all experimental factors
 """
 
-import simpy
-import random
-import statistics
+import hashlib
+import json
 import numpy as np
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, fields
+from heapq import heappush, heappop
 from typing import List, Dict
 from enum import Enum
+from variate_streams import VariateStream, spawn_generators
+from accumulators import RunningStats, TimeWeightedStat
+from patient_store import PatientStore
 
 
 class DistributionType(Enum):
@@ -54,8 +58,52 @@ class SimulationConfig:
     warmup_period: float = 1000.0
     random_seed: int = 42
 
-
-@dataclass
+    # Simulation backend: "simpy" (process-based) or "fast" (heap-based)
+    engine: str = "simpy"
+
+    # Patient records: "objects" keeps every Patient, "array" keeps them as
+    # rows of a NumPy PatientStore, "streaming" only keeps running statistics
+    # so memory stays flat for any sim_duration
+    record_mode: str = "objects"
+
+    # Replace warmup_period by the MSER-5 truncation point detected from
+    # pilot runs (cached per configuration), keeping the measured length
+    auto_warmup: bool = False
+
+    # Count events and time each stage of the run (see instrumentation.py);
+    # adds "instr_*" keys to get_statistics()
+    instrument: bool = False
+
+    def to_dict(self) -> Dict:
+        """Field values with enums as strings and float fields as floats"""
+        data = {}
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if isinstance(value, Enum):
+                value = value.value
+            elif field.type is float:
+                value = float(value)
+            data[field.name] = value
+        return data
+
+    def expected_arrivals(self) -> int:
+        """Arrivals by sim_duration plus a 6-sigma margin, to size buffers"""
+        mean_interarrival = self.interarrival_param1
+        if self.interarrival_dist == DistributionType.UNIFORM:
+            mean_interarrival = (
+                self.interarrival_param1 + self.interarrival_param2
+            ) / 2
+        expected = self.sim_duration / mean_interarrival
+        return int(expected + 6 * expected**0.5) + 16
+
+    def digest(self, exclude=()) -> str:
+        """SHA-256 of the canonical JSON of to_dict(), minus `exclude` fields"""
+        data = {k: v for k, v in self.to_dict().items() if k not in exclude}
+        canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+@dataclass(slots=True)
 class Patient:
     """Patient with timestamps and priority"""
 
@@ -70,6 +118,12 @@ class Patient:
     recovery_start: float = 0.0
     recovery_end: float = 0.0
 
+    # Service times, drawn at arrival so patient i gets the same durations
+    # in every configuration (common random numbers)
+    prep_time: float = 0.0
+    surgery_time: float = 0.0
+    recovery_time: float = 0.0
+
     def throughput_time(self) -> float:
         return self.recovery_end - self.arrival_time
 
@@ -78,7 +132,53 @@ class SurgerySimulation:
     """Surgery simulation supporting all experimental factors"""
 
     def __init__(self, config: SimulationConfig):
+        if config.auto_warmup:
+            # Imported here: warmup detection runs pilot SurgerySimulations
+            from warmup_detection import apply_detected_warmup
+
+            config = apply_detected_warmup(config)
         self.config = config
+
+        # Statistics
+        self.patients: List[Patient] = []
+        self.patient_counter = 0
+        self.queue_length_on_arrivals: List[int] = []
+
+        if config.record_mode not in ("objects", "array", "streaming"):
+            raise ValueError(f"Unknown record mode: {config.record_mode}")
+        self.streaming = config.record_mode == "streaming"
+        self.queue_stats = RunningStats()
+        self.throughput_stats = RunningStats()
+
+        self.instrumentation = None
+        if config.instrument:
+            from instrumentation import Instrumentation
+
+            self.instrumentation = Instrumentation(self)
+            self.instrumentation.attach()
+
+        # Time-weighted levels, integrated from the end of warmup on and
+        # updated on every state change by either engine
+        warmup = config.warmup_period
+        self.prep_queue_level = TimeWeightedStat(warmup)
+        self.prep_busy_level = TimeWeightedStat(warmup)
+        self.or_busy_level = TimeWeightedStat(warmup)
+        self.or_blocked_level = TimeWeightedStat(warmup)
+        self.recovery_busy_level = TimeWeightedStat(warmup)
+        self.blocked_ors = 0  # ORs holding a patient who waits for recovery
+
+        self.store = None
+        if config.record_mode == "array":
+            self.store = PatientStore(config.expected_arrivals())
+
+        if config.engine == "fast":
+            self.env = None
+            return
+        elif config.engine != "simpy":
+            raise ValueError(f"Unknown engine: {config.engine}")
+
+        import simpy  # only this engine needs it (importing it takes ~70 ms)
+
         self.env = simpy.Environment()
 
         # Resources
@@ -99,50 +199,78 @@ class SurgerySimulation:
             self.env, capacity=config.num_recovery_rooms
         )
 
-        # Statistics
-        self.patients: List[Patient] = []
-        self.patient_counter = 0
-        self.queue_length_on_arrivals: List[int] = []
+    def create_streams(self):
+        """Create one buffered variate stream per stochastic input"""
+        config = self.config
+        rngs = spawn_generators(config.random_seed)
+        # Each stream is drawn about once per patient: a first block sized to
+        # the run avoids sampling a full BLOCK_SIZE block for short horizons
+        first_block = config.expected_arrivals()
+
+        self.interarrival_stream = VariateStream(
+            rngs["arrival"],
+            config.interarrival_dist.value,
+            config.interarrival_param1,
+            config.interarrival_param2,
+            first_block=first_block,
+        )
+        self.priority_stream = VariateStream(
+            rngs["priority"], "uniform", 0.0, 1.0, first_block=first_block
+        )
+        self.prep_stream = VariateStream(
+            rngs["prep"],
+            config.prep_dist.value,
+            config.prep_param1,
+            config.prep_param2,
+            first_block=first_block,
+        )
+        self.surgery_stream = VariateStream(
+            rngs["surgery"], "exponential", config.surgery_mean, first_block=first_block
+        )
+        self.recovery_stream = VariateStream(
+            rngs["recovery"],
+            config.recovery_dist.value,
+            config.recovery_param1,
+            config.recovery_param2,
+            first_block=first_block,
+        )
 
-    def sample_time(
-        self, dist_type: DistributionType, param1: float, param2: float
-    ) -> float:
-        """Sample from specified distribution"""
-        if dist_type == DistributionType.EXPONENTIAL:
-            return random.expovariate(1.0 / param1)
-        elif dist_type == DistributionType.UNIFORM:
-            return random.uniform(param1, param2)
-        else:
-            raise ValueError(f"Unknown distribution: {dist_type}")
+    def sample_service_times(self, patient: Patient):
+        """Draw the patient's three service times on arrival"""
+        patient.prep_time = self.prep_stream()
+        patient.surgery_time = self.surgery_stream()
+        patient.recovery_time = self.recovery_stream()
 
     def patient_generator(self):
         """Generate patients according to configured distribution"""
         while True:
-            interarrival = self.sample_time(
-                self.config.interarrival_dist,
-                self.config.interarrival_param1,
-                self.config.interarrival_param2,
-            )
-            yield self.env.timeout(interarrival)
+            yield self.env.timeout(self.interarrival_stream())
 
             self.patient_counter += 1
-            is_emergency = random.random() < self.config.emergency_probability
+            is_emergency = self.priority_stream() < self.config.emergency_probability
 
             patient = Patient(
                 id=self.patient_counter,
                 arrival_time=self.env.now,
                 is_emergency=is_emergency,
             )
+            self.sample_service_times(patient)
 
             # Record queue length at arrival
             patient.prep_queue_length_on_arrival = len(self.prep_rooms.queue)
 
-            if self.env.now >= self.config.warmup_period:
-                self.queue_length_on_arrivals.append(
-                    patient.prep_queue_length_on_arrival
-                )
+            if self.streaming:
+                if self.env.now >= self.config.warmup_period:
+                    self.queue_stats.add(patient.prep_queue_length_on_arrival)
+            elif self.store is not None:
+                self.store.append(patient)
+            else:
+                if self.env.now >= self.config.warmup_period:
+                    self.queue_length_on_arrivals.append(
+                        patient.prep_queue_length_on_arrival
+                    )
+                self.patients.append(patient)
 
-            self.patients.append(patient)
             self.env.process(self.patient_process(patient))
 
     def patient_process(self, patient: Patient):
@@ -154,14 +282,13 @@ class SurgerySimulation:
             prep_request = self.prep_rooms.request(priority=priority)
         else:
             prep_request = self.prep_rooms.request()
+        self.record_state()
 
         yield prep_request
+        self.record_state()
 
         patient.prep_start = self.env.now
-        prep_duration = self.sample_time(
-            self.config.prep_dist, self.config.prep_param1, self.config.prep_param2
-        )
-        yield self.env.timeout(prep_duration)
+        yield self.env.timeout(patient.prep_time)
         patient.prep_end = self.env.now
 
         # STAGE 2: OPERATING ROOM
@@ -172,37 +299,66 @@ class SurgerySimulation:
 
         yield or_request
         self.prep_rooms.release(prep_request)
+        self.record_state()
 
         patient.surgery_start = self.env.now
-        surgery_duration = random.expovariate(1.0 / self.config.surgery_mean)
-        yield self.env.timeout(surgery_duration)
+        yield self.env.timeout(patient.surgery_time)
         patient.surgery_end = self.env.now
 
         # STAGE 3: RECOVERY
         recovery_request = self.recovery_rooms.request()
+        blocked = not recovery_request.triggered
+        if blocked:
+            self.blocked_ors += 1
+            self.record_state()
+
         yield recovery_request
 
+        if blocked:
+            self.blocked_ors -= 1
         self.operating_rooms.release(or_request)
+        self.record_state()
 
         patient.recovery_start = self.env.now
-        recovery_duration = self.sample_time(
-            self.config.recovery_dist,
-            self.config.recovery_param1,
-            self.config.recovery_param2,
-        )
-        yield self.env.timeout(recovery_duration)
+        yield self.env.timeout(patient.recovery_time)
         patient.recovery_end = self.env.now
 
         self.recovery_rooms.release(recovery_request)
+        self.record_state()
+
+        if self.streaming and patient.recovery_end > self.config.warmup_period:
+            self.throughput_stats.add(patient.throughput_time())
+        elif self.store is not None:
+            self.store.record(patient)
+
+    def record_state(self):
+        """Update the time-weighted levels after a state change"""
+        now = self.env.now
+        self.prep_queue_level.update(now, len(self.prep_rooms.queue))
+        self.prep_busy_level.update(now, self.prep_rooms.count)
+        self.or_busy_level.update(now, self.operating_rooms.count)
+        self.or_blocked_level.update(now, self.blocked_ors)
+        self.recovery_busy_level.update(now, self.recovery_rooms.count)
 
     def run(self):
         """Execute simulation"""
-        random.seed(self.config.random_seed)
+        self.create_streams()
+
+        if self.env is None:
+            self.fast_engine = FastTandemEngine(self)
+            self.fast_engine.run()
+            return
+
         self.env.process(self.patient_generator())
         self.env.run(until=self.config.sim_duration)
 
     def get_statistics(self) -> Dict:
         """Calculate statistics"""
+        if self.streaming:
+            return self.get_streaming_statistics()
+        if self.store is not None:
+            return self.get_array_statistics()
+
         valid_patients = [
             p
             for p in self.patients
@@ -216,27 +372,374 @@ class SurgerySimulation:
                 "avg_throughput_time": 0.0,
             }
 
-        avg_queue = (
-            statistics.mean(self.queue_length_on_arrivals)
-            if self.queue_length_on_arrivals
-            else 0.0
-        )
-        throughput_times = [p.throughput_time() for p in valid_patients]
-        avg_throughput = statistics.mean(throughput_times)
+        # numpy rather than the statistics module, whose exact arithmetic
+        # costs more than a fast engine run
+        queue_lengths = np.asarray(self.queue_length_on_arrivals)
+        throughput_times = np.array([p.throughput_time() for p in valid_patients])
 
         return {
             "num_patients": len(valid_patients),
-            "avg_queue_length": avg_queue,
-            "max_queue_length": (
-                max(self.queue_length_on_arrivals)
-                if self.queue_length_on_arrivals
-                else 0
+            "avg_queue_length": (
+                float(queue_lengths.mean()) if queue_lengths.size else 0.0
+            ),
+            "max_queue_length": int(queue_lengths.max()) if queue_lengths.size else 0,
+            "avg_throughput_time": float(throughput_times.mean()),
+            "std_throughput_time": (
+                float(throughput_times.std(ddof=1))
+                if len(throughput_times) > 1
+                else 0.0
+            ),
+            **self.get_level_statistics(),
+        }
+
+    def get_streaming_statistics(self) -> Dict:
+        """Same statistics as get_statistics(), from the running accumulators"""
+        throughput = self.throughput_stats
+        queue = self.queue_stats
+
+        if throughput.count == 0:
+            return {
+                "num_patients": 0,
+                "avg_queue_length": 0.0,
+                "avg_throughput_time": 0.0,
+            }
+
+        return {
+            "num_patients": throughput.count,
+            "avg_queue_length": queue.mean,
+            "max_queue_length": queue.max if queue.count else 0,
+            "avg_throughput_time": throughput.mean,
+            "std_throughput_time": throughput.stdev,
+            **self.get_level_statistics(),
+        }
+
+    def get_level_statistics(self) -> Dict:
+        """
+        Time averages of the prep queue, utilization per resource and OR
+        blocking. Unlike avg_queue_length, which averages the queue seen by
+        arriving patients (PASTA), these integrate over [warmup, end].
+        """
+        config = self.config
+        levels = (
+            self.prep_queue_level,
+            self.prep_busy_level,
+            self.or_busy_level,
+            self.or_blocked_level,
+            self.recovery_busy_level,
+        )
+        for level in levels:
+            level.finish(config.sim_duration)
+
+        return {
+            "time_avg_queue_length": self.prep_queue_level.mean,
+            "prep_utilization": self.prep_busy_level.mean / config.num_prep_rooms,
+            "or_utilization": self.or_busy_level.mean / config.num_operating_rooms,
+            "or_blocking_probability": (
+                self.or_blocked_level.mean / config.num_operating_rooms
+            ),
+            "recovery_utilization": (
+                self.recovery_busy_level.mean / config.num_recovery_rooms
             ),
-            "avg_throughput_time": avg_throughput,
+        }
+
+    def get_array_statistics(self) -> Dict:
+        """Same statistics as get_statistics(), computed on PatientStore columns"""
+        store = self.store
+        warmup = self.config.warmup_period
+
+        recovery_end = store["recovery_end"]
+        valid = recovery_end > warmup  # False for unfinished (NaN) rows
+        num_patients = int(np.count_nonzero(valid))
+
+        if num_patients == 0:
+            return {
+                "num_patients": 0,
+                "avg_queue_length": 0.0,
+                "avg_throughput_time": 0.0,
+            }
+
+        queue_lengths = store["prep_queue_length_on_arrival"][
+            store["arrival_time"] >= warmup
+        ]
+        throughput_times = recovery_end[valid] - store["arrival_time"][valid]
+
+        return {
+            "num_patients": num_patients,
+            "avg_queue_length": (
+                float(queue_lengths.mean()) if queue_lengths.size else 0.0
+            ),
+            "max_queue_length": int(queue_lengths.max()) if queue_lengths.size else 0,
+            "avg_throughput_time": float(throughput_times.mean()),
             "std_throughput_time": (
-                statistics.stdev(throughput_times) if len(throughput_times) > 1 else 0.0
+                float(throughput_times.std(ddof=1)) if num_patients > 1 else 0.0
             ),
+            **self.get_level_statistics(),
+        }
+
+
+# Event types on the fast engine's future event list
+ARRIVAL, PREP_END, SURGERY_END, RECOVERY_END = range(4)
+
+
+class FastTandemEngine:
+    """
+    Heap-based event engine for the prep -> OR -> recovery line with blocking.
+
+    Replaces SimPy processes and resource requests with one binary-heap
+    future event list, integer server counters and deques for the waiting
+    lines. It fills the owning SurgerySimulation's ``patients`` and
+    ``queue_length_on_arrivals`` (or its store or running statistics) and
+    its time-weighted levels, so ``get_statistics()`` is shared.
+    """
+
+    def __init__(self, sim: SurgerySimulation):
+        self.sim = sim
+        self.config = sim.config
+        self.now = 0.0
+
+        # Future event list: (time, patient id, event type, patient); a
+        # patient has one pending event at a time, so the id breaks ties
+        self.events = []
+
+        # Profile of the last run (read by instrumentation.py): events
+        # processed, arrivals, variates drawn, peak future-event-list size
+        # (the pending arrival included) and peak waiting lines, tracked
+        # only where they can grow
+        self.num_events = 0
+        self.num_arrivals = 0
+        self.num_draws = 0
+        self.peak_events = 0
+        self.peak_queues = {"prep_rooms": 0, "operating_rooms": 0, "recovery_rooms": 0}
+
+        # Servers held per stage (a blocked patient keeps holding its server);
+        # kept in locals while running and stored back afterwards
+        self.prep_busy = 0
+        self.or_busy = 0
+        self.recovery_busy = 0
+
+        # Waiting lines, indexed by priority (0 = emergency, 1 = elective)
+        self.prep_queue = (deque(), deque())
+        self.or_queue = (deque(), deque())
+        self.recovery_queue = deque()
+
+    def run(self):
+        """Process events until sim_duration"""
+        sim = self.sim
+        config = self.config
+        events = self.events
+        prep_queue = self.prep_queue
+        or_queue = self.or_queue
+        recovery_queue = self.recovery_queue
+        streaming = sim.streaming
+        store = sim.store
+        patients = sim.patients
+        queue_length_on_arrivals = sim.queue_length_on_arrivals
+        add_queue_length = sim.queue_stats.add
+        add_throughput = sim.throughput_stats.add
+
+        sample_interarrival = sim.interarrival_stream.next_value
+        sample_priority = sim.priority_stream.next_value
+        sample_prep = sim.prep_stream.next_value
+        sample_surgery = sim.surgery_stream.next_value
+        sample_recovery = sim.recovery_stream.next_value
+        emergency_probability = config.emergency_probability
+        warmup = config.warmup_period
+        until = config.sim_duration
+
+        num_prep = config.num_prep_rooms
+        num_or = config.num_operating_rooms
+        num_recovery = config.num_recovery_rooms
+        prep_busy = or_busy = recovery_busy = 0
+
+        # Time-weighted levels: a change of a level by +-1 at time t adds
+        # +-(until - max(t, warmup)) to its area over [warmup, until], so an
+        # area is only touched when its level changes. Waiting-line lengths
+        # are kept as counters; the queue maximum is over levels after warmup.
+        span = until - warmup
+        queue_area = prep_area = or_area = blocked_area = recovery_area = 0.0
+        queued = blocked = queue_max = 0
+        patient_counter = first_patient = sim.patient_counter
+        num_events = peak_events = peak_queued = peak_or_queue = peak_blocked = 0
+
+        # The next arrival is kept off the heap and compared with its top
+        next_arrival = sample_interarrival()
+
+        while True:
+            if events and events[0][0] < next_arrival:
+                now, _, event_type, patient = heappop(events)
+            else:
+                now, event_type = next_arrival, ARRIVAL
+            if now >= until:
+                break
+            num_events += 1
+
+            if now > warmup:
+                remaining = until - now
+                if queued > queue_max:
+                    queue_max = queued
+            else:
+                remaining = span
+
+            if event_type == ARRIVAL:
+                patient_counter += 1
+                is_emergency = sample_priority() < emergency_probability
+                # Queue length at arrival; service times are drawn now (CRN).
+                # Positional arguments: keywords cost ~0.4 us per patient.
+                patient = Patient(
+                    patient_counter,
+                    is_emergency,
+                    now,
+                    queued,
+                    0.0,
+                    0.0,
+                    0.0,
+                    0.0,
+                    0.0,
+                    0.0,
+                    sample_prep(),
+                    sample_surgery(),
+                    sample_recovery(),
+                )
+                if streaming:
+                    if now >= warmup:
+                        add_queue_length(queued)
+                elif store is not None:
+                    store.append(patient)
+                else:
+                    if now >= warmup:
+                        queue_length_on_arrivals.append(queued)
+                    patients.append(patient)
+                next_arrival = now + sample_interarrival()
+
+                # An arrival can only start a preparation
+                if prep_busy < num_prep:
+                    prep_busy += 1
+                    prep_area += remaining
+                    patient.prep_start = now
+                    heappush(
+                        events,
+                        (now + patient.prep_time, patient_counter, PREP_END, patient),
+                    )
+                    if len(events) > peak_events:
+                        peak_events = len(events)
+                else:
+                    prep_queue[not is_emergency].append(patient)
+                    queued += 1
+                    queue_area += remaining
+                    if queued > peak_queued:
+                        peak_queued = queued
+                continue
+
+            elif event_type == PREP_END:
+                # Patient keeps the prep room until an OR is free
+                patient.prep_end = now
+                if or_busy == num_or:
+                    or_queue[not patient.is_emergency].append(patient)
+                    if len(or_queue[0]) + len(or_queue[1]) > peak_or_queue:
+                        peak_or_queue = len(or_queue[0]) + len(or_queue[1])
+                    continue
+                or_busy += 1
+                or_area += remaining
+                start_surgery = patient
+
+            else:
+                if event_type == SURGERY_END:
+                    patient.surgery_end = now
+                    if recovery_busy == num_recovery:
+                        # Patient blocks the OR until a recovery room is free
+                        recovery_queue.append(patient)
+                        blocked += 1
+                        blocked_area += remaining
+                        if blocked > peak_blocked:
+                            peak_blocked = blocked
+                        continue
+                    recovery_busy += 1
+                    recovery_area += remaining
+                else:
+                    patient.recovery_end = now
+                    if streaming:
+                        if now > warmup:
+                            add_throughput(now - patient.arrival_time)
+                    elif store is not None:
+                        store.record(patient)
+                    if not blocked:
+                        recovery_busy -= 1
+                        recovery_area -= remaining
+                        continue
+                    # The room goes to the first blocked patient, whose OR
+                    # is released only now that the room is secured
+                    patient = recovery_queue.popleft()
+                    blocked -= 1
+                    blocked_area -= remaining
+
+                patient.recovery_start = now
+                heappush(
+                    events,
+                    (now + patient.recovery_time, patient.id, RECOVERY_END, patient),
+                )
+                waiting = or_queue[0] or or_queue[1]
+                if not waiting:
+                    or_busy -= 1
+                    or_area -= remaining
+                    continue
+                # The OR passes straight to the first patient waiting for it
+                start_surgery = waiting.popleft()
+
+            # start_surgery holds an OR now; its prep room is released
+            start_surgery.surgery_start = now
+            heappush(
+                events,
+                (
+                    now + start_surgery.surgery_time,
+                    start_surgery.id,
+                    SURGERY_END,
+                    start_surgery,
+                ),
+            )
+            if queued:
+                patient = (prep_queue[0] or prep_queue[1]).popleft()
+                queued -= 1
+                queue_area -= remaining
+                patient.prep_start = now
+                heappush(
+                    events, (now + patient.prep_time, patient.id, PREP_END, patient)
+                )
+            else:
+                prep_busy -= 1
+                prep_area -= remaining
+            if len(events) > peak_events:
+                peak_events = len(events)
+
+        if until > warmup and queued > queue_max:
+            queue_max = queued
+        for level, area, value in (
+            (sim.prep_queue_level, queue_area, queued),
+            (sim.prep_busy_level, prep_area, prep_busy),
+            (sim.or_busy_level, or_area, or_busy),
+            (sim.or_blocked_level, blocked_area, blocked),
+            (sim.recovery_busy_level, recovery_area, recovery_busy),
+        ):
+            level.area = area
+            level.last_time = max(until, warmup)
+            level.level = value
+        sim.prep_queue_level.max = queue_max
+
+        sim.patient_counter = patient_counter
+        self.num_events = num_events
+        self.num_arrivals = patient_counter - first_patient
+        # Interarrival, priority and three service times per arrival, plus
+        # the first interarrival time
+        self.num_draws = 5 * self.num_arrivals + 1
+        self.peak_events = peak_events + 1
+        self.peak_queues = {
+            "prep_rooms": peak_queued,
+            "operating_rooms": peak_or_queue,
+            "recovery_rooms": peak_blocked,
         }
+        self.now = until
+        self.prep_busy = prep_busy
+        self.or_busy = or_busy
+        self.recovery_busy = recovery_busy
 
 
 def quick_test():
@@ -0,0 +1,60 @@
+"""
+Assignment 4: Batch Engine Tests
+simulate_batch gives the event engine's statistics for every seed
+"""
+
+from dataclasses import replace
+
+import pytest
+
+from batch_simulation import simulate_batch
+from surgery_simulation_a4 import DistributionType, SimulationConfig, SurgerySimulation
+
+SEEDS = [42, 43, 44, 45]
+
+CONFIGS = {
+    "default": SimulationConfig(sim_duration=2000.0, warmup_period=500.0),
+    "priority_blocking": SimulationConfig(
+        sim_duration=2000.0,
+        warmup_period=500.0,
+        num_prep_rooms=3,
+        num_recovery_rooms=3,
+        interarrival_param1=20.0,
+        emergency_probability=0.2,
+    ),
+    "uniform": SimulationConfig(
+        sim_duration=2000.0,
+        warmup_period=500.0,
+        interarrival_dist=DistributionType.UNIFORM,
+        interarrival_param1=20.0,
+        interarrival_param2=30.0,
+        recovery_dist=DistributionType.UNIFORM,
+        recovery_param1=30.0,
+        recovery_param2=50.0,
+        num_recovery_rooms=2,
+    ),
+}
+
+
+@pytest.mark.parametrize("name", CONFIGS)
+def test_batch_matches_fast_engine(name):
+    config = CONFIGS[name]
+    batch = simulate_batch(config, SEEDS)
+
+    for i, seed in enumerate(SEEDS):
+        sim = SurgerySimulation(replace(config, engine="fast", random_seed=seed))
+        sim.run()
+        expected = sim.get_statistics()
+
+        assert batch.keys() == expected.keys()
+        for key, value in expected.items():
+            assert batch[key][i] == pytest.approx(value, rel=1e-9), (seed, key)
+
+
+def test_replications_do_not_depend_on_the_batch():
+    config = CONFIGS["priority_blocking"]
+    batch = simulate_batch(config, SEEDS)
+    single = simulate_batch(config, SEEDS[2:3])
+
+    for key, values in single.items():
+        assert values[0] == pytest.approx(batch[key][2], rel=1e-12), key
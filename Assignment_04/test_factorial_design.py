@@ -0,0 +1,87 @@
+"""
+Assignment 4: Factorial Design Tests
+Defining relations, alias chains and what a foldover de-aliases
+"""
+
+import numpy as np
+import pytest
+
+from factorial_design import (
+    FractionalFactorial,
+    alias_matrix,
+    foldover,
+    mixed_level_design,
+    plackett_burman,
+)
+from step2_design_of_experiments import DEFAULT_GENERATORS, ExperimentDesign
+
+
+def test_default_design_alias_structure():
+    design = FractionalFactorial(DEFAULT_GENERATORS, num_factors=6)
+
+    assert design.num_runs == 8
+    assert design.resolution == 2
+    assert design.defining_relation()[0] == "EF"
+    assert design.aliases("E", max_order=2) == ["F", "AB", "CD"]
+
+
+def test_generated_columns_follow_their_generators():
+    matrix = FractionalFactorial(DEFAULT_GENERATORS, num_factors=6).matrix()
+    a, b, c, d, e, f = matrix.T
+
+    assert np.array_equal(d, a * b * c)
+    assert np.array_equal(e, a * b)
+    assert np.array_equal(f, c * d)
+
+
+def test_regular_fraction_is_fully_aliased():
+    design = FractionalFactorial.with_resolution(7, 3)
+    aliases = alias_matrix(design.matrix(), design.factors)
+
+    assert design.resolution == 3
+    assert aliases["A"] == pytest.approx({"BD": 1.0, "CE": 1.0, "FG": 1.0})
+
+
+def test_full_foldover_frees_main_effects():
+    matrix = FractionalFactorial.with_resolution(7, 3).matrix()
+    combined = np.vstack([matrix, foldover(matrix)])
+
+    aliases = alias_matrix(combined, "ABCDEFG")
+    assert all(not chain for chain in aliases.values())
+
+
+def test_foldover_on_f_separates_e_and_f():
+    design = ExperimentDesign()
+    combined = design.create_foldover_design(design.create_2_6_3_design(), ("F",))
+    aliases = alias_matrix(combined, design.factors)
+
+    assert len(combined) == 16
+    assert np.linalg.matrix_rank(np.column_stack([np.ones(16), combined])) == 7
+    assert aliases["F"] == {}
+    assert aliases["E"] == pytest.approx({"AB": 1.0, "CD": 1.0})
+
+
+def test_semi_foldover_keeps_half_the_runs():
+    matrix = FractionalFactorial(DEFAULT_GENERATORS, num_factors=6).matrix()
+    folded = foldover(matrix, columns=[5], half=(0, 1))
+
+    assert len(folded) == 4
+    assert (folded[:, 0] == 1).all()
+
+
+def test_plackett_burman_columns_are_orthogonal():
+    matrix = plackett_burman(11)
+    assert matrix.shape == (12, 11)
+    assert np.array_equal(matrix.T @ matrix, 12 * np.eye(11))
+
+
+def test_mixed_level_design():
+    matrix = mixed_level_design([2, 3])
+    assert matrix.tolist() == [
+        [-1, -1],
+        [-1, 0],
+        [-1, 1],
+        [1, -1],
+        [1, 0],
+        [1, 1],
+    ]
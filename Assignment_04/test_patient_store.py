@@ -0,0 +1,38 @@
+"""
+Assignment 4: Patient Store Tests
+Rows of patients still in the system keep NaN timestamps
+"""
+
+import numpy as np
+import pytest
+
+from patient_store import TIMESTAMP_COLUMNS, PatientStore
+from surgery_simulation_a4 import Patient, SimulationConfig, SurgerySimulation
+
+
+def test_rows_are_nan_until_the_patient_departs():
+    store = PatientStore(capacity=1)
+    for i in range(1, 4):
+        store.append(Patient(id=i, arrival_time=float(i)))
+    store.record(Patient(id=2, arrival_time=2.0, recovery_end=9.0))
+
+    assert len(store) == 3
+    assert store["arrival_time"].tolist() == [1.0, 2.0, 3.0]
+    assert np.isnan(store["recovery_end"]).tolist() == [True, False, True]
+    for column in TIMESTAMP_COLUMNS:
+        assert np.isnan(store.data[column][len(store) :]).all()
+
+
+@pytest.mark.parametrize("engine", ["simpy", "fast"])
+def test_unfinished_patients_match_the_objects(engine):
+    config = SimulationConfig(sim_duration=2000.0, engine=engine)
+    objects = SurgerySimulation(config)
+    objects.run()
+    array = SurgerySimulation(
+        SimulationConfig(sim_duration=2000.0, engine=engine, record_mode="array")
+    )
+    array.run()
+
+    finished = [p.recovery_end > 0 for p in objects.patients]
+    assert (~np.isnan(array.store["recovery_end"])).tolist() == finished
+    assert not all(finished)
@@ -0,0 +1,87 @@
+"""
+Assignment 4: Result Cache Tests
+Cache keys follow the config, the seed and the model code version
+"""
+
+import sys
+from dataclasses import replace
+
+import pytest
+
+from result_cache import ResultCache, code_version
+from surgery_simulation_a4 import SimulationConfig, SurgerySimulation
+
+MODEL_SOURCE = """
+from cache_test_helper import SCALE
+
+
+class Model:
+    def run(self):
+        import cache_test_lazy
+"""
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    """Model module with an eager and a lazy local import, plus a bystander"""
+    (tmp_path / "cache_test_model.py").write_text(MODEL_SOURCE)
+    (tmp_path / "cache_test_helper.py").write_text("SCALE = 1\n")
+    (tmp_path / "cache_test_lazy.py").write_text("OFFSET = 0\n")
+    (tmp_path / "cache_test_plots.py").write_text("import cache_test_model\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    code_version.cache_clear()
+    yield tmp_path
+    code_version.cache_clear()
+    for name in list(sys.modules):
+        if name.startswith("cache_test_"):
+            del sys.modules[name]
+
+
+def changed_version(model_dir, filename, source):
+    before = code_version("cache_test_model")
+    (model_dir / filename).write_text(source)
+    code_version.cache_clear()
+    return code_version("cache_test_model") != before
+
+
+def test_code_version_follows_local_imports(model_dir):
+    assert changed_version(model_dir, "cache_test_helper.py", "SCALE = 2\n")
+    assert changed_version(model_dir, "cache_test_lazy.py", "OFFSET = 1\n")
+    assert not changed_version(model_dir, "cache_test_plots.py", "# plots\n")
+
+
+def test_key_follows_config_and_seed(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    config = SimulationConfig()
+    key = cache.key(SurgerySimulation, config, 42)
+
+    assert cache.key(SurgerySimulation, replace(config), 42) == key
+    # random_seed is replaced by the job's seed
+    assert cache.key(SurgerySimulation, replace(config, random_seed=7), 42) == key
+    assert cache.key(SurgerySimulation, config, 43) != key
+    assert cache.key(SurgerySimulation, replace(config, num_prep_rooms=3), 42) != key
+
+
+def test_new_model_code_misses_the_cache(model_dir):
+    import cache_test_model
+
+    cache = ResultCache(str(model_dir / "cache.sqlite"))
+    jobs = [(SimulationConfig(), seed) for seed in (42, 43)]
+    runs = []
+
+    def run(missing):
+        runs.append(len(missing))
+        return [{"seed": seed} for _, seed in missing]
+
+    first = cache.run_jobs(cache_test_model.Model, jobs, run)
+    assert cache.run_jobs(cache_test_model.Model, jobs, run) == first
+    assert runs == [2]
+
+    (model_dir / "cache_test_lazy.py").write_text("OFFSET = 1\n")
+    code_version.cache_clear()
+    assert cache.run_jobs(cache_test_model.Model, jobs, run) == first
+    assert runs == [2, 2]
+
+    # Only the entries of the old code are stale
+    assert cache.invalidate(stale_only=True) == 2
+    assert cache.info()["entries"] == 2
@@ -0,0 +1,67 @@
+"""
+Assignment 4: Engine Equivalence Tests
+The heap engine gives the SimPy engine's statistics in every record mode
+"""
+
+from dataclasses import replace
+
+import pytest
+
+from surgery_simulation_a4 import DistributionType, SimulationConfig, SurgerySimulation
+
+CONFIGS = {
+    "default": SimulationConfig(sim_duration=2000.0, warmup_period=500.0),
+    "priority_blocking": SimulationConfig(
+        sim_duration=2000.0,
+        warmup_period=500.0,
+        num_prep_rooms=3,
+        num_recovery_rooms=3,
+        interarrival_param1=20.0,
+        emergency_probability=0.2,
+    ),
+    "uniform": SimulationConfig(
+        sim_duration=2000.0,
+        warmup_period=500.0,
+        interarrival_dist=DistributionType.UNIFORM,
+        interarrival_param1=20.0,
+        interarrival_param2=30.0,
+        recovery_dist=DistributionType.UNIFORM,
+        recovery_param1=30.0,
+        recovery_param2=50.0,
+        num_recovery_rooms=2,
+    ),
+}
+
+
+def statistics(config, **changes):
+    sim = SurgerySimulation(replace(config, **changes))
+    sim.run()
+    return sim.get_statistics()
+
+
+@pytest.mark.parametrize("seed", [42, 43])
+@pytest.mark.parametrize("record_mode", ["objects", "array", "streaming"])
+@pytest.mark.parametrize("name", CONFIGS)
+def test_fast_engine_matches_simpy(name, record_mode, seed):
+    config = replace(CONFIGS[name], record_mode=record_mode, random_seed=seed)
+    expected = statistics(config, engine="simpy")
+    actual = statistics(config, engine="fast")
+
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        assert actual[key] == pytest.approx(value, rel=1e-9), key
+
+
+@pytest.mark.parametrize("engine", ["simpy", "fast"])
+def test_record_modes_agree(engine):
+    config = replace(CONFIGS["priority_blocking"], engine=engine)
+    expected = statistics(config, record_mode="objects")
+    for record_mode in ("array", "streaming"):
+        actual = statistics(config, record_mode=record_mode)
+        for key, value in actual.items():
+            assert value == pytest.approx(expected[key], rel=1e-9), key
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError, match="Unknown engine"):
+        statistics(CONFIGS["default"], engine="turbo")
@@ -0,0 +1,91 @@
+"""
+Assignment 4: Variate Stream Tests
+Block-buffered streams hand out the generator's sequence unchanged, and
+each stochastic input has its own reproducible stream
+"""
+
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from surgery_simulation_a4 import DistributionType, SimulationConfig, SurgerySimulation
+from variate_streams import INPUTS, VariateStream, spawn_generators
+
+
+def draws(stream, count):
+    return [stream() for _ in range(count)]
+
+
+@pytest.mark.parametrize(
+    "block_size, first_block", [(4096, None), (7, None), (7, 3), (5, 100)]
+)
+def test_blocks_do_not_change_the_sequence(block_size, first_block):
+    expected = np.random.default_rng(1).exponential(25.0, 200).tolist()
+    stream = VariateStream(
+        np.random.default_rng(1),
+        "exponential",
+        25.0,
+        block_size=block_size,
+        first_block=first_block,
+    )
+    assert draws(stream, 200) == expected
+
+
+def test_uniform_stream():
+    expected = np.random.default_rng(2).uniform(20.0, 30.0, 50).tolist()
+    stream = VariateStream(np.random.default_rng(2), "uniform", 20.0, 30.0, 8)
+    assert draws(stream, 50) == expected
+
+
+def test_unknown_distribution():
+    with pytest.raises(ValueError, match="Unknown distribution"):
+        VariateStream(np.random.default_rng(0), "gamma", 1.0)
+
+
+def test_generators_are_reproducible_and_independent():
+    first = {name: rng.random(5).tolist() for name, rng in spawn_generators(42).items()}
+    again = {name: rng.random(5).tolist() for name, rng in spawn_generators(42).items()}
+    other = {name: rng.random(5).tolist() for name, rng in spawn_generators(43).items()}
+
+    assert list(first) == list(INPUTS)
+    assert first == again
+    assert all(first[name] != other[name] for name in INPUTS)
+    assert len({tuple(values) for values in first.values()}) == len(INPUTS)
+
+
+def patients(config):
+    sim = SurgerySimulation(replace(config, engine="fast"))
+    sim.run()
+    return sim.patients
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"surgery_mean": 30.0},
+        {"num_recovery_rooms": 2},
+        {
+            "recovery_dist": DistributionType.UNIFORM,
+            "recovery_param1": 30.0,
+            "recovery_param2": 50.0,
+        },
+    ],
+)
+def test_common_random_numbers_across_configs(changes):
+    config = SimulationConfig(sim_duration=2000.0, emergency_probability=0.2)
+    base = patients(config)
+    changed = patients(replace(config, **changes))
+
+    # Arrivals and the other inputs' service times are patient-by-patient equal
+    assert len(changed) == len(base)
+    for a, b in zip(base, changed):
+        assert (a.arrival_time, a.is_emergency, a.prep_time) == (
+            b.arrival_time,
+            b.is_emergency,
+            b.prep_time,
+        )
+        if "surgery_mean" not in changes:
+            assert a.surgery_time == b.surgery_time
+        if "recovery_dist" not in changes:
+            assert a.recovery_time == b.recovery_time
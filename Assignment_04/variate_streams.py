@@ -0,0 +1,71 @@
+"""
+Assignment 4: Block-Buffered Variate Streams
+Pre-sampled random variates handed out one at a time
+"""
+
+import numpy as np
+from itertools import chain
+
+BLOCK_SIZE = 4096
+
+# Stochastic inputs, each with its own generator for common random numbers
+INPUTS = ("arrival", "priority", "prep", "surgery", "recovery")
+
+
+def spawn_generators(seed: int) -> dict:
+    """
+    Independent generator per stochastic input, derived from one seed.
+
+    Changing one input's distribution or how often it is drawn leaves the
+    other inputs' sequences untouched, so paired configurations see the
+    same arrivals and the same patient-by-patient service times.
+    """
+    children = np.random.SeedSequence(seed).spawn(len(INPUTS))
+    return {name: np.random.default_rng(child) for name, child in zip(INPUTS, children)}
+
+
+def block_sampler(
+    rng: np.random.Generator, distribution: str, param1: float, param2: float
+):
+    """Return a function drawing `size` variates from the given distribution"""
+    if distribution == "exponential":
+        return lambda size: rng.exponential(param1, size)
+    elif distribution == "uniform":
+        return lambda size: rng.uniform(param1, param2, size)
+    else:
+        raise ValueError(f"Unknown distribution: {distribution}")
+
+
+class VariateStream:
+    """
+    Stream of variates from one distribution, refilled in NumPy blocks.
+
+    The distribution is resolved once when the stream is created; each
+    refill draws `block_size` values and ``next_value()`` walks through
+    them with a list iterator, so a draw costs one C-level call. The first
+    block has `first_block` values when given (the draws a run is expected
+    to need); block boundaries do not change the sequence of values.
+    """
+
+    def __init__(
+        self,
+        rng: np.random.Generator,
+        distribution: str,
+        param1: float,
+        param2: float = 0.0,
+        block_size: int = BLOCK_SIZE,
+        first_block: int = None,
+    ):
+        self.draw_block = block_sampler(rng, distribution, param1, param2)
+        self.block_size = block_size
+        self.first_block = first_block or block_size
+        self.next_value = chain.from_iterable(self.blocks()).__next__
+
+    def blocks(self):
+        """Yield an endless sequence of pre-sampled blocks"""
+        yield self.draw_block(self.first_block).tolist()
+        while True:
+            yield self.draw_block(self.block_size).tolist()
+
+    def __call__(self) -> float:
+        return self.next_value()
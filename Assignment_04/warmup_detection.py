@@ -0,0 +1,176 @@
+"""
+Assignment 4: Warmup Detection
+MSER-5 truncation points from pilot runs, cached per configuration
+"""
+
+import json
+import os
+import tempfile
+import numpy as np
+from dataclasses import replace
+from surgery_simulation_a4 import SurgerySimulation, SimulationConfig
+
+CACHE_PATH = "results/warmup_cache.json"
+
+# Fields that change how long or how a run is executed, not the model
+RUN_FIELDS = (
+    "warmup_period",
+    "sim_duration",
+    "random_seed",
+    "engine",
+    "record_mode",
+    "auto_warmup",
+    "instrument",
+)
+
+_cache = {}  # cache file path -> {key: warmup}, loaded once per process
+
+
+def mser(series, batch_size: int = 5) -> int:
+    """
+    MSER-k truncation point: number of leading observations to delete.
+
+    Observations are averaged in batches of `batch_size`; the truncation
+    d (in batches) minimizes the marginal standard error
+    sum((Y_j - mean(Y[d:]))^2) / (m - d)^2 over d <= m / 2.
+    """
+    series = np.asarray(series, dtype=float)
+    m = len(series) // batch_size
+    if m < 2:
+        return 0
+    batches = series[: m * batch_size].reshape(m, batch_size).mean(axis=1)
+
+    # Suffix sums give the statistic for every truncation point at once
+    kept = np.arange(m, 0, -1)
+    suffix_sum = np.cumsum(batches[::-1])[::-1]
+    suffix_sumsq = np.cumsum(batches[::-1] ** 2)[::-1]
+    statistic = (suffix_sumsq - suffix_sum**2 / kept) / kept**2
+
+    d = int(np.argmin(statistic[: m // 2 + 1]))
+    return d * batch_size
+
+
+def pilot_series(
+    config: SimulationConfig,
+    metric: str = "avg_queue_length",
+    num_pilots: int = 10,
+    bin_width: float = 50.0,
+    first_seed: int = 1000,
+):
+    """
+    Pooled per-bin average of `metric` over pilot runs started empty.
+
+    Patients are binned by arrival time over [0, sim_duration); bins
+    without observations are dropped. Returns the bin averages and the
+    start time of each kept bin.
+    """
+    pilot = replace(
+        config,
+        warmup_period=0.0,
+        engine="fast",
+        record_mode="array",
+        auto_warmup=False,
+        instrument=False,
+    )
+    num_bins = int(config.sim_duration // bin_width)
+    totals = np.zeros(num_bins)
+    counts = np.zeros(num_bins)
+
+    for i in range(num_pilots):
+        sim = SurgerySimulation(replace(pilot, random_seed=first_seed + i))
+        sim.run()
+        store = sim.store
+
+        times = store["arrival_time"]
+        if metric == "avg_queue_length":
+            values = store["prep_queue_length_on_arrival"]
+        elif metric == "avg_throughput_time":
+            done = ~np.isnan(store["recovery_end"])
+            times = times[done]
+            values = store["recovery_end"][done] - times
+        else:
+            raise ValueError(f"Unknown warmup metric: {metric}")
+
+        bins = (times // bin_width).astype(int)
+        in_range = bins < num_bins
+        totals += np.bincount(
+            bins[in_range], weights=values[in_range], minlength=num_bins
+        )
+        counts += np.bincount(bins[in_range], minlength=num_bins)
+
+    observed = counts > 0
+    return totals[observed] / counts[observed], np.nonzero(observed)[0] * bin_width
+
+
+def detect_warmup(config: SimulationConfig, **pilot_options) -> float:
+    """MSER-5 truncation time of the pooled pilot series"""
+    series, bin_starts = pilot_series(config, **pilot_options)
+    d = mser(series)
+    return float(bin_starts[d]) if d < len(bin_starts) else 0.0
+
+
+def load_cache(path: str) -> dict:
+    if path not in _cache:
+        try:
+            with open(path) as f:
+                _cache[path] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _cache[path] = {}
+    return _cache[path]
+
+
+def save_cache(path: str):
+    """Merge with the file on disk and replace it atomically (workers may race)"""
+    cache = _cache[path]
+    try:
+        with open(path) as f:
+            for key, warmup in json.load(f).items():
+                cache.setdefault(key, warmup)
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, suffix=".tmp", delete=False
+    ) as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(f.name, path)
+
+
+def detected_warmup(
+    config: SimulationConfig,
+    metric: str = "avg_queue_length",
+    num_pilots: int = 10,
+    bin_width: float = 50.0,
+    cache_path: str = CACHE_PATH,
+) -> float:
+    """
+    Warmup period for `config`, from the cache or new pilot runs.
+
+    Pilots run for config.sim_duration. The cache key combines the hash
+    of the model fields (RUN_FIELDS excluded) with the pilot settings.
+    """
+    key = (
+        f"{config.digest(exclude=RUN_FIELDS)}:{metric}:"
+        f"{num_pilots}:{config.sim_duration:g}:{bin_width:g}"
+    )
+    cache = load_cache(cache_path)
+    if key not in cache:
+        cache[key] = detect_warmup(
+            config, metric=metric, num_pilots=num_pilots, bin_width=bin_width
+        )
+        save_cache(cache_path)
+    return cache[key]
+
+
+def apply_detected_warmup(config: SimulationConfig, **options) -> SimulationConfig:
+    """Config with the detected warmup and the same measured length"""
+    warmup = detected_warmup(config, **options)
+    measured = config.sim_duration - config.warmup_period
+    return replace(
+        config,
+        warmup_period=warmup,
+        sim_duration=warmup + measured,
+        auto_warmup=False,
+    )